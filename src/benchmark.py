@@ -0,0 +1,354 @@
+# Title: Benchmark File
+# Author: Kenan Mesic
+# Date: 10/18/26
+# Purpose: All classes and methods involved with measuring the performance of
+#          every stage of the recommender on synthetic data
+
+import sys
+import os
+import gzip
+import json
+import time
+import random
+import platform
+import resource
+from multiprocessing import Process, Queue, cpu_count
+import numpy as np
+import scipy
+from process import DataProcesser
+from recommender import Recommender
+
+
+# Class: SyntheticReviews
+# Purporse: Writes reviews in the same format as Beeradvocate.txt.gz, with the
+#           overall ratings coming from hidden user and beer factors so the
+#           algorithms have something to learn
+class SyntheticReviews:
+
+
+    # Method: Constructor
+    # Purpose: Create the generator of the reviews
+    # Arguments: seed (optional) - seed of the random reviews
+    def __init__(self, seed=0):
+        self.seed = seed
+
+
+    # Method: write
+    # Purpose: Write a gzip file of reviews, the popularity of the users and
+    #          beers is skewed so only part of them pass the rating filters
+    # Arguments: filename (required) - path of the file to write
+    #            totalReviews (required) - amount of reviews to write
+    # Return: None
+    def write(self, filename, totalReviews):
+        randomState = np.random.RandomState(self.seed)
+        totalUsers = max(50, totalReviews // 25)
+        totalBeers = max(25, totalReviews // 60)
+        userFactors = randomState.normal(0, 0.5, (totalUsers, 3))
+        beerFactors = randomState.normal(0, 0.5, (totalBeers, 3))
+        userBiases = randomState.normal(0, 0.3, totalUsers)
+        beerBiases = randomState.normal(0, 0.4, totalBeers)
+
+        users = (totalUsers * randomState.rand(totalReviews) ** 2).astype(np.int64)
+        beers = (totalBeers * randomState.rand(totalReviews) ** 2).astype(np.int64)
+        overall = 3.8 + userBiases[users] + beerBiases[beers]
+        overall += np.einsum('ij,ij->i', userFactors[users], beerFactors[beers])
+        overall += randomState.normal(0, 0.4, totalReviews)
+        overall = np.clip(np.round(overall * 2) / 2, 1.0, 5.0)
+        words = ["hoppy", "malty", "dark", "crisp", "bitter", "sweet", "smooth", "roasty"]
+
+        with gzip.open(filename, 'wb') as f:
+            for idx in range(0, totalReviews):
+                user = users[idx]
+                beer = beers[idx]
+                f.write("beer/name: Beer %d\n" % beer)
+                f.write("beer/beerId: %d\n" % beer)
+                f.write("beer/brewerId: %d\n" % (beer % 97))
+                f.write("beer/ABV: %.1f\n" % (4 + beer % 8))
+                f.write("beer/style: Style %d\n" % (beer % 23))
+                f.write("review/appearance: %.1f\n" % overall[idx])
+                f.write("review/aroma: %.1f\n" % overall[idx])
+                f.write("review/palate: %.1f\n" % overall[idx])
+                f.write("review/taste: %.1f\n" % overall[idx])
+                f.write("review/overall: %.1f\n" % overall[idx])
+                f.write("review/time: %d\n" % (1000000000 + idx * 60))
+                f.write("review/profileName: user%d\n" % user)
+                f.write("review/text: %s and %s: a review of beer %d\n\n" %
+                        (words[(user + beer) % len(words)], words[beer % len(words)], beer))
+
+
+# Class: Benchmark
+# Purporse: Runs every stage of the recommender, from parsing the reviews to
+#           saving the recommendations, for each algorithm on synthetic data of
+#           several sizes. Records the wall time, peak memory and RMSE of each
+#           stage to a json file and compares them against a saved baseline
+class Benchmark:
+
+    ALGORITHMS = ["svd", "rsvd", "sgd", "als", "wals", "aspects", "user"]
+    SIZES = [20000, 100000]
+    DTYPES = ["float64", "float32"]
+    DIRECTORY = "../data/benchmark"
+    FILE_RESULTS = "../data/benchmark/results.json"
+    FILE_BASELINE = "../data/benchmark/baseline.json"
+    TIME_TOLERANCE = 0.25
+    RMSE_TOLERANCE = 0.01
+
+
+    # Method: Constructor
+    # Purpose: Creates the benchmark from the command line arguments
+    # Arguments: args (required) - command line arguments of the python program
+    def __init__(self, args):
+        self.args = args
+
+
+    # Method: run
+    # Purpose: Runs the benchmark, saves the results and compares them against
+    #          the baseline if there is one
+    #          Options:
+    #            -sizes {10000,50000}  amount of reviews of each synthetic dataset
+    #            -algs {svd,sgd}       algorithms to run
+    #            -k {kvalue}           number of latent factors
+    #            -dtypes {float64,float32} precisions to run every algorithm with
+    #            -o {file}             where to save the results
+    #            -baseline {file}      baseline to compare against
+    #            -savebaseline         save the results as the new baseline
+    # Arguments: None
+    # Return: None
+    def run(self):
+        sizes = self.SIZES
+        algorithms = self.ALGORITHMS
+        dtypes = self.DTYPES
+        kValue = 10
+        resultsFile = self.FILE_RESULTS
+        baselineFile = self.FILE_BASELINE
+
+        try:
+            if ("-sizes" in self.args):
+                sizes = [int(size) for size in self.args[self.args.index("-sizes") + 1].split(",")]
+            if ("-algs" in self.args):
+                algorithms = self.args[self.args.index("-algs") + 1].split(",")
+            if ("-k" in self.args):
+                kValue = int(self.args[self.args.index("-k") + 1])
+            if ("-dtypes" in self.args):
+                dtypes = self.args[self.args.index("-dtypes") + 1].split(",")
+                for dtype in dtypes:
+                    if dtype not in Recommender.DTYPES:
+                        raise ValueError(dtype)
+            if ("-o" in self.args):
+                resultsFile = self.args[self.args.index("-o") + 1]
+            if ("-baseline" in self.args):
+                baselineFile = self.args[self.args.index("-baseline") + 1]
+        except (ValueError, IndexError) as e:
+            print "Invalid Usage of arguments in benchmark"
+            return
+
+        if not os.path.isdir(self.DIRECTORY):
+            os.makedirs(self.DIRECTORY)
+
+        results = {"machine": self.machine(), "k": kValue, "stages": []}
+        for size in sizes:
+            filename = os.path.join(self.DIRECTORY, "reviews_%d.txt.gz" % size)
+            if not os.path.isfile(filename):
+                print("Writing " + str(size) + " synthetic reviews")
+                SyntheticReviews(seed=size).write(filename, size)
+
+            # Every algorithm runs in its own process so the peak memory of one
+            # does not hide the peak memory of another
+            for algorithm in algorithms:
+                for dtype in dtypes:
+                    print("Benchmarking " + algorithm + " in " + dtype + " on " + str(size) + " reviews")
+                    queue = Queue()
+                    process = Process(target=self.runAlgorithm, args=(filename, size, algorithm, kValue, queue, dtype))
+                    process.start()
+                    stages = queue.get()
+                    process.join()
+                    results["stages"].extend(stages)
+                    for stage in stages:
+                        print("  %-36s %9.3fs %9.1fMB%s" % (stage["stage"], stage["seconds"], stage["peakRssMb"],
+                              "" if stage["rmse"] == None else "   RMSE %.4f" % stage["rmse"]))
+
+        if len(dtypes) > 1:
+            self.compareDtypes(results, dtypes[0])
+
+        with open(resultsFile, 'w') as fp:
+            json.dump(results, fp, sort_keys=True, indent=4)
+        print("Saved results to " + resultsFile)
+
+        if ("-savebaseline" in self.args):
+            with open(baselineFile, 'w') as fp:
+                json.dump(results, fp, sort_keys=True, indent=4)
+            print("Saved baseline to " + baselineFile)
+        elif os.path.isfile(baselineFile):
+            with open(baselineFile) as fp:
+                self.compare(results, json.load(fp))
+
+
+    # Method: runAlgorithm
+    # Purpose: Run every stage for one algorithm on one dataset, meant to be the
+    #          target of a child process
+    # Arguments: filename (required) - path to the synthetic reviews
+    #            size (required) - amount of reviews
+    #            algorithm (required) - algorithm to train
+    #            kValue (required) - number of latent factors
+    #            queue (required) - queue to send the stages back on
+    #            dtype (optional) - precision of the recommender
+    # Return: None
+    def runAlgorithm(self, filename, size, algorithm, kValue, queue, dtype="float64"):
+        random.seed(0)
+        np.random.seed(0)
+        stages = []
+        sink = open(os.devnull, 'w')
+        stdout = sys.stdout
+
+        def stage(name, func, *args, **kwargs):
+            sys.stdout = sink
+            start = time.time()
+            try:
+                value = func(*args, **kwargs)
+            finally:
+                sys.stdout = stdout
+            stages.append({"size": size,
+                           "algorithm": algorithm,
+                           "dtype": dtype,
+                           "stage": name,
+                           "seconds": time.time() - start,
+                           "peakRssMb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+                           "rmse": None})
+            return value
+
+        try:
+            dataProcessor = DataProcesser()
+            dataProcessor.FILE_BEER_COUNT = os.path.join(self.DIRECTORY, "beer_count.json")
+            stage("processReviews", dataProcessor.processReviews, filename, size)
+            stage("createTrainingTestingData", dataProcessor.createTrainingTestingData, 75, seed=0)
+            training = dataProcessor.training
+            testing = dataProcessor.testing
+
+            recommendMachine = stage("createUserItemMatrix", Recommender, training, testing,
+                                     dataProcessor.totalUsersReviewed,
+                                     dataProcessor.totalBeersReviewed,
+                                     readFromFiles=False,
+                                     mappingIdxToBeer=dataProcessor.mappingIdxToBeer,
+                                     dtype=dtype)
+            recommendMachine.FILE_RECOM = os.path.join(self.DIRECTORY, "recommendations.txt")
+            recommendMachine.FILE_RATINGS = os.path.join(self.DIRECTORY, "top_ratings.txt")
+
+            if algorithm == "svd":
+                stage("matrix_factorization_svd", recommendMachine.matrix_factorization_svd, k=kValue)
+                predictAlg = recommendMachine.MF_SVD
+            elif algorithm == "rsvd":
+                stage("matrix_factorization_svd", recommendMachine.matrix_factorization_svd, k=kValue,
+                      method=recommendMachine.SVD_RANDOMIZED, seed=0)
+                predictAlg = recommendMachine.MF_SVD
+            elif algorithm == "sgd":
+                stage("stochastic_gradient_descent", recommendMachine.stochastic_gradient_descent,
+                      k=kValue, iterations=5, seed=0)
+                predictAlg = recommendMachine.MF_SGD
+            elif algorithm == "als":
+                stage("alternating_least_squares", recommendMachine.alternating_least_squares,
+                      k=kValue, iterations=5)
+                predictAlg = recommendMachine.MF_ALS
+            elif algorithm == "wals":
+                stage("weighted_alternating_least_squares", recommendMachine.weighted_alternating_least_squares,
+                      k=kValue, iterations=5, seed=0)
+                predictAlg = recommendMachine.MF_WALS
+            elif algorithm == "aspects":
+                stage("multi_aspect_factorization", recommendMachine.multi_aspect_factorization,
+                      k=kValue, iterations=5, seed=0)
+                predictAlg = recommendMachine.MF_SGD
+            else:
+                stage("createSimMatrix", recommendMachine.createSimMatrix, neighbours=50)
+                predictAlg = "user"
+
+            stage("predict", recommendMachine.predict, alg=predictAlg)
+            rmse = stage("evaluate", recommendMachine.evaluate)
+            stages[-1]["rmse"] = rmse
+            stage("saveRecommendations", recommendMachine.saveRecommendations)
+        finally:
+            queue.put(stages)
+
+
+    # Method: machine
+    # Purpose: Describe the machine and versions the benchmark ran with
+    # Arguments: None
+    # Return: dict describing the machine
+    def machine(self):
+        return {"python": platform.python_version(),
+                "numpy": np.__version__,
+                "scipy": scipy.__version__,
+                "platform": platform.platform(),
+                "cpus": cpu_count(),
+                "date": time.strftime("%Y-%m-%d %H:%M:%S")}
+
+
+    # Method: compareDtypes
+    # Purpose: Print the RMSE, time of all stages and peak memory of every
+    #          algorithm in each precision next to the first precision that was run
+    # Arguments: results (required) - results of this run
+    #            reference (required) - precision to compare against
+    # Return: dict of the RMSE difference by size, algorithm and precision
+    def compareDtypes(self, results, reference):
+        evaluated = {}
+        peaks = {}
+        seconds = {}
+        for stage in results["stages"]:
+            key = (stage["size"], stage["algorithm"], stage["dtype"])
+            peaks[key] = max(peaks.get(key, 0.0), stage["peakRssMb"])
+            seconds[key] = seconds.get(key, 0.0) + stage["seconds"]
+            if stage["rmse"] != None:
+                evaluated[key] = stage["rmse"]
+
+        print("\nComparing the precisions against " + reference)
+        differences = {}
+        for (size, algorithm, dtype), rmse in sorted(evaluated.items()):
+            old = evaluated.get((size, algorithm, reference))
+            if dtype == reference or old == None:
+                continue
+            differences[(size, algorithm, dtype)] = rmse - old
+            oldSeconds = seconds[(size, algorithm, reference)]
+            print("  %7d %-7s %-8s RMSE %.4f vs %.4f (%+.2e) %6.2fx time %6.2fx memory" %
+                  (size, algorithm, dtype, rmse, old, rmse - old,
+                   seconds[(size, algorithm, dtype)] / oldSeconds if oldSeconds > 0 else 1.0,
+                   peaks[(size, algorithm, dtype)] / peaks[(size, algorithm, reference)]))
+        return differences
+
+
+    # Method: compare
+    # Purpose: Print every stage next to the same stage of the baseline, marking
+    #          the ones slower or with a worse RMSE than the tolerances
+    # Arguments: results (required) - results of this run
+    #            baseline (required) - results of the baseline run
+    # Return: list of the stages that regressed
+    def compare(self, results, baseline):
+        baselineStages = {}
+        for stage in baseline["stages"]:
+            baselineStages[(stage["size"], stage["algorithm"], stage.get("dtype", "float64"), stage["stage"])] = stage
+
+        print("\nComparing against the baseline from " + baseline["machine"]["date"])
+        regressions = []
+        for stage in results["stages"]:
+            old = baselineStages.get((stage["size"], stage["algorithm"], stage["dtype"], stage["stage"]))
+            if old == None:
+                continue
+
+            notes = []
+            ratio = stage["seconds"] / old["seconds"] if old["seconds"] > 0 else 1.0
+            if ratio > 1 + self.TIME_TOLERANCE:
+                notes.append("SLOWER")
+            if stage["rmse"] != None and old["rmse"] != None and stage["rmse"] > old["rmse"] + self.RMSE_TOLERANCE:
+                notes.append("WORSE RMSE")
+            if len(notes) > 0:
+                regressions.append(stage)
+
+            print("  %7d %-5s %-8s %-36s %6.2fx time %6.2fx memory %s" %
+                  (stage["size"], stage["algorithm"], stage["dtype"], stage["stage"], ratio,
+                   stage["peakRssMb"] / old["peakRssMb"] if old["peakRssMb"] > 0 else 1.0,
+                   " ".join(notes)))
+
+        print(str(len(regressions)) + " stages regressed")
+        return regressions
+
+
+# Run the benchmark with the command line arguments
+if __name__ == "__main__":
+    benchmark = Benchmark(sys.argv)
+    benchmark.run()
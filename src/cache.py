@@ -0,0 +1,113 @@
+# Title: Cache File
+# Author: Kenan Mesic
+# Date: 10/18/26
+# Purpose: All classes and methods involved with caching the recommendations
+#          of the most active users
+
+import threading
+from collections import OrderedDict
+
+
+# Class: RecommendationCache
+# Purporse: Least recently used cache of the top recommendations of users,
+#           bounded by both the amount of entries and their memory. The keys
+#           hold the version of the model so results of an older model are
+#           never returned, and clearing the cache when a new model is loaded
+#           frees them right away
+class RecommendationCache:
+
+    ENTRY_OVERHEAD = 200
+
+
+    # Method: Constructor
+    # Purpose: Create an empty cache
+    # Arguments: maxEntries (optional) - most entries kept
+    #            maxBytes (optional) - most bytes of results kept
+    def __init__(self, maxEntries=10000, maxBytes=64 * 1024 * 1024):
+        self.maxEntries = maxEntries
+        self.maxBytes = maxBytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+
+    # Method: key
+    # Purpose: Build the key of the recommendations of a user
+    # Arguments: modelVersion (required) - version of the model
+    #            user (required) - idx of the user
+    #            n (required) - amount of recommendations
+    #            filters (optional) - anything else changing the results,
+    #                                 ex. whether the index was used
+    # Return: the key
+    def key(self, modelVersion, user, n, filters=()):
+        return (modelVersion, user, n, tuple(filters))
+
+
+    # Method: get
+    # Purpose: Get the cached results of the key, marking them most recently used
+    # Arguments: key (required) - key of the results
+    # Return: the results or None if they are not cached
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry == None:
+                self.misses += 1
+                return None
+            self.entries[key] = entry
+            self.hits += 1
+            return entry[0]
+
+
+    # Method: put
+    # Purpose: Cache the results of the key, evicting the least recently used
+    #          entries until the cache fits its bounds
+    # Arguments: key (required) - key of the results
+    #            value (required) - tuple of numpy arrays of the results
+    # Return: None
+    def put(self, key, value):
+        size = self.ENTRY_OVERHEAD + sum(part.nbytes for part in value)
+        if size > self.maxBytes or self.maxEntries <= 0:
+            return
+
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old != None:
+                self.bytes -= old[1]
+            self.entries[key] = (value, size)
+            self.bytes += size
+
+            while len(self.entries) > self.maxEntries or self.bytes > self.maxBytes:
+                evictedKey, evicted = self.entries.popitem(last=False)
+                self.bytes -= evicted[1]
+                self.evictions += 1
+
+
+    # Method: clear
+    # Purpose: Drop every entry, used when a new model is loaded
+    # Arguments: None
+    # Return: None
+    def clear(self):
+        with self.lock:
+            self.invalidations += len(self.entries)
+            self.entries.clear()
+            self.bytes = 0
+
+
+    # Method: stats
+    # Purpose: Report the counters of the cache
+    # Arguments: None
+    # Return: dict of the counters
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {"entries": len(self.entries),
+                    "bytes": self.bytes,
+                    "hits": self.hits,
+                    "misses": self.misses,
+                    "hitRate": float(self.hits) / lookups if lookups > 0 else 0.0,
+                    "evictions": self.evictions,
+                    "invalidations": self.invalidations}
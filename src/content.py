@@ -0,0 +1,326 @@
+# Title: Content Features File
+# Author: Kenan Mesic
+# Date: 10/18/26
+# Purpose: All classes and methods involved with turning the text of the
+#          reviews into content features of the beers, used to recommend the
+#          beers with too few ratings to be part of the recommender
+
+import re
+import time
+import zlib
+from array import array
+import numpy as np
+from scipy import sparse
+from store import ModelStore
+from vocab import StringTable
+from process import DataProcesser
+
+
+# Class: ContentFeatures
+# Purporse: Hashed bag of words of the reviews of every beer. The reviews file
+#           is streamed once, every token of a review is hashed straight into
+#           one of a fixed amount of features so there is no dictionary of the
+#           words. The tokens are buffered and summed into small sparse blocks
+#           every so many tokens, and the blocks are merged into the counts of
+#           beers by features once they hold as many entries as the counts, so
+#           an entry is only merged a few times. The memory grows with the
+#           amount of beers times the distinct features each of them uses, not
+#           with the amount of reviews once the vocabulary of the beers stops
+#           growing. The counts are turned into tf-idf rows of unit length, so
+#           the inner product of two rows is their cosine similarity
+class ContentFeatures:
+
+    VERSION = 1
+    DIRECTORY = "../data/content"
+    FILE_COLD = "../data/cold_recommendations.txt"
+    HASH_BITS = 18
+    FLUSH_TOKENS = 1 << 18
+    TOKEN = re.compile(r"[a-z0-9]{2,}")
+
+
+    # Method: Constructor
+    # Purpose: Create empty content features
+    # Arguments: hashBits (optional) - the amount of features is 2 ** hashBits
+    #            flushTokens (optional) - tokens buffered before being summed
+    #                                     into the counts
+    def __init__(self, hashBits=HASH_BITS, flushTokens=FLUSH_TOKENS):
+        self.width = 1 << hashBits
+        self.flushTokens = flushTokens
+        self.beerTable = StringTable()
+        self.beerNames = []
+        self.reviewCounts = array('l')
+        self.counts = sparse.csr_matrix((0, self.width), dtype=np.float32)
+        self.blocks = []
+        self.content = None
+        self.newBuffers()
+
+
+    # Method: streamTexts
+    # Purpose: Go through the reviews of the file one at a time with the same
+    #          parser as the ratings, keeping only the beer and the text
+    # Arguments: filename (required) - path to the reviews file
+    #            amount (optional) - total amount of reviews to go through
+    #                                defaults to 1 trillion
+    # Return: generator of (beerId, beerName, text) records
+    def streamTexts(self, filename, amount=1000000000000):
+        for record in DataProcesser().streamReviews(filename, amount, keepText=True):
+            yield record[1], record[2], record[8]
+
+
+    # Method: process
+    # Purpose: Stream the reviews file into the counts of every beer
+    # Arguments: filename (required) - path to the reviews file
+    #            amount (optional) - total amount of reviews to go through
+    # Return: None
+    def process(self, filename, amount=1000000000000):
+        start = time.time()
+        totalReviews = 0
+        for beerId, beerName, text in self.streamTexts(filename, amount):
+            self.add(beerId, beerName, text)
+            totalReviews += 1
+        self.merge()
+        print("Hashed the text of %d reviews of %d beers into %d features in %.3fs" %
+              (totalReviews, len(self.beerNames), self.counts.nnz, time.time() - start))
+
+
+    # Method: add
+    # Purpose: Add the tokens of one review to the buffers of its beer,
+    #          summing the buffers into the counts once they are full
+    # Arguments: beerId (required) - id of the beer
+    #            beerName (required) - name of the beer
+    #            text (required) - text of the review
+    # Return: None
+    def add(self, beerId, beerName, text):
+        beerCode = self.beerTable.code(beerId)
+        if beerCode == len(self.beerNames):
+            self.beerNames.append(intern(beerName) if isinstance(beerName, str) else beerName)
+            self.reviewCounts.append(0)
+        self.reviewCounts[beerCode] += 1
+
+        # Every token goes straight to its feature by its hash
+        hashes = [zlib.crc32(token) for token in self.TOKEN.findall(text.lower())]
+        self.bufferBeers.append(beerCode)
+        self.bufferLengths.append(len(hashes))
+        self.bufferHashes.extend(hashes)
+        if len(self.bufferHashes) >= self.flushTokens:
+            self.flush()
+
+
+    # Method: flush
+    # Purpose: Sum the buffered tokens into a block, merging the blocks into
+    #          the counts once they hold as many entries as the counts
+    # Arguments: None
+    # Return: None
+    def flush(self):
+        self.flushBuffers()
+        if sum(block.nnz for block in self.blocks) >= self.counts.nnz:
+            self.merge()
+
+
+    # Method: flushBuffers
+    # Purpose: Sum the buffered tokens into a new block
+    # Arguments: None
+    # Return: None
+    def flushBuffers(self):
+        self.content = None
+        if len(self.bufferHashes) > 0:
+            # Duplicate beers and features are summed by converting to CSR
+            rows = np.repeat(np.array(self.bufferBeers, dtype=np.int64), np.array(self.bufferLengths, dtype=np.int64))
+            features = (np.array(self.bufferHashes, dtype=np.int64) & 0xffffffff) % self.width
+            self.blocks.append(sparse.coo_matrix((np.ones(len(features), dtype=np.float32), (rows, features)),
+                                                 shape=(len(self.beerNames), self.width)).tocsr())
+        self.newBuffers()
+
+
+    # Method: merge
+    # Purpose: Sum the buffered tokens and all the blocks into the counts
+    # Arguments: None
+    # Return: None
+    def merge(self):
+        self.flushBuffers()
+
+        # Blocks have as many rows as there were beers at the time, so they are
+        # summed as entries into the rows of all the beers
+        parts = [self.counts.tocoo()] + [block.tocoo() for block in self.blocks]
+        self.counts = sparse.coo_matrix((np.concatenate([part.data for part in parts]),
+                                         (np.concatenate([part.row for part in parts]),
+                                          np.concatenate([part.col for part in parts]))),
+                                        shape=(len(self.beerNames), self.width)).tocsr()
+        self.blocks = []
+        self.content = None
+
+
+    # Method: newBuffers
+    # Purpose: Create empty buffers of the tokens waiting to be counted
+    # Arguments: None
+    # Return: None
+    def newBuffers(self):
+        self.bufferBeers = array('i')
+        self.bufferLengths = array('i')
+        self.bufferHashes = array('l')
+
+
+    # Method: itemContent
+    # Purpose: Content matrix of the beers, the log of the counts weighted by
+    #          the inverse document frequency of the features and scaled to unit
+    #          length. Built once and kept until more reviews are added
+    # Arguments: None
+    # Return: CSR matrix of the beers by features
+    def itemContent(self):
+        if self.content is not None:
+            return self.content
+        if len(self.bufferHashes) > 0 or len(self.blocks) > 0 or self.counts.shape[0] < len(self.beerNames):
+            self.merge()
+
+        totalBeers = self.counts.shape[0]
+        documentFrequency = np.bincount(self.counts.indices, minlength=self.width)
+        idf = (np.log((1.0 + totalBeers) / (1.0 + documentFrequency)) + 1.0).astype(np.float32)
+
+        content = self.counts.copy()
+        content.data = np.log1p(content.data) * idf[content.indices]
+        norms = np.sqrt(np.asarray(content.multiply(content).sum(axis=1, dtype=np.float64)).ravel())
+        norms[norms == 0] = 1.0
+        content.data /= np.repeat(norms, np.diff(content.indptr)).astype(np.float32)
+        self.content = content
+        return content
+
+
+    # Method: itemRows
+    # Purpose: Rows of the content of the beers of a recommender
+    # Arguments: itemBeerIds (required) - id of the beer of every item idx
+    # Return: array of the row of every item, -1 for beers without any text
+    def itemRows(self, itemBeerIds):
+        rows = np.empty(len(itemBeerIds), dtype=np.int64)
+        for itemIdx, beerId in enumerate(itemBeerIds):
+            beerCode = self.beerTable.get(beerId)
+            rows[itemIdx] = -1 if beerCode == None else beerCode
+        return rows
+
+
+    # Method: userProfiles
+    # Purpose: Content profile of users, the sum of the content of the beers
+    #          they rated weighted by how far each rating is from their mean,
+    #          scaled to unit length
+    # Arguments: trainingMatrix (required) - CSR matrix of the ratings of the users
+    #            itemRows (required) - row of the content of every item, see itemRows
+    #            users (required) - idxs of the users
+    # Return: CSR matrix of the profiles, one row per user
+    def userProfiles(self, trainingMatrix, itemRows, users):
+        ratings = trainingMatrix[users]
+        counts = np.diff(ratings.indptr)
+        means = np.asarray(ratings.sum(axis=1, dtype=np.float64)).ravel() / np.maximum(counts, 1)
+        centered = sparse.csr_matrix((ratings.data - np.repeat(means, counts), ratings.indices, ratings.indptr),
+                                     shape=ratings.shape)
+
+        # Items without text have no content, so select only the others
+        known = np.flatnonzero(itemRows >= 0)
+        selection = sparse.csr_matrix((np.ones(len(known), dtype=np.float32), (known, itemRows[known])),
+                                      shape=(len(itemRows), self.counts.shape[0]))
+        profiles = centered.dot(selection.dot(self.itemContent())).tocsr()
+
+        norms = np.sqrt(np.asarray(profiles.multiply(profiles).sum(axis=1, dtype=np.float64)).ravel())
+        norms[norms == 0] = 1.0
+        profiles.data /= np.repeat(norms, np.diff(profiles.indptr))
+        return profiles
+
+
+    # Method: coldBeers
+    # Purpose: Rows of the beers that have text but are not part of the recommender
+    # Arguments: itemRows (required) - row of the content of every item, see itemRows
+    # Return: array of the rows of the cold beers
+    def coldBeers(self, itemRows):
+        cold = np.ones(self.counts.shape[0], dtype=bool)
+        cold[itemRows[itemRows >= 0]] = False
+        return np.flatnonzero(cold)
+
+
+    # Method: recommendCold
+    # Purpose: Recommend the beers left out of the recommender for having too
+    #          few ratings, by the cosine similarity of their content with the
+    #          profiles of the users
+    # Arguments: trainingMatrix (required) - CSR matrix of the ratings of the users
+    #            itemBeerIds (required) - id of the beer of every item idx
+    #            users (required) - idxs of the users to recommend to
+    #            n (optional) - amount of recommendations per user
+    # Return: tuple of the rows of the recommended beers and their scores, one
+    #         row per user, slots without a beer have a row of -1
+    def recommendCold(self, trainingMatrix, itemBeerIds, users, n=20):
+        itemRows = self.itemRows(itemBeerIds)
+        cold = self.coldBeers(itemRows)
+        users = np.asarray(users, dtype=np.int64).reshape(-1)
+        beers = -np.ones((len(users), n), dtype=np.int64)
+        scores = np.full((len(users), n), -np.inf)
+        found = min(n, len(cold))
+        if found == 0:
+            return beers, scores
+
+        # Partial sort of the similarities for the top n
+        profiles = self.userProfiles(trainingMatrix, itemRows, users)
+        similarities = profiles.dot(self.itemContent()[cold].T).toarray()
+        rows = np.arange(len(users))[:, np.newaxis]
+        top = np.argpartition(-similarities, found - 1, axis=1)[:, :found]
+        order = np.argsort(-similarities[rows, top], axis=1, kind="mergesort")
+        top = top[rows, order]
+        beers[:, :found] = cold[top]
+        scores[:, :found] = similarities[rows, top]
+        return beers, scores
+
+
+    # Method: saveColdRecommendations
+    # Purpose: Save the cold beers recommended to every user, one line per user
+    #          of name::similarity
+    # Arguments: trainingMatrix (required) - CSR matrix of the ratings of the users
+    #            itemBeerIds (required) - id of the beer of every item idx
+    #            n (optional) - amount of recommendations per user
+    #            chunkSize (optional) - users scored together
+    # Return: None
+    def saveColdRecommendations(self, trainingMatrix, itemBeerIds, n=20, chunkSize=1000):
+        totalUsers = trainingMatrix.shape[0]
+        with open(self.FILE_COLD, 'w') as f:
+            for start in range(0, totalUsers, chunkSize):
+                users = np.arange(start, min(start + chunkSize, totalUsers))
+                beers, scores = self.recommendCold(trainingMatrix, itemBeerIds, users, n)
+                f.writelines(", ".join(self.beerNames[beer] + "::" + ("%.3f" % score)
+                                       for beer, score in zip(beers[row], scores[row]) if beer >= 0) + "\n"
+                             for row in range(0, len(users)))
+
+
+    # Method: save
+    # Purpose: Save the counts and beers into their own directory
+    # Arguments: directory (optional) - where to save the content features
+    # Return: None
+    def save(self, directory=DIRECTORY):
+        self.merge()
+        arrays = {"counts_data": self.counts.data,
+                  "counts_indices": self.counts.indices,
+                  "counts_indptr": self.counts.indptr,
+                  "reviewCounts": np.array(self.reviewCounts, dtype=np.int64)}
+        meta = {"contentVersion": self.VERSION,
+                "width": self.width,
+                "flushTokens": self.flushTokens}
+        mappings = {"beerIds": dict(enumerate(self.beerTable.values)),
+                    "beers": dict(enumerate(self.beerNames))}
+        ModelStore(directory).save(arrays, meta, mappings)
+
+
+    # Method: load
+    # Purpose: Load content features saved by save, memory mapping the counts
+    # Arguments: directory (optional) - where the content features were saved
+    # Return: None
+    def load(self, directory=DIRECTORY):
+        arrays, meta, mappings = ModelStore(directory).load()
+        if meta["contentVersion"] != self.VERSION:
+            raise ValueError("Content features in " + directory + " have version " + str(meta["contentVersion"]) +
+                             ", only version " + str(self.VERSION) + " is supported")
+        self.width = meta["width"]
+        self.flushTokens = meta["flushTokens"]
+        self.beerTable = StringTable()
+        for beerCode in range(0, len(mappings["beerIds"])):
+            self.beerTable.code(mappings["beerIds"][beerCode])
+        self.beerNames = [mappings["beers"][beerCode] for beerCode in range(0, len(mappings["beers"]))]
+        self.reviewCounts = array('l', arrays["reviewCounts"].tolist())
+        self.counts = sparse.csr_matrix((arrays["counts_data"], arrays["counts_indices"], arrays["counts_indptr"]),
+                                        shape=(len(self.beerNames), self.width), copy=False)
+        self.blocks = []
+        self.content = None
+        self.newBuffers()
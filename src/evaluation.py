@@ -0,0 +1,142 @@
+# Title: Evaluation File
+# Author: Kenan Mesic
+# Date: 10/18/26
+# Purpose: All classes and methods involved with evaluating a trained
+#          recommender on held out ratings without building dense matrices
+
+import time
+import numpy as np
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
+
+
+# Class: Evaluator
+# Purporse: Scores the held out ratings a chunk of users at a time straight from
+#           the model, so only a chunk of rows of predictions is ever dense.
+#           Every chunk adds up the errors of the ratings for RMSE and MAE and
+#           the hits of the top k recommendations for precision@k, recall@k and
+#           NDCG@k in the same pass. The chunks are spread over a pool of
+#           threads and their sums combined at the end
+class Evaluator:
+
+    CHUNK_USERS = 512
+    RELEVANT_RATING = 4.0
+
+
+    # Method: Constructor
+    # Purpose: Create the evaluator of a trained recommender
+    # Arguments: recommendMachine (required) - the trained recommender
+    #            k (optional) - amount of recommendations ranked per user
+    #            relevantRating (optional) - held out ratings at least this are
+    #                                        relevant for the ranking metrics
+    #            chunkUsers (optional) - users scored together
+    #            workers (optional) - number of threads, defaults to all cores
+    def __init__(self, recommendMachine, k=10, relevantRating=RELEVANT_RATING, chunkUsers=CHUNK_USERS, workers=None):
+        self.recommendMachine = recommendMachine
+        self.k = k
+        self.relevantRating = relevantRating
+        self.chunkUsers = chunkUsers
+        self.workers = workers if workers != None else cpu_count()
+
+
+    # Method: evaluate
+    # Purpose: Evaluate the recommender on held out ratings
+    # Arguments: users (required) - idx of the user of each rating
+    #            items (required) - idx of the item of each rating
+    #            ratings (required) - the held out ratings
+    # Return: dict of rmse, mae, precision, recall, ndcg, coverage and counts
+    def evaluate(self, users, items, ratings):
+        start = time.time()
+        users = np.asarray(users, dtype=np.int64)
+        items = np.asarray(items, dtype=np.int64)
+        ratings = np.asarray(ratings, dtype=np.float64)
+
+        # Group the ratings by user, like the rows of a CSR matrix
+        order = np.argsort(users, kind="mergesort")
+        users = users[order]
+        items = items[order]
+        ratings = ratings[order]
+        testUsers, starts = np.unique(users, return_index=True)
+        ends = np.append(starts[1:], len(users))
+
+        chunks = [(testUsers[idx:idx + self.chunkUsers], starts[idx:idx + self.chunkUsers], ends[idx:idx + self.chunkUsers])
+                  for idx in range(0, len(testUsers), self.chunkUsers)]
+
+        def evaluateChunk(chunk):
+            return self.evaluateChunk(chunk[0], chunk[1], chunk[2], items, ratings)
+
+        pool = ThreadPool(self.workers)
+        try:
+            partials = pool.map(evaluateChunk, chunks)
+        finally:
+            pool.close()
+            pool.join()
+
+        # Combine the sums of every chunk
+        totals = {"ratings": 0, "squaredError": 0.0, "absoluteError": 0.0,
+                  "rankedUsers": 0, "precision": 0.0, "recall": 0.0, "ndcg": 0.0}
+        recommended = np.zeros(self.recommendMachine.trainingMatrix.shape[1], dtype=bool)
+        for partial in partials:
+            for key in totals:
+                totals[key] += partial[key]
+            recommended[partial["recommended"]] = True
+
+        rankedUsers = max(totals["rankedUsers"], 1)
+        result = {"rmse": np.sqrt(totals["squaredError"] / max(totals["ratings"], 1)),
+                  "mae": totals["absoluteError"] / max(totals["ratings"], 1),
+                  "precision": totals["precision"] / rankedUsers,
+                  "recall": totals["recall"] / rankedUsers,
+                  "ndcg": totals["ndcg"] / rankedUsers,
+                  "coverage": recommended.mean() if len(recommended) > 0 else 0.0,
+                  "k": self.k,
+                  "ratings": totals["ratings"],
+                  "users": len(testUsers),
+                  "rankedUsers": totals["rankedUsers"],
+                  "seconds": time.time() - start}
+        return result
+
+
+    # Method: evaluateChunk
+    # Purpose: Score one chunk of users and add up its errors and ranking hits
+    # Arguments: chunkUsers (required) - idxs of the users of the chunk
+    #            starts (required) - first held out rating of each user
+    #            ends (required) - rating after the last held out rating of each user
+    #            items (required) - items of the held out ratings grouped by user
+    #            ratings (required) - held out ratings grouped by user
+    # Return: dict of the sums of the chunk
+    def evaluateChunk(self, chunkUsers, starts, ends, items, ratings):
+        scores = self.recommendMachine.scoreUsers(chunkUsers)
+        counts = ends - starts
+        rows = np.repeat(np.arange(len(chunkUsers)), counts)
+        cells = np.concatenate([np.arange(start, end) for start, end in zip(starts, ends)])
+        errors = scores[rows, items[cells]] - ratings[cells]
+
+        # Rank after the errors, ranking masks the rated items of the scores
+        topItems = self.recommendMachine.rankScores(chunkUsers, scores, self.k)[0]
+
+        # Discount of every rank for NDCG, and the ideal DCG by amount of relevant items
+        discounts = 1.0 / np.log2(np.arange(2, self.k + 2))
+        idealDcg = np.concatenate([[0.0], np.cumsum(discounts)])
+
+        precision = 0.0
+        recall = 0.0
+        ndcg = 0.0
+        rankedUsers = 0
+        for row in range(0, len(chunkUsers)):
+            relevant = items[starts[row]:ends[row]][ratings[starts[row]:ends[row]] >= self.relevantRating]
+            if len(relevant) == 0:
+                continue
+            rankedUsers += 1
+            hits = np.in1d(topItems[row], relevant)
+            precision += hits.sum() / float(self.k)
+            recall += hits.sum() / float(len(relevant))
+            ndcg += discounts[:len(hits)][hits].sum() / idealDcg[min(len(relevant), self.k)]
+
+        return {"ratings": len(errors),
+                "squaredError": float(np.dot(errors, errors)),
+                "absoluteError": float(np.abs(errors).sum()),
+                "rankedUsers": rankedUsers,
+                "precision": precision,
+                "recall": recall,
+                "ndcg": ndcg,
+                "recommended": np.unique(topItems[topItems >= 0])}
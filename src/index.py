@@ -0,0 +1,220 @@
+# Title: Item Index File
+# Author: Kenan Mesic
+# Date: 10/18/26
+# Purpose: All classes and methods involved with approximate nearest neighbour
+#          search over the item factors of a trained model
+
+import numpy as np
+from scipy import sparse
+from store import ModelStore
+
+
+# Class: ItemIndex
+# Purporse: Inverted file index over item vectors. The items are split into
+#           clusters by spherical k-means and a search only scores the items of
+#           the clusters closest to the query, more probed clusters trades
+#           speed for recall. Supports maximum inner product search by adding
+#           one extra dimension to every item so the inner product becomes a
+#           cosine, and plain cosine search
+class ItemIndex:
+
+    METRIC_IP = "ip"
+    METRIC_COSINE = "cosine"
+    VERSION = 1
+    SAMPLE_PER_CLUSTER = 64
+
+    # Searches score this share of the clusters by default. The nearest beers
+    # by cosine spread over more clusters than the best beers for a user, on
+    # 20000 synthetic reviews an eighth of them finds about 0.65 of the top 10
+    # similar beers of an sgd model while a third finds over 0.9, checked by
+    # test_similarRecall
+    PROBE_DIVISORS = {METRIC_IP: 8, METRIC_COSINE: 3}
+
+
+    # Method: Constructor
+    # Purpose: Create an empty index
+    # Arguments: metric (optional) - ip for inner product or cosine
+    #            clusters (optional) - amount of clusters, defaults to the
+    #                                  square root of the amount of items
+    #            probes (optional) - clusters scored by a search, defaults to
+    #                                an eighth of the clusters for inner product
+    #                                and a third for cosine
+    #            iterations (optional) - iterations of k-means
+    #            seed (optional) - seed of the k-means initialization
+    def __init__(self, metric=METRIC_IP, clusters=None, probes=None, iterations=10, seed=None):
+        self.metric = metric
+        self.clusters = clusters
+        self.probes = probes
+        self.iterations = iterations
+        self.seed = seed
+
+
+    # Method: build
+    # Purpose: Cluster the items and store them cluster by cluster. Clustering
+    #          is done in float64, the stored vectors and centroids keep the
+    #          precision of the item vectors
+    # Arguments: vectors (required) - the item vectors, one row per item
+    # Return: None
+    def build(self, vectors):
+        dtype = np.float32 if np.asarray(vectors).dtype == np.float32 else np.float64
+        vectors = np.asarray(vectors, dtype=np.float64)
+        totalItems = vectors.shape[0]
+        if self.clusters == None:
+            self.clusters = max(1, int(np.sqrt(totalItems)))
+        self.clusters = min(self.clusters, totalItems)
+        if self.probes == None:
+            self.probes = max(1, self.clusters // self.PROBE_DIVISORS[self.metric])
+
+        # Only the direction of the items decides their cluster
+        directions = self.directions(vectors)
+        self.centroids = self.kmeans(directions)
+        assignments = np.argmax(np.dot(directions, self.centroids.T), axis=1)
+
+        # Keep the items of each cluster next to each other, like a CSR matrix
+        self.order = np.argsort(assignments, kind="mergesort")
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=self.clusters))])
+        self.vectors = vectors[self.order]
+        if self.metric == self.METRIC_COSINE:
+            self.vectors = directions[self.order]
+        self.vectors = self.vectors.astype(dtype, copy=False)
+        self.centroids = self.centroids.astype(dtype, copy=False)
+
+
+    # Method: directions
+    # Purpose: Unit vectors used for clustering. For inner product every item is
+    #          scaled by the largest norm and given one more dimension making
+    #          them all of length one, so the closest direction to a query is
+    #          the item with the largest inner product
+    # Arguments: vectors (required) - the item vectors
+    # Return: the unit vectors
+    def directions(self, vectors):
+        norms = np.sqrt(np.einsum('ij,ij->i', vectors, vectors))
+        if self.metric == self.METRIC_IP:
+            scaled = vectors / max(norms.max(), 1e-12)
+            extra = np.sqrt(np.maximum(0.0, 1.0 - np.einsum('ij,ij->i', scaled, scaled)))
+            return np.hstack([scaled, extra[:, np.newaxis]])
+        return vectors / np.maximum(norms, 1e-12)[:, np.newaxis]
+
+
+    # Method: queryDirections
+    # Purpose: Unit vectors of the queries in the same space as directions, the
+    #          extra dimension of a query is zero for inner product
+    # Arguments: queries (required) - the query vectors, one row per query
+    # Return: the unit vectors
+    def queryDirections(self, queries):
+        norms = np.sqrt(np.einsum('ij,ij->i', queries, queries))
+        units = queries / np.maximum(norms, 1e-12)[:, np.newaxis]
+        if self.metric == self.METRIC_IP:
+            return np.hstack([units, np.zeros((len(queries), 1))])
+        return units
+
+
+    # Method: kmeans
+    # Purpose: Spherical k-means on a sample of the items, the centroids are the
+    #          normalized means of their items and an empty cluster restarts
+    #          from a random item
+    # Arguments: directions (required) - unit vectors of the items
+    # Return: the unit centroids, one row per cluster
+    def kmeans(self, directions):
+        randomState = np.random.RandomState(self.seed)
+        sample = min(len(directions), self.SAMPLE_PER_CLUSTER * self.clusters)
+        directions = directions[randomState.choice(len(directions), sample, replace=False)]
+        centroids = directions[randomState.choice(len(directions), self.clusters, replace=False)]
+        for iteration in range(0, self.iterations):
+            # Sum the items of each cluster with a sparse matrix of the assignments
+            assignments = np.argmax(np.dot(directions, centroids.T), axis=1)
+            members = sparse.csr_matrix((np.ones(len(directions)), (assignments, np.arange(len(directions)))),
+                                        shape=(self.clusters, len(directions)))
+            sums = members.dot(directions)
+
+            empty = np.nonzero(np.bincount(assignments, minlength=self.clusters) == 0)[0]
+            sums[empty] = directions[randomState.choice(len(directions), len(empty))]
+            norms = np.sqrt(np.einsum('ij,ij->i', sums, sums))
+            centroids = sums / np.maximum(norms, 1e-12)[:, np.newaxis]
+        return centroids
+
+
+    # Method: search
+    # Purpose: Find the top items of each query by only scoring the items of
+    #          the probed clusters
+    # Arguments: queries (required) - the query vectors, one row per query
+    #            n (required) - amount of items per query
+    #            probes (optional) - clusters to score, defaults to the probes
+    #                                of the index
+    #            exclude (optional) - CSR matrix with a row per query whose
+    #                                 stored columns are skipped
+    # Return: tuple of the items and their scores, one row per query in order
+    #         of best first, slots without an item have an item of -1
+    def search(self, queries, n, probes=None, exclude=None):
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float64))
+        if probes == None:
+            probes = self.probes
+        probes = min(probes, self.clusters)
+        items = -np.ones((len(queries), n), dtype=np.int64)
+        scores = np.full((len(queries), n), -np.inf)
+
+        # Rank the clusters of every query at once
+        centroidScores = np.dot(self.queryDirections(queries), self.centroids.T)
+        probed = np.argpartition(-centroidScores, probes - 1, axis=1)[:, :probes]
+
+        for row in range(0, len(queries)):
+            candidates = np.concatenate([np.arange(self.offsets[cluster], self.offsets[cluster + 1])
+                                         for cluster in probed[row]])
+            candidateScores = np.dot(self.vectors[candidates], queries[row])
+            candidateItems = self.order[candidates]
+
+            # Skip the excluded items of the query
+            if exclude is not None:
+                skipped = exclude.indices[exclude.indptr[row]:exclude.indptr[row + 1]]
+                keep = ~np.in1d(candidateItems, skipped)
+                candidateScores = candidateScores[keep]
+                candidateItems = candidateItems[keep]
+
+            # Partial sort of the candidates for the top n
+            found = min(n, len(candidateItems))
+            if found == 0:
+                continue
+            top = np.argpartition(-candidateScores, found - 1)[:found]
+            top = top[np.argsort(-candidateScores[top], kind="mergesort")]
+            items[row, :found] = candidateItems[top]
+            scores[row, :found] = candidateScores[top]
+
+        return items, scores
+
+
+    # Method: save
+    # Purpose: Save the index into its own directory
+    # Arguments: directory (required) - where to save the index
+    # Return: None
+    def save(self, directory):
+        arrays = {"centroids": self.centroids,
+                  "order": self.order,
+                  "offsets": self.offsets,
+                  "vectors": self.vectors}
+        meta = {"indexVersion": self.VERSION,
+                "metric": self.metric,
+                "clusters": self.clusters,
+                "probes": self.probes,
+                "iterations": self.iterations,
+                "seed": self.seed}
+        ModelStore(directory).save(arrays, meta, {})
+
+
+    # Method: load
+    # Purpose: Load an index saved by save, memory mapping its arrays
+    # Arguments: directory (required) - where the index was saved
+    # Return: None
+    def load(self, directory):
+        arrays, meta, mappings = ModelStore(directory).load()
+        if meta["indexVersion"] != self.VERSION:
+            raise ValueError("Index in " + directory + " has version " + str(meta["indexVersion"]) +
+                             ", only version " + str(self.VERSION) + " is supported")
+        self.metric = meta["metric"]
+        self.clusters = meta["clusters"]
+        self.probes = meta["probes"]
+        self.iterations = meta["iterations"]
+        self.seed = meta["seed"]
+        self.centroids = arrays["centroids"]
+        self.order = arrays["order"]
+        self.offsets = arrays["offsets"]
+        self.vectors = arrays["vectors"]
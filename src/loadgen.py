@@ -0,0 +1,131 @@
+# Title: Load Generator File
+# Author: Kenan Mesic
+# Date: 10/18/26
+# Purpose: All classes and methods involved with sending load to the
+#          recommendation server and measuring its latency and throughput
+
+import sys
+import json
+import time
+import random
+import threading
+import urllib2
+import numpy as np
+
+
+# Class: LoadGenerator
+# Purporse: Sends requests from several threads at once to the recommendation
+#           server running on localhost, then reports the throughput and the
+#           latencies seen by the clients next to the metrics of the server
+class LoadGenerator:
+
+    URL = "http://127.0.0.1:8080"
+
+
+    # Method: Constructor
+    # Purpose: Creates the load generator from the command line arguments
+    # Arguments: args (required) - command line arguments of the python program
+    def __init__(self, args):
+        self.args = args
+
+
+    # Method: run
+    # Purpose: Sends the requests and reports the results
+    #          Options:
+    #            -url {url}          address of the server
+    #            -c {clients}        threads sending requests at once
+    #            -n {requests}       total amount of requests
+    #            -users {users}      requests go to random users below this idx
+    #            -similar {percent}  percent of the requests for similar beers
+    #            -seed {seed}        seed of the random users and beers
+    # Arguments: None
+    # Return: dict of the results
+    def run(self):
+        url = self.URL
+        clients = 8
+        totalRequests = 1000
+        totalUsers = 1000
+        similarPercent = 0
+        seed = 0
+
+        try:
+            if ("-url" in self.args):
+                url = self.args[self.args.index("-url") + 1]
+            if ("-c" in self.args):
+                clients = int(self.args[self.args.index("-c") + 1])
+            if ("-n" in self.args):
+                totalRequests = int(self.args[self.args.index("-n") + 1])
+            if ("-users" in self.args):
+                totalUsers = int(self.args[self.args.index("-users") + 1])
+            if ("-similar" in self.args):
+                similarPercent = int(self.args[self.args.index("-similar") + 1])
+            if ("-seed" in self.args):
+                seed = int(self.args[self.args.index("-seed") + 1])
+        except (ValueError, IndexError) as e:
+            print "Invalid Usage of arguments in load generator"
+            return
+
+        # Build every request up front so the clients only send them
+        randomState = random.Random(seed)
+        paths = []
+        for idx in range(0, totalRequests):
+            if randomState.randint(1, 100) <= similarPercent:
+                paths.append("/similar?beer=%d&n=10" % randomState.randrange(0, 100))
+            else:
+                paths.append("/recommend?user=%d&n=20" % randomState.randrange(0, totalUsers))
+
+        latencies = []
+        errors = [0]
+        lock = threading.Lock()
+        pending = list(reversed(paths))
+
+        def client():
+            while True:
+                with lock:
+                    if len(pending) == 0:
+                        return
+                    path = pending.pop()
+                start = time.time()
+                try:
+                    urllib2.urlopen(url + path).read()
+                    failed = False
+                except (urllib2.URLError, IOError) as e:
+                    failed = True
+                seconds = time.time() - start
+                with lock:
+                    latencies.append(seconds)
+                    if failed:
+                        errors[0] += 1
+
+        start = time.time()
+        threads = [threading.Thread(target=client) for idx in range(0, clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        seconds = time.time() - start
+
+        values = np.array(latencies) * 1000
+        result = {"requests": len(latencies),
+                  "errors": errors[0],
+                  "seconds": seconds,
+                  "requestsPerSec": len(latencies) / seconds if seconds > 0 else 0.0,
+                  "p50Ms": float(np.percentile(values, 50)),
+                  "p99Ms": float(np.percentile(values, 99))}
+        print("%d requests from %d clients in %.3fs, %.1f requests/sec, %d errors" %
+              (result["requests"], clients, seconds, result["requestsPerSec"], result["errors"]))
+        print("Client latency p50 %.2fms p99 %.2fms" % (result["p50Ms"], result["p99Ms"]))
+
+        # The server reports its own latencies and batch sizes
+        try:
+            result["server"] = json.loads(urllib2.urlopen(url + "/metrics").read())
+            print("Server metrics: " + json.dumps(result["server"], sort_keys=True))
+        except (urllib2.URLError, IOError) as e:
+            print "Could not read the metrics of the server"
+        return result
+
+
+# Run the load generator with the command line arguments
+if __name__ == "__main__":
+    loadGenerator = LoadGenerator(sys.argv)
+    loadGenerator.run()
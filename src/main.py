@@ -6,6 +6,10 @@
 import sys
 from process import DataProcesser
 from recommender import Recommender
+from store import RatingsStore
+from split import RatingsSplitter
+from profiler import Profiler
+from content import ContentFeatures
 
 
 # Class: Main
@@ -13,6 +17,11 @@ from recommender import Recommender
 #           the program including command line arguments
 class Main:
 
+    FILE_REVIEWS = '../data/Beeradvocate.txt.gz'
+    MIN_BEER_RATINGS = 20
+    MIN_USER_RATINGS = 10
+    TRAIN_PERCENT = 75
+
 
     # Method: Constructor
     # Purpose: Creates the main executer object to run the entire program
@@ -22,12 +31,36 @@ class Main:
 
 
     # Method: run
-    # Purpose: Runs the entire program - trains and evaluates the recommender,
-    #                                    plus handles all IO of the program
+    # Purpose: Runs the entire program, profiling every stage into a json trace
+    #          if asked to, ex. -trace ../data/trace.json
     # Arguments: None
     # Return: None
     def run(self):
-        recommendMachine = None
+        self.profiler = None
+        traceFile = None
+        if ("-trace" in self.args):
+            try:
+                idxTrace = self.args.index("-trace")
+                traceFile = self.args[idxTrace + 1]
+            except IndexError as e:
+                print "Invalid Usage of arguments in program for -trace"
+                return
+            self.profiler = Profiler()
+
+        try:
+            self.runPipeline()
+        finally:
+            if self.profiler is not None:
+                self.profiler.save(traceFile)
+                print("Saved trace to " + traceFile)
+
+
+    # Method: runPipeline
+    # Purpose: Runs the entire pipeline - trains and evaluates the recommender,
+    #                                     plus handles all IO of the program
+    # Arguments: None
+    # Return: None
+    def runPipeline(self):
         saveToFile = False
         normalizeDataBefore = False
         totalRatings = 100000
@@ -41,7 +74,125 @@ class Main:
                 print "Invalid Usage of arguments in program for -tr"
                 return
 
-        # Whether or not to save the training matrix to a file, ex. -sf
+        # How to split the ratings into training and testing, ex. -split temporal
+        # random shuffles, temporal tests on the newest ratings and last leaves
+        # the newest rating of every user out
+        splitMethod = RatingsSplitter.RANDOM
+        if ("-split" in self.args):
+            try:
+                idxSplit = self.args.index("-split")
+                splitMethod = self.args[idxSplit + 1]
+            except IndexError as e:
+                print "Invalid Usage of arguments in program for -split"
+                return
+            if splitMethod not in RatingsSplitter.METHODS:
+                print("Split needs to be one of " + ",".join(RatingsSplitter.METHODS))
+                return
+
+        # Seed of the random split, ex. -seed 0
+        splitSeed = None
+        if ("-seed" in self.args):
+            try:
+                idxSeed = self.args.index("-seed")
+                splitSeed = int(self.args[idxSeed + 1])
+            except (ValueError, IndexError) as e:
+                print "Invalid Usage of arguments in program for -seed"
+                return
+
+        # Precision of the matrices and factors, sums are still in float64,
+        # ex. -dtype float32
+        dtype = "float64"
+        if ("-dtype" in self.args):
+            try:
+                idxDtype = self.args.index("-dtype")
+                dtype = self.args[idxDtype + 1]
+            except IndexError as e:
+                print "Invalid Usage of arguments in program for -dtype"
+                return
+            if dtype not in Recommender.DTYPES:
+                print("Dtype needs to be one of " + ",".join(Recommender.DTYPES))
+                return
+
+        # The saved ratings of a random shuffle keep their key from before splits were chosen
+        splitKey = None
+        if splitMethod != RatingsSplitter.RANDOM or splitSeed != None:
+            splitKey = [splitMethod, splitSeed]
+
+        # Use the model saved by -savemodel instead of training, ex. -loadmodel ../data/model
+        if ("-loadmodel" in self.args):
+            try:
+                idxLoad = self.args.index("-loadmodel")
+                modelDirectory = self.args[idxLoad + 1]
+            except IndexError as e:
+                print "Invalid Usage of arguments in program for -loadmodel"
+                return
+
+            print("Loading Model from " + modelDirectory)
+            recommendMachine = Recommender(empty=True, profiler=self.profiler)
+            recommendMachine.loadModel(modelDirectory)
+            print("Loaded " + recommendMachine.model + " trained with " + str(recommendMachine.trainingInfo))
+
+            # Update the model with a file of new reviews and save it back, the
+            # new ratings are also appended to the saved ratings with -sp,
+            # ex. -loadmodel ../data/model -update ../data/new_reviews.txt.gz
+            if ("-update" in self.args):
+                try:
+                    idxUpdate = self.args.index("-update")
+                    updateFile = self.args[idxUpdate + 1]
+                except IndexError as e:
+                    print "Invalid Usage of arguments in program for -update"
+                    return
+
+                totalUsers, totalItems = recommendMachine.trainingMatrix.shape
+                hadIndex = recommendMachine.itemIndex is not None
+                dataProcessor = DataProcesser(profiler=self.profiler)
+                newRatings = dataProcessor.processNewReviews(updateFile, totalUsers, totalItems,
+                                                             recommendMachine.mappings.get("users", {}),
+                                                             recommendMachine.mappings.get("beerIds", {}),
+                                                             recommendMachine.mappingIdxToBeer)
+                recommendMachine.updateModel(newRatings,
+                                             dataProcessor.totalUsersReviewed,
+                                             dataProcessor.totalBeersReviewed)
+                recommendMachine.mappingIdxToBeer = dataProcessor.mappingIdxToBeer
+                recommendMachine.mappings["users"] = dataProcessor.mappingIdxToUser
+                recommendMachine.mappings["beerIds"] = dataProcessor.mappingIdxToBeerId
+
+                if ("-sp" in self.args):
+                    store = RatingsStore()
+                    cacheKey = store.cacheKey(self.FILE_REVIEWS, totalRatings, self.MIN_BEER_RATINGS,
+                                              self.MIN_USER_RATINGS, self.TRAIN_PERCENT, splitKey)
+                    mappings = dict(recommendMachine.mappings)
+                    mappings["beers"] = recommendMachine.mappingIdxToBeer
+                    if store.append(cacheKey, newRatings, dataProcessor.totalUsersReviewed,
+                                    dataProcessor.totalBeersReviewed, mappings):
+                        print("Appended the new ratings to " + store.path(cacheKey))
+                    else:
+                        print "No saved ratings for these settings to append the new ratings to"
+
+                # The index of the old factors is stale, so rebuild it
+                if hadIndex:
+                    recommendMachine.buildIndex()
+
+                print("Saving Model to " + modelDirectory)
+                recommendMachine.saveModel(modelDirectory)
+
+            # Build or report the index of the model, ex. -index
+            if not self.runIndex(recommendMachine):
+                return
+
+            # Recommend the beers with too few ratings by their reviews, ex. -content
+            if not self.runContent(recommendMachine, totalRatings, recommendMachine.mappings):
+                return
+
+            # Print some recommendations to see revelance of the machine
+            recommendMachine.printRecommendations(user=0)
+
+            if ("-spred" in self.args):
+                print "Saving Recommendations"
+                recommendMachine.saveRecommendations()
+            return
+
+        # Whether or not to save the processed ratings to a file, ex. -sf
         if ("-sf" in self.args):
             saveToFile = True
 
@@ -50,24 +201,56 @@ class Main:
         if ("-ndb" in self.args):
             normalizeDataBefore = True
 
-        # Whether to grab the training matrix from a file, ex. -sp
+        # Whether to grab the ratings from the saved file, ex. -sp
+        # The saved ratings are only used when built from the same reviews file,
+        # amount of ratings and filters
+        store = RatingsStore()
+        cacheKey = store.cacheKey(self.FILE_REVIEWS, totalRatings, self.MIN_BEER_RATINGS,
+                                  self.MIN_USER_RATINGS, self.TRAIN_PERCENT, splitKey)
+        cached = None
         if ("-sp" in self.args):
-            print "Building Recommender Machine"
-            recommendMachine = Recommender(saveToFile=saveToFile,
-                                           normalizeDataBefore=normalizeDataBefore,
-                                           readFromFiles=True)
+            cached = store.load(cacheKey)
+            if cached == None:
+                print "No saved ratings for these settings, processing the reviews"
+
+        if cached != None:
+            print("Loaded saved ratings from " + store.path(cacheKey))
+            training = cached["training"]
+            testing = cached["testing"]
+            totalUsers = cached["totalUsers"]
+            totalItems = cached["totalItems"]
+            mappingIdxToBeer = cached["mappings"]["beers"]
+            mappings = cached["mappings"]
 
         # Otherwise build the training matrix by going through the ratings data
         else:
 
+            # Number of processes parsing the reviews file, ex. -pw 8
+            parseWorkers = 1
+            if ("-pw" in self.args):
+                try:
+                    idxPw = self.args.index("-pw")
+                    parseWorkers = int(self.args[idxPw + 1])
+                except (ValueError, IndexError) as e:
+                    print "Invalid Usage of arguments in program for -pw"
+                    return
+
             # Process all the data
             print("Processing " + str(totalRatings) + " ratings")
-            dataProcessor = DataProcesser()
-            dataProcessor.processReviews('../data/Beeradvocate.txt.gz', totalRatings)
+            dataProcessor = DataProcesser(profiler=self.profiler)
+
+            # Report the speedup of parsing in parallel against serially, ex. -pwcheck
+            if ("-pwcheck" in self.args):
+                dataProcessor.compareParsing(self.FILE_REVIEWS, totalRatings, workers=parseWorkers)
+
+            dataProcessor.processReviews(self.FILE_REVIEWS, totalRatings,
+                                         minBeerRatings=self.MIN_BEER_RATINGS,
+                                         minUserRatings=self.MIN_USER_RATINGS,
+                                         workers=parseWorkers)
             dataProcessor.parseUsers('../data/gender_age.json')
-            dataProcessor.createTrainingTestingData(75)
-            print(len(dataProcessor.training))
-            print(len(dataProcessor.testing))
+            dataProcessor.createTrainingTestingData(self.TRAIN_PERCENT, method=splitMethod, seed=splitSeed)
+            print(len(dataProcessor.training[0]))
+            print(len(dataProcessor.testing[0]))
 
             """ DEBUGGING
             count = 0
@@ -78,27 +261,47 @@ class Main:
                 print review
             """
 
-            # Calculate the sparsity of the training matrix
-            numerator = float(len(dataProcessor.training))
-            denominator = float(dataProcessor.totalUsersReviewed * dataProcessor.totalBeersReviewed)
-            sparsity = numerator/denominator
-            sparsity *= 100
-            print("Sparsity Percentage: " + str(sparsity))
-
-            # Build the reccommender machine
-            print "Building Recommender Machine"
-            recommendMachine = Recommender(dataProcessor.training,
-                                           dataProcessor.testing,
-                                           dataProcessor.totalUsersReviewed,
-                                           dataProcessor.totalBeersReviewed,
-                                           saveToFile=saveToFile,
-                                           normalizeDataBefore=normalizeDataBefore,
-                                           readFromFiles=False)
+            training = dataProcessor.training
+            testing = dataProcessor.testing
+            totalUsers = dataProcessor.totalUsersReviewed
+            totalItems = dataProcessor.totalBeersReviewed
+            mappingIdxToBeer = dataProcessor.mappingIdxToBeer
+            mappings = {"beers": dataProcessor.mappingIdxToBeer,
+                        "beerIds": dataProcessor.mappingIdxToBeerId,
+                        "users": dataProcessor.mappingIdxToUser}
+
+            # Save the ratings to be used for later, ex. -sf or -sp
+            if saveToFile or ("-sp" in self.args):
+                print("Saving ratings to " + store.path(cacheKey))
+                store.save(cacheKey, training, testing, totalUsers, totalItems, mappings)
+
+        # Calculate the sparsity of the training matrix
+        numerator = float(len(training[0]))
+        denominator = float(totalUsers * totalItems)
+        sparsity = numerator/denominator
+        sparsity *= 100
+        print("Sparsity Percentage: " + str(sparsity))
+
+        # Build the reccommender machine
+        print "Building Recommender Machine"
+        recommendMachine = Recommender(training,
+                                       testing,
+                                       totalUsers,
+                                       totalItems,
+                                       normalizeDataBefore=normalizeDataBefore,
+                                       readFromFiles=False,
+                                       mappingIdxToBeer=mappingIdxToBeer,
+                                       profiler=self.profiler,
+                                       dtype=dtype)
 
 
         alg = ""
 
+        # Use the predictions saved by -spred instead of training, ex. -lpred
         if ("-lpred" in self.args):
+            print "Loading Predictions"
+            recommendMachine.loadPredications()
+
             print "Saving the idx to beer file"
             recommendMachine.saveMappingFromIdxToBeer()
 
@@ -122,9 +325,28 @@ class Main:
             if ("svd" in self.args):
                 alg = "Matrix Factorization using SVDs"
 
+                # Use the randomized svd instead of svds, ex. -rsvd -oversample 10 -power 2
+                # or train with both and compare them, ex. -svdcheck
+                svdMethod = recommendMachine.SVD_RANDOMIZED if ("-rsvd" in self.args) else recommendMachine.SVD_LANCZOS
+                oversampling = 10
+                powerIterations = 2
+                try:
+                    if ("-oversample" in self.args):
+                        oversampling = int(self.args[self.args.index("-oversample") + 1])
+                    if ("-power" in self.args):
+                        powerIterations = int(self.args[self.args.index("-power") + 1])
+                except (ValueError, IndexError) as e:
+                    print "Invalid Usage of arguments in program for -oversample or -power"
+                    return
+
                 # Decompose the training matrix into two matrices with k latent factors using svd
                 print("Decomposing training matrix into smaller matrices with hidden features of " + str(kValue))
-                recommendMachine.matrix_factorization_svd(k=kValue)
+                if ("-svdcheck" in self.args):
+                    recommendMachine.compareSvd(k=kValue, oversampling=oversampling,
+                                                powerIterations=powerIterations, seed=0)
+                else:
+                    recommendMachine.matrix_factorization_svd(k=kValue, method=svdMethod, oversampling=oversampling,
+                                                              powerIterations=powerIterations)
 
                 # Create a predictions matrix to know all the predicted ratings
                 print "Creating Predictions"
@@ -135,11 +357,44 @@ class Main:
                 alg = "Matrix Factorization using Stochastic Gradient Descent"
                 iterations = [1, 2, 5, 10, 25, 50, 100, 200]
 
+                # Number of ratings per sgd update, ex. -bs 256
+                batchSize = 1
+                if ("-bs" in self.args):
+                    try:
+                        idxBs = self.args.index("-bs")
+                        batchSize = int(self.args[idxBs + 1])
+                    except (ValueError, IndexError) as e:
+                        print "Invalid Usage of arguments in program for -bs"
+                        return
+
+                # Whether to learn user and item biases with sgd, ex. -bias
+                biases = ("-bias" in self.args)
+
+                # Number of processes walking blocks of the ratings in parallel, ex. -w 8
+                workers = 1
+                if ("-w" in self.args):
+                    try:
+                        idxW = self.args.index("-w")
+                        workers = int(self.args[idxW + 1])
+                    except (ValueError, IndexError) as e:
+                        print "Invalid Usage of arguments in program for -w"
+                        return
+
                 # Decompose the training matrix into two matrices with k latent factors using sgd
                 # and pass in the num of iterations to perform sgd on the training matrix
                 print("Decomposing training matrix into smaller matrices with hidden features of " + str(kValue))
                 print("Using sgd, with total iterations of: " + str(iterations[3]));
-                recommendMachine.stochastic_gradient_descent(k=kValue, iterations=iterations[3])
+
+                # Report the ratings/sec of more and more workers up to -w, ex. -sgdcheck -w 8
+                if ("-sgdcheck" in self.args):
+                    recommendMachine.compareSgd(workers, k=kValue, iterations=iterations[3], seed=0,
+                                                batch_size=batchSize, biases=biases)
+                else:
+                    recommendMachine.stochastic_gradient_descent(k=kValue,
+                                                                 iterations=iterations[3],
+                                                                 batch_size=batchSize,
+                                                                 biases=biases,
+                                                                 workers=workers)
 
                 # Create a predictions matrix to get all the predicted ratings
                 print "Creating Predictions"
@@ -160,21 +415,119 @@ class Main:
                 print "Creating Predictions"
                 recommendMachine.predict(alg=recommendMachine.MF_ALS)
 
+            # Use weighted alternating least squares over only the recorded ratings
+            elif ("wals" in self.args):
+                alg = "Matrix Factorization using Weighted Alternating least squares"
+                iterations = [1, 2, 5, 10, 25, 50, 100, 200]
+
+                # Number of threads solving the least squares, ex. -w 8
+                workers = None
+                if ("-w" in self.args):
+                    try:
+                        idxW = self.args.index("-w")
+                        workers = int(self.args[idxW + 1])
+                    except (ValueError, IndexError) as e:
+                        print "Invalid Usage of arguments in program for -w"
+                        return
+
+                # Whether to treat the ratings as implicit feedback, ex. -implicit
+                implicit = ("-implicit" in self.args)
+
+                print("Decomposing training matrix into smaller matrices with hidden features of " + str(kValue))
+                print("Using wals, with total iterations of: " + str(iterations[2]));
+                recommendMachine.weighted_alternating_least_squares(k=kValue,
+                                                                    iterations=iterations[2],
+                                                                    implicit=implicit,
+                                                                    workers=workers)
+
+                # Create a predictions matrix to get all the predicted ratings
+                print "Creating Predictions"
+                recommendMachine.predict(alg=recommendMachine.MF_WALS)
+
+            # Learn the overall, appearance, aroma, palate and taste ratings together
+            elif ("aspects" in self.args):
+                alg = "Multi-Aspect Matrix Factorization"
+                iterations = [1, 2, 5, 10, 25, 50, 100, 200]
+
+                # Number of ratings per update, ex. -bs 256
+                batchSize = 256
+                if ("-bs" in self.args):
+                    try:
+                        idxBs = self.args.index("-bs")
+                        batchSize = int(self.args[idxBs + 1])
+                    except (ValueError, IndexError) as e:
+                        print "Invalid Usage of arguments in program for -bs"
+                        return
+
+                print("Decomposing training matrix into smaller matrices with hidden features of " + str(kValue))
+                print("Using aspects, with total iterations of: " + str(iterations[3]));
+                recommendMachine.multi_aspect_factorization(k=kValue,
+                                                            iterations=iterations[3],
+                                                            batch_size=batchSize)
+
+                # Every aspect is scored on the testing ratings, overall is
+                # also evaluated as usual below
+                recommendMachine.evaluateAspects()
+
+                # Create a predictions matrix of the overall ratings
+                print "Creating Predictions"
+                recommendMachine.predict(alg=recommendMachine.MF_SGD)
+
             # Otherwise error because no algorithm was specified to use
             else:
-                print "You need to specify an algorithm for matrix factorization to use.\nEx. -mf sgd | -mf 10 sgd"
+                print "You need to specify an algorithm for matrix factorization to use.\nEx. -mf sgd | -mf 10 sgd | -mf 10 wals"
                 return
 
         # Otherwise default to perform user item collaborative filtering
         else:
             alg = "User Item Collaborative Filtering"
 
+            # Keep only the top neighbours of every user, ex. -nn 50
+            neighbours = None
+            if ("-nn" in self.args):
+                try:
+                    idxNn = self.args.index("-nn")
+                    neighbours = int(self.args[idxNn + 1])
+                except (ValueError, IndexError) as e:
+                    print "Invalid Usage of arguments in program for -nn"
+                    return
+
+            # Number of threads computing the similarities, ex. -w 8
+            workers = None
+            if ("-w" in self.args):
+                try:
+                    idxW = self.args.index("-w")
+                    workers = int(self.args[idxW + 1])
+                except (ValueError, IndexError) as e:
+                    print "Invalid Usage of arguments in program for -w"
+                    return
+
             print "Creating Similiarity Matrix"
-            recommendMachine.createSimMatrix(sim="cosine")
+            recommendMachine.createSimMatrix(sim="cosine", neighbours=neighbours, workers=workers)
 
             print "Creating Predictions"
             recommendMachine.predict()
 
+        # Build the index over the item factors of the model, ex. -index
+        if not self.runIndex(recommendMachine):
+            return
+
+        # Recommend the beers with too few ratings by their reviews, ex. -content
+        if not self.runContent(recommendMachine, totalRatings, mappings):
+            return
+
+        # Save the trained model to be loaded by -loadmodel, ex. -savemodel ../data/model
+        if ("-savemodel" in self.args):
+            try:
+                idxSave = self.args.index("-savemodel")
+                modelDirectory = self.args[idxSave + 1]
+            except IndexError as e:
+                print "Invalid Usage of arguments in program for -savemodel"
+                return
+
+            print("Saving Model to " + modelDirectory)
+            recommendMachine.saveModel(modelDirectory, mappings=mappings)
+
         # Print some recommendations to see revelance of the machine
         recommendMachine.printRecommendations(user=0)
 
@@ -190,6 +543,106 @@ class Main:
         error = recommendMachine.evaluate()
         print ("RMSE for " + alg + " : " + str(error))
 
+        # Evaluate the accuracy and the top k recommendations in chunks, ex. -metrics 10
+        if ("-metrics" in self.args):
+            idxMetrics = self.args.index("-metrics")
+            k = 10
+            try:
+                k = int(self.args[idxMetrics + 1])
+            except (ValueError, IndexError) as e:
+                print("Default value of k being used: " + str(k))
+
+            results = recommendMachine.evaluateAll(k=k)
+            print("RMSE %.4f, MAE %.4f, precision@%d %.4f, recall@%d %.4f, NDCG@%d %.4f, coverage %.4f "
+                  "over %d ratings of %d users in %.3fs" %
+                  (results["rmse"], results["mae"], k, results["precision"], k, results["recall"],
+                   k, results["ndcg"], results["coverage"], results["ratings"], results["users"], results["seconds"]))
+
+
+    # Method: runIndex
+    # Purpose: Build the approximate nearest neighbour index of the model with
+    #          -index and report its recall against exact search, then print the
+    #          beers similar to one with -similar
+    #          ex. -index -probes 4 -similar "Sierra Nevada Pale Ale"
+    # Arguments: recommendMachine (required) - the trained recommender
+    # Return: False if the arguments were invalid, otherwise True
+    def runIndex(self, recommendMachine):
+        # Number of clusters scored by every search, more gives better recall
+        probes = None
+        if ("-probes" in self.args):
+            try:
+                idxProbes = self.args.index("-probes")
+                probes = int(self.args[idxProbes + 1])
+            except (ValueError, IndexError) as e:
+                print "Invalid Usage of arguments in program for -probes"
+                return False
+
+        if ("-index" in self.args):
+            if recommendMachine.itemIndex == None:
+                print "Building Index"
+                recommendMachine.buildIndex(probes=probes)
+            recommendMachine.indexRecall(probes=probes)
+
+        if ("-similar" in self.args):
+            try:
+                idxSimilar = self.args.index("-similar")
+                beerName = self.args[idxSimilar + 1]
+            except IndexError as e:
+                print "Invalid Usage of arguments in program for -similar"
+                return False
+            try:
+                recommendMachine.printSimilarBeers(beerName, probes=probes)
+            except KeyError as e:
+                print e.args[0]
+        return True
+
+
+    # Method: runContent
+    # Purpose: Stream the text of the reviews into hashed bag of words features
+    #          of the beers with -content, then recommend the beers left out for
+    #          having too few ratings to the users by the content of the beers
+    #          they rated, saving them for every user with -spred
+    #          ex. -content -hashbits 18
+    # Arguments: recommendMachine (required) - the trained recommender
+    #            totalRatings (required) - total amount of reviews to go through
+    #            mappings (required) - mappings of the idxs, needs beerIds
+    # Return: False if the arguments were invalid, otherwise True
+    def runContent(self, recommendMachine, totalRatings, mappings):
+        if ("-content" not in self.args):
+            return True
+
+        # The amount of features is 2 ** hashbits, ex. -hashbits 20
+        hashBits = ContentFeatures.HASH_BITS
+        if ("-hashbits" in self.args):
+            try:
+                idxHashBits = self.args.index("-hashbits")
+                hashBits = int(self.args[idxHashBits + 1])
+            except (ValueError, IndexError) as e:
+                print "Invalid Usage of arguments in program for -hashbits"
+                return False
+
+        if "beerIds" not in mappings:
+            print "The ids of the beers are needed for -content, save the ratings or model again"
+            return True
+        itemBeerIds = [mappings["beerIds"][itemIdx] for itemIdx in range(0, recommendMachine.trainingMatrix.shape[1])]
+
+        print "Hashing the text of the reviews"
+        contentFeatures = ContentFeatures(hashBits=hashBits)
+        contentFeatures.process(self.FILE_REVIEWS, totalRatings)
+        contentFeatures.save()
+
+        # Print some of the cold beers recommended to the same user
+        beers, scores = contentFeatures.recommendCold(recommendMachine.trainingMatrix, itemBeerIds, [0], n=10)
+        print("Cold beers recommended by content for user 0:")
+        for beer, score in zip(beers[0], scores[0]):
+            if beer >= 0:
+                print("%s (%.3f)" % (contentFeatures.beerNames[beer], score))
+
+        if ("-spred" in self.args):
+            print "Saving Cold Recommendations"
+            contentFeatures.saveColdRecommendations(recommendMachine.trainingMatrix, itemBeerIds)
+        return True
+
 
 # Run the main with the command line arguments
 main = Main(sys.argv)
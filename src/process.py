@@ -5,7 +5,15 @@
 
 import gzip
 import json
-import random
+import tempfile
+import time
+from array import array
+from collections import deque
+from multiprocessing import Pool, cpu_count
+import numpy as np
+from profiler import profiledStage
+from split import RatingsSplitter
+from vocab import StringTable
 
 """
 Beer Review Structure in File:
@@ -26,26 +34,131 @@ review/text:
 """
 
 
+# Method: parseReviewLines
+# Purpose: Parse lines of the reviews file keeping only the fields the
+#          recommender uses, shared by the serial and parallel parsing. The
+#          values are stripped of the space after the colon
+# Arguments: lines (required) - iterable of the lines of the file
+#            keepText (optional) - add the text of the review to every record
+# Return: generator of (profileName, beerId, beerName, brewerId, style,
+#         overall, time, aspects) records, the aspects are the appearance,
+#         aroma, palate and taste ratings, nan when missing. With keepText
+#         the text of the review follows the aspects
+def parseReviewLines(lines, keepText=False):
+    beerId = None
+    beerName = None
+    brewerId = None
+    style = None
+    overall = None
+    reviewTime = None
+    profileName = None
+    aspects = dict((aspect, float("nan")) for aspect in DataProcesser.ASPECTS)
+
+    # Loop through all the lines of the file
+    for line in lines:
+        # Clean the file by striping all tabs and newlines
+        line = line.strip()
+        line = line.replace("\t", " ")
+
+        # If line is empty ingore
+        if line == '':
+            continue
+        # Get the keyValue Pair, the value itself may hold colons
+        keyValue = line.split(':', 1)
+
+        key = keyValue[0].split('/')
+        value = keyValue[1].strip()
+
+        # Determine if looking at beer or review, every other field is
+        # skipped and so is the text of the review unless it is kept
+        if key[0] == 'beer':
+            # Every review starts with the name of the beer, so the fields of
+            # the last review are reset to keep them from leaking into this one
+            if key[1] == 'name':
+                beerId = None
+                brewerId = None
+                style = None
+                overall = None
+                reviewTime = None
+                profileName = None
+                aspects = dict((aspect, float("nan")) for aspect in DataProcesser.ASPECTS)
+                beerName = value
+            elif key[1] == 'beerId':
+                beerId = value
+            elif key[1] == 'brewerId':
+                brewerId = value
+            elif key[1] == 'style':
+                style = value
+
+        elif key[0] == 'review':
+            if key[1] == 'overall':
+                overall = float(value)
+            elif key[1] in aspects:
+                aspects[key[1]] = float(value)
+            elif key[1] == 'time':
+                reviewTime = int(value)
+            elif key[1] == 'profileName':
+                profileName = value
+
+            # If at the end of the review, hand out the record
+            elif key[1] == 'text':
+                record = (profileName, beerId, beerName, brewerId, style, overall, reviewTime,
+                          tuple(aspects[aspect] for aspect in DataProcesser.ASPECTS))
+                yield record + (value,) if keepText else record
+
+
+# Method: parseReviewChunk
+# Purpose: Parse a chunk of whole reviews in a worker process, it lives outside
+#          of the class so multiprocessing is able to pickle it
+# Arguments: chunk (required) - text of the reviews
+# Return: list of (profileName, beerId, beerName, brewerId, style, overall,
+#         time, aspects) records
+def parseReviewChunk(chunk):
+    return list(parseReviewLines(chunk.split('\n')))
+
+
 # Class: DataProcesser
 # Purporse: Processes all data and exposes utility methods to perform
 #           operations on the data
 class DataProcesser:
 
+    FILE_BEER_COUNT = '../data/beer_count.json'
+
+    # Ratings of every review besides overall, in the order of the aspects column
+    ASPECTS = ["appearance", "aroma", "palate", "taste"]
+
+    # Amount of compact reviews buffered before being spilled to disk
+    SPILL_BLOCK = 65536
+
+    # Amount of decompressed bytes handed to a worker when parsing in parallel
+    PARSE_CHUNK = 8 * 1024 * 1024
+
 
     # Method: Constructor
     # Purpose: Create the Parser object and initialize storage for data
-    # Arguments: None
-    def __init__(self):
+    # Arguments: profiler (optional) - Profiler recording the stages, nothing is
+    #                                  recorded without one
+    def __init__(self, profiler=None):
+        self.profiler = profiler
         self.users = {}
         self.beers = {}
-        self.reviews = []
+        self.reviews = self.emptyReviews()
+        self.userTable = StringTable()
+        self.beerTable = StringTable()
+        self.brewerTable = StringTable()
+        self.styleTable = StringTable()
+        self.itemBrewers = np.zeros(0, dtype=np.int32)
+        self.itemStyles = np.zeros(0, dtype=np.int32)
         self.totalReviews = 0
         self.totalUsers = 0
         self.totalUserReviewed = 0
         self.totalBeersReviewed = 0
         self.totalItems = 0
-        self.training = []
-        self.testing = []
+        self.training = self.emptyReviews()
+        self.testing = self.emptyReviews()
+        self.mappingIdxToBeer = {}
+        self.mappingIdxToBeerId = {}
+        self.mappingIdxToUser = {}
 
 
     # Method: parseBeerFile
@@ -105,124 +218,399 @@ class DataProcesser:
                         self.totalReviews += 1
 
 
-    # Method: processReviews
-    # Purpose: Grab amount of reviews from the file and store in a array
-    #          If amount of reviews is less than amount passed in, then process
-    #          all reviews in file
+    # Method: streamReviews
+    # Purpose: Go through the reviews of the file one at a time without storing
+    #          them, keeping only the fields the recommender uses
     # Arguments: filename (required) - path to file trying to open
-    #            amount (optional) - total amount of reviews to process
+    #            amount (optional) - total amount of reviews to go through
     #                                defaults to 1 trillion
-    # Return: None
-    def processReviews(self, filename, amount=1000000000000):
-        self.reviews = []
-        review = {}
-        beers = {}
-        users = {}
-        uniqueIdxUser = 0
-        uniqueIdxItem = 0
-        filterIdxUser = 0
-        filterIdxItem = 0
-        self.totalReviews = 0
-        beersWithMoreRatings = {}
-        usersWithMoreRatings = {}
+    #            keepText (optional) - add the text of the review to every record
+    # Return: generator of (profileName, beerId, beerName, brewerId, style,
+    #         overall, time, aspects) records, followed by the text with keepText
+    def streamReviews(self, filename, amount=1000000000000, keepText=False):
+        totalReviews = 0
+        if totalReviews >= amount:
+            return
 
         # Open the gzip file
         with gzip.open(filename) as f:
-            # Loop through all the lines of the file
-            for line in f:
+            for record in parseReviewLines(f, keepText):
+                yield record
+
                 # If passed total reviews stop processing
-                if self.totalReviews >= amount:
+                totalReviews += 1
+                if totalReviews >= amount:
                     break
 
-                # Clean the file by striping all tabs and newlines
-                line = line.strip()
-                line = line.replace("\t", " ")
 
-                # If line is empty ingore
-                if line == '':
-                    continue
-                # Get the keyValue Pair
-                keyValue = line.split(':')
+    # Method: streamReviewsParallel
+    # Purpose: Same as streamReviews except the file is decompressed once and
+    #          split into chunks of whole reviews that are parsed by a pool of
+    #          worker processes. The records come back in the same order as the
+    #          file, and only a few chunks are in flight at a time so memory
+    #          stays bounded
+    # Arguments: filename (required) - path to file trying to open
+    #            amount (optional) - total amount of reviews to go through
+    #                                defaults to 1 trillion
+    #            workers (optional) - number of processes, defaults to all cores
+    # Return: generator of (profileName, beerId, beerName, brewerId, style,
+    #         overall, time, aspects) records
+    def streamReviewsParallel(self, filename, amount=1000000000000, workers=None):
+        if workers == None:
+            workers = cpu_count()
+        totalReviews = 0
+        if totalReviews >= amount:
+            return
+
+        pool = Pool(workers)
+        pending = deque()
+        chunks = self.readReviewChunks(filename)
+        try:
+            while True:
+                # Keep every worker busy with a chunk and one more waiting
+                while len(pending) < 2 * workers:
+                    chunk = next(chunks, None)
+                    if chunk == None:
+                        break
+                    pending.append(pool.apply_async(parseReviewChunk, (chunk,)))
+
+                if len(pending) == 0:
+                    break
 
-                key = keyValue[0].split('/')
-                value = keyValue[1]
+                for record in pending.popleft().get():
+                    yield record
 
-                # Determine if looking at beer or review
-                if key[0] == 'beer':
-                    # If on field name then new review starting
-                    if key[1] == 'name':
-                        review = {}
-
-                    # Used to count number of unique beers
-                    elif key[1] == 'beerId':
-                        if value in beers:
-                            #review["itemIdx"] = beers[value][0]
-                            #beers[value] = (beers[value][0], beers[value][1] + 1)
-                            beers[value] += 1
-                            if (beers[value] == 20):
-                                beersWithMoreRatings[value] = filterIdxItem
-                                filterIdxItem += 1
-                        else:
-                            beers[value] = 1
-                            #beers[value] = (uniqueIdxItem, 1)
-                            #review["itemIdx"] = uniqueIdxItem
-                            #uniqueIdxItem += 1
+                    # If passed total reviews stop processing
+                    totalReviews += 1
+                    if totalReviews >= amount:
+                        return
+        finally:
+            pool.terminate()
+            pool.join()
 
 
-                    review[key[1]] = value
+    # Method: readReviewChunks
+    # Purpose: Decompress the file in large blocks and cut them right before the
+    #          start of a review so every chunk holds only whole reviews
+    # Arguments: filename (required) - path to file trying to open
+    # Return: generator of the chunks of text
+    def readReviewChunks(self, filename):
+        remainder = ''
+        with gzip.open(filename) as f:
+            while True:
+                data = f.read(self.PARSE_CHUNK)
+                if not data:
+                    break
+                data = remainder + data
 
-                # Otherwise on a review
-                elif key[0] == 'review':
-                    review[key[1]] = value
+                # Every review starts with the name of the beer on a new line
+                cut = data.rfind('\nbeer/name:')
+                if cut < 0:
+                    remainder = data
+                    continue
+                remainder = data[cut + 1:]
+                yield data[:cut + 1]
 
-                    # Used to count number of unique users
-                    if key[1] == 'profileName':
-                        if value in users:
-                            #review["userIdx"] = users[value][0]
-                            #users[value] = (users[value][0], users[value][1] + 1)
-                            users[value] += 1
-                            if (users[value] == 10):
-                                usersWithMoreRatings[value] = filterIdxUser
-                                filterIdxUser += 1
-                        else:
-                            users[value] = 1
-                            #users[value] = (uniqueIdxUser, 1)
-                            #review["userIdx"] = uniqueIdxUser
-                            #uniqueIdxUser += 1
-
-                    # If at the end of the review, save the review to reviews
-                    elif key[1] == 'text':
-                        self.reviews.append(review)
-                        self.totalReviews += 1
+        if remainder != '':
+            yield remainder
 
 
-        # Count the total amount of unique beers and users from the reviews
-        #self.totalBeersReviewed = len(beers)
-        #self.totalUsersReviewed = len(users)
-        self.totalBeersReviewed = len(beersWithMoreRatings)
-        self.totalUsersReviewed = len(usersWithMoreRatings)
+    # Method: compareParsing
+    # Purpose: Parse the file serially and in parallel, checking both give the
+    #          same records and reporting the speedup of parsing in parallel
+    # Arguments: filename (required) - path to file trying to open
+    #            amount (optional) - total amount of reviews to go through
+    #            workers (optional) - number of processes, defaults to all cores
+    # Return: dict of the seconds of both, the speedup and whether they match
+    def compareParsing(self, filename, amount=1000000000000, workers=None):
+        start = time.time()
+        serial = list(self.streamReviews(filename, amount))
+        serialSeconds = time.time() - start
+
+        start = time.time()
+        parallel = list(self.streamReviewsParallel(filename, amount, workers))
+        parallelSeconds = time.time() - start
+
+        result = {"reviews": len(serial),
+                  "serialSeconds": serialSeconds,
+                  "parallelSeconds": parallelSeconds,
+                  "speedup": serialSeconds / parallelSeconds if parallelSeconds > 0 else float("inf"),
+                  "identical": serial == parallel}
+        print("Parsed %d reviews serially in %.3fs and in parallel in %.3fs, speedup %.2fx, identical: %s" %
+              (result["reviews"], serialSeconds, parallelSeconds, result["speedup"], result["identical"]))
+        return result
 
-        print self.totalBeersReviewed
-        print self.totalUsersReviewed
-        print len(beersWithMoreRatings)
-        print len(usersWithMoreRatings)
 
-        oldReviews = self.reviews
-        self.reviews = []
-        for review in oldReviews:
-            if review['profileName'] in usersWithMoreRatings and review['beerId'] in beersWithMoreRatings:
-                review["userIdx"] = usersWithMoreRatings[review['profileName']]
-                review["itemIdx"] = beersWithMoreRatings[review['beerId']]
-                self.reviews.append(review)
+    # Method: processReviews
+    # Purpose: Grab amount of reviews from the file, keeping only the users and
+    #          beers with enough ratings. The file is streamed once, interning
+    #          the profile names, beer ids, brewer ids and styles into string
+    #          tables and counting the ratings while spilling compact integer
+    #          coded reviews to a temporary file, then the spill file is
+    #          filtered into parallel typed columns, so the memory only grows
+    #          with the amount of unique strings plus a few bytes per review
+    #          If amount of reviews is less than amount passed in, then process
+    #          all reviews in file
+    # Arguments: filename (required) - path to file trying to open
+    #            amount (optional) - total amount of reviews to process
+    #                                defaults to 1 trillion
+    #            minBeerRatings (optional) - ratings needed to keep a beer
+    #            minUserRatings (optional) - ratings needed to keep a user
+    #            workers (optional) - number of processes parsing the file,
+    #                                 defaults to parsing serially
+    # Return: None
+    @profiledStage
+    def processReviews(self, filename, amount=1000000000000, minBeerRatings=20, minUserRatings=10, workers=1):
+        self.reviews = self.emptyReviews()
+        self.totalReviews = 0
+        self.userTable = StringTable()
+        self.beerTable = StringTable()
+        self.brewerTable = StringTable()
+        self.styleTable = StringTable()
+        beerNames = []
+        beerBrewers = array('i')
+        beerStyles = array('i')
+        beerCounts = array('l')
+        userCounts = array('l')
+        beerFilterIdxs = array('l')
+        userFilterIdxs = array('l')
+        filterIdxItem = 0
+        filterIdxUser = 0
+        block = self.newSpillBlock()
+
+        # Parse in parallel if asked to, either way the records come in file order
+        if workers == 1:
+            records = self.streamReviews(filename, amount)
+        else:
+            records = self.streamReviewsParallel(filename, amount, workers)
+
+        start = time.time()
+        spill = tempfile.TemporaryFile()
+        try:
+            for profileName, beerId, beerName, brewerId, style, overall, reviewTime, aspects in records:
+
+                # Used to count number of unique beers, each beer gets an integer code
+                # and its name, brewer and style are kept once
+                beerCode = self.beerTable.code(beerId)
+                if beerCode == len(beerCounts):
+                    beerNames.append(intern(beerName))
+                    beerBrewers.append(self.brewerTable.code(brewerId))
+                    beerStyles.append(self.styleTable.code(style))
+                    beerCounts.append(0)
+                    beerFilterIdxs.append(-1)
+                beerCounts[beerCode] += 1
+                if beerCounts[beerCode] == minBeerRatings:
+                    beerFilterIdxs[beerCode] = filterIdxItem
+                    filterIdxItem += 1
+
+                # Used to count number of unique users, each user gets an integer code
+                userCode = self.userTable.code(profileName)
+                if userCode == len(userCounts):
+                    userCounts.append(0)
+                    userFilterIdxs.append(-1)
+                userCounts[userCode] += 1
+                if userCounts[userCode] == minUserRatings:
+                    userFilterIdxs[userCode] = filterIdxUser
+                    filterIdxUser += 1
+
+                # Save the compact review, spilling to disk once the block is full
+                block[0].append(userCode)
+                block[1].append(beerCode)
+                block[2].append(overall)
+                block[3].append(reviewTime)
+                block[4].extend(aspects)
+                self.totalReviews += 1
+                if len(block[0]) >= self.SPILL_BLOCK:
+                    self.writeSpillBlock(spill, block)
+                    block = self.newSpillBlock()
+
+            self.writeSpillBlock(spill, block)
+            block = None
+            self.parseSeconds = time.time() - start
+            print("Parsed %d reviews in %.3fs" % (self.totalReviews, self.parseSeconds))
+
+            # Count the total amount of unique beers and users with enough ratings
+            self.totalBeersReviewed = filterIdxItem
+            self.totalUsersReviewed = filterIdxUser
+
+            print("Kept %d beers and %d users with enough ratings" % (self.totalBeersReviewed, self.totalUsersReviewed))
+
+            # Second pass over the spill file, keeping only the reviews of the users
+            # and beers with enough ratings as typed columns
+            userFilterIdxs = np.array(userFilterIdxs, dtype=np.int64)
+            beerFilterIdxs = np.array(beerFilterIdxs, dtype=np.int64)
+            columns = [[], [], [], [], []]
+            spill.seek(0)
+            for users, beers, ratings, times, aspects in self.readSpillBlocks(spill):
+                userIdxs = userFilterIdxs[users]
+                itemIdxs = beerFilterIdxs[beers]
+                keep = (userIdxs >= 0) & (itemIdxs >= 0)
+                columns[0].append(userIdxs[keep].astype(np.int32))
+                columns[1].append(itemIdxs[keep].astype(np.int32))
+                columns[2].append(ratings[keep])
+                columns[3].append(times[keep])
+                columns[4].append(aspects[keep])
+            self.reviews = tuple(np.concatenate(column) if column else empty
+                                 for column, empty in zip(columns, self.emptyReviews()))
+        finally:
+            spill.close()
+
+        # Store the mapping to be able to print out the beer recommendations later
+        # and the mappings from idx back to the ids of the beers and users, all
+        # of them come from the string tables
+        keptBeers = np.flatnonzero(beerFilterIdxs >= 0)
+        keptUsers = np.flatnonzero(userFilterIdxs >= 0)
+        self.mappingIdxToBeer = {}
+        self.mappingIdxToBeerId = {}
+        self.mappingIdxToUser = {}
+        for beerCode in keptBeers.tolist():
+            itemIdx = int(beerFilterIdxs[beerCode])
+            self.mappingIdxToBeer[itemIdx] = beerNames[beerCode]
+            self.mappingIdxToBeerId[itemIdx] = self.beerTable.value(beerCode)
+        for userCode in keptUsers.tolist():
+            self.mappingIdxToUser[int(userFilterIdxs[userCode])] = self.userTable.value(userCode)
+
+        # Codes of the brewer and style of every kept beer by idx of the item
+        self.itemBrewers = np.zeros(self.totalBeersReviewed, dtype=np.int32)
+        self.itemStyles = np.zeros(self.totalBeersReviewed, dtype=np.int32)
+        self.itemBrewers[beerFilterIdxs[keptBeers]] = np.array(beerBrewers, dtype=np.int32)[keptBeers]
+        self.itemStyles[beerFilterIdxs[keptBeers]] = np.array(beerStyles, dtype=np.int32)[keptBeers]
 
-        with open('../data/beer_count.json', 'w') as fp:
+        beers = {}
+        for beerCode, beerId in enumerate(self.beerTable.values):
+            beers[beerId] = beerCounts[beerCode]
+        with open(self.FILE_BEER_COUNT, 'w') as fp:
             json.dump(beers, fp, sort_keys=True, indent=4)
 
 
+    # Method: processNewReviews
+    # Purpose: Grab the reviews of a new batch for updating a trained model, the
+    #          users and beers already known keep their idx and new ones are
+    #          given the next idxs. Every review is kept since the model already
+    #          holds the ratings that passed the filters
+    # Arguments: filename (required) - path to the file of new reviews
+    #            totalUsers (required) - amount of users the model knows
+    #            totalItems (required) - amount of beers the model knows
+    #            mappingIdxToUser (required) - names of the known users by idx
+    #            mappingIdxToBeerId (required) - ids of the known beers by idx
+    #            mappingIdxToBeer (required) - names of the known beers by idx
+    #            amount (optional) - total amount of reviews to process
+    #            workers (optional) - number of processes parsing the file
+    # Return: tuple of the users, items, ratings, times and aspects numpy arrays
+    @profiledStage
+    def processNewReviews(self, filename, totalUsers, totalItems, mappingIdxToUser, mappingIdxToBeerId,
+                          mappingIdxToBeer, amount=1000000000000, workers=1):
+        userIdxs = dict((profileName, userIdx) for userIdx, profileName in mappingIdxToUser.iteritems())
+        beerIdxs = dict((beerId, itemIdx) for itemIdx, beerId in mappingIdxToBeerId.iteritems())
+        self.mappingIdxToUser = dict(mappingIdxToUser)
+        self.mappingIdxToBeerId = dict(mappingIdxToBeerId)
+        self.mappingIdxToBeer = dict(mappingIdxToBeer)
+        block = self.newSpillBlock()
+
+        # Parse in parallel if asked to, either way the records come in file order
+        if workers == 1:
+            records = self.streamReviews(filename, amount)
+        else:
+            records = self.streamReviewsParallel(filename, amount, workers)
+
+        for profileName, beerId, beerName, brewerId, style, overall, reviewTime, aspects in records:
+
+            # New beers are added after every beer the model knows
+            itemIdx = beerIdxs.get(beerId)
+            if itemIdx == None:
+                itemIdx = totalItems
+                totalItems += 1
+                beerIdxs[beerId] = itemIdx
+                self.mappingIdxToBeer[itemIdx] = beerName
+                self.mappingIdxToBeerId[itemIdx] = beerId
+
+            # Same for the new users
+            userIdx = userIdxs.get(profileName)
+            if userIdx == None:
+                userIdx = totalUsers
+                totalUsers += 1
+                userIdxs[profileName] = userIdx
+                self.mappingIdxToUser[userIdx] = profileName
+
+            block[0].append(userIdx)
+            block[1].append(itemIdx)
+            block[2].append(overall)
+            block[3].append(reviewTime)
+            block[4].extend(aspects)
+
+        self.totalUsersReviewed = totalUsers
+        self.totalBeersReviewed = totalItems
+        self.totalReviews = len(block[0])
+        print("Parsed %d new reviews, now %d users and %d beers" % (self.totalReviews, totalUsers, totalItems))
+
+        return (np.array(block[0], dtype=np.int32),
+                np.array(block[1], dtype=np.int32),
+                np.array(block[2], dtype=np.float32),
+                np.array(block[3], dtype=np.int64),
+                np.array(block[4], dtype=np.float32).reshape(-1, len(self.ASPECTS)))
+
+
+    # Method: emptyReviews
+    # Purpose: Create empty typed columns of reviews
+    # Arguments: None
+    # Return: tuple of the users, items, ratings, times and aspects numpy
+    #         arrays, the aspects have one column per aspect
+    def emptyReviews(self):
+        return (np.zeros(0, dtype=np.int32),
+                np.zeros(0, dtype=np.int32),
+                np.zeros(0, dtype=np.float32),
+                np.zeros(0, dtype=np.int64),
+                np.zeros((0, len(self.ASPECTS)), dtype=np.float32))
+
+
+    # Method: newSpillBlock
+    # Purpose: Create empty typed columns for a block of compact reviews
+    # Arguments: None
+    # Return: list of user codes, beer codes, ratings, times and aspects
+    #         columns, the aspects of every review one after another
+    def newSpillBlock(self):
+        return [array('i'), array('i'), array('f'), array('l'), array('f')]
+
+
+    # Method: writeSpillBlock
+    # Purpose: Append a block of compact reviews to the spill file
+    # Arguments: spill (required) - binary file to write to
+    #            block (required) - columns of the block
+    # Return: None
+    def writeSpillBlock(self, spill, block):
+        if len(block[0]) == 0:
+            return
+        np.array([len(block[0])], dtype=np.int64).tofile(spill)
+        np.array(block[0], dtype=np.int32).tofile(spill)
+        np.array(block[1], dtype=np.int32).tofile(spill)
+        np.array(block[2], dtype=np.float32).tofile(spill)
+        np.array(block[3], dtype=np.int64).tofile(spill)
+        np.array(block[4], dtype=np.float32).tofile(spill)
+
+
+    # Method: readSpillBlocks
+    # Purpose: Read back the blocks of compact reviews from the spill file
+    # Arguments: spill (required) - binary file to read from
+    # Return: generator of (userCodes, beerCodes, ratings, times, aspects) arrays
+    def readSpillBlocks(self, spill):
+        while True:
+            header = np.fromfile(spill, dtype=np.int64, count=1)
+            if len(header) == 0:
+                return
+            size = int(header[0])
+            users = np.fromfile(spill, dtype=np.int32, count=size)
+            beers = np.fromfile(spill, dtype=np.int32, count=size)
+            ratings = np.fromfile(spill, dtype=np.float32, count=size)
+            times = np.fromfile(spill, dtype=np.int64, count=size)
+            aspects = np.fromfile(spill, dtype=np.float32, count=size * len(self.ASPECTS))
+            yield users, beers, ratings, times, aspects.reshape(size, len(self.ASPECTS))
+
+
     # Method: parseUsers
     # Purpose: Parse all the users from the JSON file
     # Arguments: filename (required)- path to file trying to open
     # Return: None
+    @profiledStage
     def parseUsers(self, filename):
         self.users = {}
         with open(filename) as f:
@@ -240,25 +628,25 @@ class DataProcesser:
     # Arguments: None
     # Return: None
     def shuffleReviews(self):
-        random.shuffle(self.reviews)
+        order = np.random.permutation(len(self.reviews[0]))
+        self.reviews = tuple(column[order] for column in self.reviews)
 
 
     # Method: createTrainingTestingData
-    # Purpose: Shuffles the reviews and splits based on the percentage
+    # Purpose: Splits the reviews based on the percentage into training and
+    #          testing (users, items, ratings, times, aspects) columns
     # Arguments: percent (optional) - the amount of data to be in training,
     #                                 rest goes into test data,
     #                                 default is to put all into training
+    #            method (optional) - random, temporal by review/time or last
+    #                                to leave the newest rating of every user out
+    #            seed (optional) - seed of the random split, random when not given
     # Return: None
-    def createTrainingTestingData(self, percent=100):
-        # Shuffle the reviews randomly
-        self.shuffleReviews()
-
-        # Split the arrays according to what was passed in
-        percent = float(percent)
-        reviewsSplit = len(self.reviews) * (percent/100)
-        reviewsSplit = int(round(reviewsSplit))
-        self.training = self.reviews[:reviewsSplit]
-        self.testing = self.reviews[reviewsSplit:]
+    @profiledStage
+    def createTrainingTestingData(self, percent=100, method=RatingsSplitter.RANDOM, seed=None):
+        # Split the columns of the reviews, the reviews themselves are never shuffled
+        splitter = RatingsSplitter(self.reviews)
+        self.training, self.testing = splitter.split(method, percent, seed)
 
 
     # Method: printReviews
@@ -269,8 +657,11 @@ class DataProcesser:
     def printReviews(self, amount=None):
         # Default is print all reviews
         if amount == None:
-            amount = len(self.reviews)
+            amount = len(self.reviews[0])
 
-        # Print the amount of reviews
+        # Print the amount of reviews, one row of the columns at a time
+        users, items, ratings, times, aspects = self.reviews
         for i in range(0, amount):
-            print self.reviews[i]
+            review = {"userIdx": int(users[i]), "itemIdx": int(items[i]), "overall": float(ratings[i]), "time": int(times[i])}
+            review.update(zip(self.ASPECTS, aspects[i].tolist()))
+            print review
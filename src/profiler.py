@@ -0,0 +1,157 @@
+# Title: Profiler File
+# Author: Kenan Mesic
+# Date: 10/18/26
+# Purpose: All classes and methods involved with timing and measuring the memory
+#          of every stage of the recommender
+
+import os
+import json
+import time
+import resource
+import functools
+from contextlib import contextmanager
+from scipy import sparse
+
+
+# Method: profiledStage
+# Purpose: Decorator for methods of classes holding a profiler attribute, times
+#          the method as a stage when the profiler is set and otherwise calls it
+#          straight through
+# Arguments: func (required) - method to profile
+# Return: the decorated method
+def profiledStage(func):
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        profiler = getattr(self, "profiler", None)
+        if profiler is None:
+            return func(self, *args, **kwargs)
+        with profiler.stage(func.__name__, owner=self) as info:
+            result = func(self, *args, **kwargs)
+            if hasattr(result, "shape"):
+                info["result"] = profiler.describeMatrix(result)
+            return result
+    return wrapper
+
+
+# Class: Profiler
+# Purporse: Records an event for every stage with its wall time, CPU time, peak
+#           memory and the shapes of the matrices it left behind, plus events
+#           for every iteration of the training algorithms. Every event is
+#           handed to the callback if there is one and can be saved as a json
+#           trace
+class Profiler:
+
+    # Attributes of the recommender and processor described after every stage
+    MATRICES = ["trainingMatrix", "testingMatrix", "simMatrix", "prediction", "U", "Vt"]
+
+
+    # Method: Constructor
+    # Purpose: Create the profiler
+    # Arguments: callback (optional) - called with every event as a dict
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.events = []
+        self.depth = 0
+        self.start = time.time()
+
+
+    # Method: stage
+    # Purpose: Context manager recording an event for the stage run inside it
+    # Arguments: name (required) - name of the stage
+    #            owner (optional) - object whose matrices are described afterwards
+    # Return: dict of extra info to add to the event
+    @contextmanager
+    def stage(self, name, owner=None):
+        startWall = time.time()
+        startCpu = self.cpuSeconds()
+        startPeak = self.peakRssMb()
+        info = {}
+        self.depth += 1
+        try:
+            yield info
+        finally:
+            self.depth -= 1
+            peak = self.peakRssMb()
+            event = {"type": "stage",
+                     "name": name,
+                     "depth": self.depth,
+                     "start": startWall - self.start,
+                     "wallSeconds": time.time() - startWall,
+                     "cpuSeconds": self.cpuSeconds() - startCpu,
+                     "peakRssMb": peak,
+                     "peakRssGrowthMb": peak - startPeak}
+            if owner is not None:
+                event["matrices"] = self.describe(owner)
+            event.update(info)
+            self.emit(event)
+
+
+    # Method: iteration
+    # Purpose: Record an event for one iteration of a training algorithm
+    # Arguments: name (required) - name of the algorithm
+    #            info (optional) - anything else to record, ex. seconds
+    # Return: None
+    def iteration(self, name, **info):
+        event = {"type": "iteration", "name": name, "depth": self.depth, "start": time.time() - self.start}
+        event.update(info)
+        self.emit(event)
+
+
+    # Method: emit
+    # Purpose: Save the event and hand it to the callback
+    # Arguments: event (required) - the event to save
+    # Return: None
+    def emit(self, event):
+        self.events.append(event)
+        if self.callback is not None:
+            self.callback(event)
+
+
+    # Method: describe
+    # Purpose: Describe the shape, stored values and bytes of the matrices of an object
+    # Arguments: owner (required) - object holding the matrices
+    # Return: dict of the descriptions by name of the matrix
+    def describe(self, owner):
+        matrices = {}
+        for name in self.MATRICES:
+            matrix = getattr(owner, name, None)
+            if matrix is not None and hasattr(matrix, "shape"):
+                matrices[name] = self.describeMatrix(matrix)
+        return matrices
+
+
+    # Method: describeMatrix
+    # Purpose: Describe the shape, stored values and bytes of a dense or sparse matrix
+    # Arguments: matrix (required) - the matrix to describe
+    # Return: dict of the description
+    def describeMatrix(self, matrix):
+        if sparse.issparse(matrix):
+            nbytes = sum(getattr(matrix, part).nbytes for part in ("data", "indices", "indptr") if hasattr(matrix, part))
+            return {"shape": list(matrix.shape), "nnz": matrix.nnz, "dtype": str(matrix.dtype), "bytes": nbytes}
+        return {"shape": list(matrix.shape), "nnz": int(matrix.size), "dtype": str(matrix.dtype), "bytes": matrix.nbytes}
+
+
+    # Method: cpuSeconds
+    # Purpose: CPU time of the process in user and system mode, every thread included
+    # Arguments: None
+    # Return: seconds of CPU time
+    def cpuSeconds(self):
+        times = os.times()
+        return times[0] + times[1]
+
+
+    # Method: peakRssMb
+    # Purpose: Peak resident memory of the process so far
+    # Arguments: None
+    # Return: megabytes of the peak memory
+    def peakRssMb(self):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+    # Method: save
+    # Purpose: Save every event as a json trace
+    # Arguments: filename (required) - path of the file to write
+    # Return: None
+    def save(self, filename):
+        with open(filename, 'w') as fp:
+            json.dump({"events": self.events}, fp, indent=4)
@@ -5,10 +5,72 @@
 
 import numpy as np
 from sklearn import metrics
-from scipy.sparse.linalg import svds
+from scipy import sparse
+from scipy.sparse.linalg import svds, LinearOperator
 from math import sqrt
 import os.path
 import json
+import time
+import uuid
+from multiprocessing import Pool, RawArray, cpu_count
+from multiprocessing.pool import ThreadPool
+from profiler import profiledStage
+from store import ModelStore
+from index import ItemIndex
+from evaluation import Evaluator
+
+
+# Shared by the worker processes of the parallel sgd, set by initSgdWorker
+sgdState = {}
+
+
+# Method: initSgdWorker
+# Purpose: Give a worker of the parallel sgd a recommender whose factors and
+#          biases are views of the shared memory, plus the ratings arranged
+#          block by block. The processes are forked so nothing is copied
+# Arguments: dtype (required) - precision of the factors
+#            shared (required) - dict of the shared arrays and their shapes,
+#                                U, V and the biases when learned
+#            globalMean (required) - global mean added to every prediction
+#            ratings (required) - (users, items, ratings) columns arranged block by block
+#            offsets (required) - offset of every block in the ratings
+#            strata (required) - amount of blocks of the users and of the items
+# Return: None
+def initSgdWorker(dtype, shared, globalMean, ratings, offsets, strata):
+    recommendMachine = Recommender(empty=True, dtype=dtype)
+    arrays = dict((name, np.frombuffer(values, dtype=dtype).reshape(shape))
+                  for name, (values, shape) in shared.items())
+    recommendMachine.U = arrays["U"]
+    recommendMachine.userBiases = arrays.get("userBiases")
+    recommendMachine.itemBiases = arrays.get("itemBiases")
+    recommendMachine.globalMean = globalMean
+    sgdState["recommender"] = recommendMachine
+    sgdState["V"] = arrays["V"]
+    sgdState["ratings"] = ratings
+    sgdState["offsets"] = offsets
+    sgdState["strata"] = strata
+
+
+# Method: runSgdBlock
+# Purpose: Walk the ratings of one block of users and items, no other worker
+#          touches the same users or items at the same time so the factors are
+#          updated in place without locks
+# Arguments: task (required) - tuple of the block of users, block of items,
+#                              seed of the shuffle or None to keep the order,
+#                              learning rate, regularization and batch size
+# Return: amount of ratings walked
+def runSgdBlock(task):
+    userBlock, itemBlock, seed, rate, regularization, batchSize = task
+    block = userBlock * sgdState["strata"] + itemBlock
+    start, end = sgdState["offsets"][block], sgdState["offsets"][block + 1]
+    if seed is not None:
+        order = start + np.random.RandomState(seed).permutation(end - start)
+    else:
+        order = np.arange(start, end)
+
+    users, items, values = sgdState["ratings"]
+    sgdState["recommender"].sgdPass(order, users, items, values, sgdState["V"], rate, regularization, batchSize)
+    return end - start
 
 
 # Class: DataProcesser
@@ -23,13 +85,25 @@ class Recommender:
     MF_SVD = "matrix_factorization_svd"
     MF_SGD = "matrix_factorization_sgd"
     MF_ALS = "matrix_factorization_als"
-    FILE_TRAIN_MAT = "../data/train_mat.txt"
-    FILE_TEST_MAT = "../data/test_mat.txt"
+    MF_WALS = "matrix_factorization_wals"
+    FILE_TRAIN_MAT = "../data/train_mat.npz"
+    FILE_TEST_MAT = "../data/test_mat.npz"
     FILE_PRED_MAT = "../data/predications.txt"
     FILE_RECOM = "../data/recommendations.txt"
     FILE_RATINGS = "../data/top_ratings.txt"
     MAPPING_IDX_BEER = "../data/mapping_idx_beer"
+    DIRECTORY_MODEL = "../data/model"
+    DIRECTORY_INDEX = "index"
+    DIRECTORY_SIMILAR_INDEX = "similar_index"
     TOP_RECOMMENDATIONS = 20
+    DTYPES = ["float64", "float32"]
+    SVD_LANCZOS = "svds"
+    SVD_RANDOMIZED = "randomized"
+    LR_CONSTANT = "constant"
+    LR_INVERSE = "inverse"
+    LR_EXPONENTIAL = "exponential"
+    ASPECTS = ["overall", "appearance", "aroma", "palate", "taste"]
+    ASPECT_CHUNK = 65536
 
 
     # Method: Constructor
@@ -42,6 +116,12 @@ class Recommender:
     #                                       from files
     #            empty (optional) - whether to build the machine with the training matrix
     #                               or leave it empty
+    #            mappingIdxToBeer (optional) - names of the beers by idx of the item
+    #            profiler (optional) - Profiler recording the stages and iterations,
+    #                                  nothing is recorded without one
+    #            dtype (optional) - float64 or float32, precision of the matrices,
+    #                               factors, similarities and predictions. Sums
+    #                               over many values are still done in float64
     def __init__(self, trainingData=None,
                        testingData=None,
                        totalUsers=None,
@@ -50,8 +130,26 @@ class Recommender:
                        saveToFile=False,
                        readFromFiles=True,
                        normalizeDataBefore=False,
-                       empty=False):
-        self.mappingIdxToBeer = {}
+                       empty=False,
+                       mappingIdxToBeer=None,
+                       profiler=None,
+                       dtype=np.float64):
+        self.profiler = profiler
+        self.dtype = np.dtype(dtype)
+        self.mappingIdxToBeer = dict(mappingIdxToBeer) if mappingIdxToBeer else {}
+        self.globalMean = 0.0
+        self.userBiases = None
+        self.itemBiases = None
+        self.model = None
+        self.trainingInfo = {}
+        self.mappings = {}
+        self.itemIndex = None
+        self.similarIndex = None
+        self.modelVersion = None
+        self.trainingAspects = None
+        self.testingAspects = None
+        self.sgdRandomState = None
+        self.sgdEpochs = 0
 
         if empty == True:
             return
@@ -61,78 +159,168 @@ class Recommender:
 
         # Perform User-Item Collaborative Filtering
         if alg == self.CC:
+            self.normalizeDataBefore = normalizeDataBefore
 
             # Load training matrix if already saved
             if readFromFiles and os.path.isfile(self.FILE_TRAIN_MAT):
-                self.trainingMatrix = np.loadtxt(self.FILE_TRAIN_MAT)
+                self.trainingMatrix = sparse.load_npz(self.FILE_TRAIN_MAT).tocsr()
             else:
-                # Create training matrix and convert these to numpy arrays for faster calculations
+                # Create training matrix as a sparse matrix so memory only grows
+                # with the amount of ratings
                 self.trainingMatrix = self.createUserItemMatrix(trainingData, totalUsers, totalItems)
 
-                self.normalizeDataBefore = normalizeDataBefore
-
-                # Average of each row
-                mean_users_ratings = self.trainingMatrix.mean(axis=1)
+                if saveToFile == True:
+                    # Save for future use
+                    sparse.save_npz(self.FILE_TRAIN_MAT, self.trainingMatrix)
 
-                # Convert the mean into multiple rows of one column instead of one
-                # row to be able to subtract each mean of the row by each element in
-                # row of the user
-                self.mean_users_ratings = mean_users_ratings.reshape(-1, 1)
+            # Average of each row as one column, the unrated cells count as zeros
+            self.mean_users_ratings = self.userMeans()
 
-                if normalizeDataBefore == True:
-                    self.trainingMatrix = self.trainingMatrix - self.mean_users_ratings
+            # Keep the columns of the ratings that carry the aspects for
+            # multi_aspect_factorization, they are views so nothing is copied
+            if isinstance(trainingData, tuple) and len(trainingData) > 4:
+                self.trainingAspects = trainingData
+            if isinstance(testingData, tuple) and len(testingData) > 4:
+                self.testingAspects = testingData
 
-                if saveToFile == True:
-                    # Save for future use
-                    np.savetxt(self.FILE_TRAIN_MAT, self.trainingMatrix, fmt='%1.1f')
+            # Normalizing the data before is never applied to the training matrix
+            # itself since that would make every cell nonzero, instead each stage
+            # subtracts the mean of the users implicitly when normalizeDataBefore is set
 
             # Load testing matrix if already saved
             if readFromFiles and os.path.isfile(self.FILE_TEST_MAT):
-                self.testingMatrix = np.loadtxt(self.FILE_TEST_MAT)
+                self.testingMatrix = sparse.load_npz(self.FILE_TEST_MAT).tocsr()
             else:
-                # Create testing matrix and convert these to numpy arrays for faster calculations
+                # Create testing matrix as a sparse matrix
                 self.testingMatrix = self.createUserItemMatrix(testingData, totalUsers, totalItems)
 
                 if saveToFile == True:
                     # Save for future use
-                    np.savetxt(self.FILE_TEST_MAT, self.testingMatrix, fmt='%1.1f')
+                    sparse.save_npz(self.FILE_TEST_MAT, self.testingMatrix)
 
 
     # Method: createUserItemMatrix
-    # Purpose: Create a User Item Matrix - m Users, n items = m * n matrix
-    # Arguments: data (required) - data to be used to build the matrix
+    # Purpose: Create a sparse User Item Matrix - m Users, n items = m * n matrix
+    #          in CSR format, only the recorded ratings are stored
+    # Arguments: data (required) - data to be used to build the matrix, either a
+    #                              list of reviews or a tuple of columns
     #            totalUsers (required) - total amount of users
     #            totalItems (required) - total amount of items
     # Return: the matrix created
+    @profiledStage
     def createUserItemMatrix(self, data, totalUsers, totalItems):
 
-        # Initialize the matrix
-        matrix = np.zeros((totalUsers, totalItems))
+        # Ratings already split into (users, items, ratings, ...) columns
+        if isinstance(data, tuple):
+            return self.buildSparseMatrix(data[0], data[1], data[2], totalUsers, totalItems)
+
+        userIdxs = []
+        itemIdxs = []
+        ratings = []
 
         # Go through each review in the data and add the data of the review to the matrix
         for review in data:
             # Get the idx of the user in the matrix
-            userIdx = review["userIdx"]
+            userIdxs.append(review["userIdx"])
 
             # Get the idx of the item in the matrix
-            itemIdx = review["itemIdx"]
+            itemIdxs.append(review["itemIdx"])
 
             # Convert the overall rating to float and save to the matrix
-            matrix[userIdx, itemIdx] = float(review["overall"])
+            ratings.append(float(review["overall"]))
 
             # Store the mapping to be able to print out the beer recommendations later
-            self.mappingIdxToBeer[itemIdx] = review["name"]
+            # if the review still carries the name of the beer
+            if "name" in review:
+                self.mappingIdxToBeer[review["itemIdx"]] = review["name"]
+
+        return self.buildSparseMatrix(userIdxs, itemIdxs, ratings, totalUsers, totalItems)
 
+
+    # Method: buildSparseMatrix
+    # Purpose: Build a CSR matrix out of the (user, item, rating) triples, when
+    #          a user rated the same item more than once the last rating is kept
+    # Arguments: userIdxs (required) - row idx of each rating
+    #            itemIdxs (required) - column idx of each rating
+    #            ratings (required) - value of each rating
+    #            totalUsers (required) - total amount of users
+    #            totalItems (required) - total amount of items
+    # Return: the matrix created
+    def buildSparseMatrix(self, userIdxs, itemIdxs, ratings, totalUsers, totalItems):
+        userIdxs = np.asarray(userIdxs, dtype=np.int64)
+        itemIdxs = np.asarray(itemIdxs, dtype=np.int64)
+        ratings = np.asarray(ratings, dtype=self.dtype)
+
+        # Keep only the last rating of each cell, np.unique returns the first
+        # occurrence so look through the ratings backwards
+        cells = (userIdxs * totalItems + itemIdxs)[::-1]
+        _, lastIdxs = np.unique(cells, return_index=True)
+        lastIdxs = len(cells) - 1 - lastIdxs
+
+        matrix = sparse.coo_matrix((ratings[lastIdxs], (userIdxs[lastIdxs], itemIdxs[lastIdxs])),
+                                   shape=(totalUsers, totalItems)).tocsr()
+        matrix.eliminate_zeros()
         return matrix
 
-    def cleanData(self, userMinReviews=10, itemMinReviews=5):
-        userIdx = 0
-        for user in self.trainingMatrix:
-            totalReviews = np.count_nonzero(user)
-            if totalReviews < userMinReviews:
-                np.delete(self.trainingMatrix, userIdx, 0)
-            userIdx += 1
-        print len(self.trainingMatrix)
+
+    # Method: userMeans
+    # Purpose: Average of every row of the training matrix, the unrated cells
+    #          count as zeros. Summed in float64 whatever the dtype
+    # Arguments: None
+    # Return: the means as multiple rows of one column instead of one row to be
+    #         able to subtract each mean of the row by each element in row of the user
+    def userMeans(self):
+        means = np.asarray(self.trainingMatrix.mean(axis=1, dtype=np.float64))
+        return means.reshape(-1, 1).astype(self.dtype, copy=False)
+
+
+    # Method: gram
+    # Purpose: FTF of factors summed in float64 whatever the dtype, the gram
+    #          matrices are sums over every user or item
+    # Arguments: factors (required) - the factors, one row per user or item
+    # Return: the k * k gram matrix
+    def gram(self, factors):
+        factors = np.asarray(factors, dtype=np.float64)
+        return np.dot(factors.T, factors)
+
+
+    # Method: centeredProducts
+    # Purpose: Products of the training matrix minus the mean of each user with
+    #          blocks of vectors, without materializing the centered matrix
+    # Arguments: None
+    # Return: tuple of the functions multiplying by the centered matrix and by
+    #         its transpose
+    def centeredProducts(self):
+        matrix = self.trainingMatrix
+        matrixT = matrix.T.tocsr()
+        means = self.mean_users_ratings
+
+        # (X - m1T)v = Xv - m(1Tv)
+        def matmat(v):
+            v = np.asarray(v).reshape(matrix.shape[1], -1)
+            return matrix.dot(v) - means * v.sum(axis=0)
+
+        # (X - m1T)Tv = XTv - 1(mTv)
+        def rmatmat(v):
+            v = np.asarray(v).reshape(matrix.shape[0], -1)
+            return matrixT.dot(v) - np.dot(means.T, v)
+
+        return matmat, rmatmat
+
+
+    # Method: centeredOperator
+    # Purpose: Wrap the training matrix minus the mean of each user into a linear
+    #          operator, so the centered matrix is never materialized
+    # Arguments: None
+    # Return: LinearOperator of the centered training matrix
+    def centeredOperator(self):
+        matrix = self.trainingMatrix
+        matmat, rmatmat = self.centeredProducts()
+        return LinearOperator(matrix.shape,
+                              matvec=lambda v: matmat(v).ravel(),
+                              rmatvec=lambda v: rmatmat(v).ravel(),
+                              matmat=matmat,
+                              dtype=np.float64)
 
 
     # Method: matrix_factorization_svd
@@ -141,81 +329,653 @@ class Recommender:
     #          a similiar training matrix...more info in README
     # Arguments: k (optional) - specify how many hidden features to find,
     #                           default to 10
+    #            method (optional) - svds for Lanczos or randomized for the
+    #                                randomized range finder, default to svds
+    #            oversampling (optional) - extra random vectors of the randomized svd
+    #            powerIterations (optional) - power iterations of the randomized svd,
+    #                                         more are slower but more accurate
+    #            seed (optional) - seed of the random vectors of the randomized svd
     # Return: None
-    def matrix_factorization_svd(self, k=10):
-
-        # Perform singular-value decomposition and convert sigma into diagonal matrix
-        self.U, sigma, self.Vt = svds(self.trainingMatrix, k=k)
-        self.sigma = np.diag(sigma)
+    @profiledStage
+    def matrix_factorization_svd(self, k=10, method=SVD_LANCZOS, oversampling=10, powerIterations=2, seed=None):
+
+        # Perform singular-value decomposition on the sparse matrix, centered
+        # implicitly when normalizing before, and convert sigma into diagonal matrix
+        # The decomposition itself is always in float64
+        if method == self.SVD_RANDOMIZED:
+            self.U, sigma, self.Vt = self.randomizedSvd(k, oversampling, powerIterations, seed)
+            self.trainingInfo = {"k": k, "method": method, "oversampling": oversampling,
+                                 "powerIterations": powerIterations, "seed": seed}
+        elif method == self.SVD_LANCZOS:
+            if self.normalizeDataBefore == True:
+                self.U, sigma, self.Vt = svds(self.centeredOperator(), k=k)
+            else:
+                self.U, sigma, self.Vt = svds(self.trainingMatrix.astype(np.float64, copy=False), k=k)
+            self.trainingInfo = {"k": k}
+        else:
+            raise ValueError("Unknown svd method " + str(method))
+        self.U = self.U.astype(self.dtype, copy=False)
+        self.Vt = self.Vt.astype(self.dtype, copy=False)
+        self.sigma = np.diag(sigma.astype(self.dtype, copy=False))
+        self.model = self.MF_SVD
+
+
+    # Method: randomizedSvd
+    # Purpose: Truncated SVD by a randomized range finder, the sparse training
+    #          matrix, centered implicitly when normalizing before, is only
+    #          multiplied by blocks of k + oversampling vectors. Random vectors
+    #          are multiplied by the matrix to sample its range, each power
+    #          iteration multiplies by the matrix and its transpose again to
+    #          sharpen the range, then the small matrix of the range times the
+    #          training matrix is decomposed exactly
+    # Arguments: k (required) - number of singular values
+    #            oversampling (required) - extra random vectors
+    #            powerIterations (required) - amount of power iterations
+    #            seed (optional) - seed of the random vectors
+    # Return: tuple of U, the singular values largest first and Vt
+    def randomizedSvd(self, k, oversampling, powerIterations, seed=None):
+        totalUsers, totalItems = self.trainingMatrix.shape
+        if k >= min(totalUsers, totalItems):
+            raise ValueError("k must be less than the smallest side of the training matrix, got " + str(k))
+        if self.normalizeDataBefore == True:
+            matmat, rmatmat = self.centeredProducts()
+        else:
+            matrixT = self.trainingMatrix.T.tocsr()
+            matmat = self.trainingMatrix.dot
+            rmatmat = matrixT.dot
+        samples = min(k + oversampling, totalUsers, totalItems)
+
+        # Sample the range of the matrix, keeping an orthonormal basis after
+        # every product so the power iterations stay stable
+        randomState = np.random.RandomState(seed)
+        Q = np.linalg.qr(matmat(randomState.normal(size=(totalItems, samples))))[0]
+        for iteration in range(0, powerIterations):
+            Q = np.linalg.qr(rmatmat(Q))[0]
+            Q = np.linalg.qr(matmat(Q))[0]
+
+        # Decompose the small matrix QT * X exactly and lift U back by Q
+        Ub, sigma, Vt = np.linalg.svd(rmatmat(Q).T, full_matrices=False)
+        return np.dot(Q, Ub[:, :k]), sigma[:k], Vt[:k]
+
+
+    # Method: compareSvd
+    # Purpose: Train with svds and with the randomized svd, reporting the time and
+    #          RMSE of both. The recommender keeps the randomized model
+    # Arguments: k (optional) - number of latent factors
+    #            oversampling (optional) - extra random vectors of the randomized svd
+    #            powerIterations (optional) - power iterations of the randomized svd
+    #            seed (optional) - seed of the randomized svd
+    # Return: dict of the seconds and RMSE of both and the largest relative
+    #         difference of their singular values
+    def compareSvd(self, k=10, oversampling=10, powerIterations=2, seed=None):
+        start = time.time()
+        self.matrix_factorization_svd(k=k)
+        svdsSeconds = time.time() - start
+        svdsRmse = self.evaluateAll()["rmse"]
+        svdsSigma = np.sort(np.diag(self.sigma))[::-1]
+
+        start = time.time()
+        self.matrix_factorization_svd(k=k, method=self.SVD_RANDOMIZED, oversampling=oversampling,
+                                      powerIterations=powerIterations, seed=seed)
+        randomizedSeconds = time.time() - start
+        randomizedRmse = self.evaluateAll()["rmse"]
+        randomizedSigma = np.diag(self.sigma)
+
+        result = {"svdsSeconds": svdsSeconds,
+                  "svdsRmse": svdsRmse,
+                  "randomizedSeconds": randomizedSeconds,
+                  "randomizedRmse": randomizedRmse,
+                  "speedup": svdsSeconds / randomizedSeconds if randomizedSeconds > 0 else float("inf"),
+                  "sigmaError": float(np.max(np.abs(randomizedSigma - svdsSigma) / np.maximum(svdsSigma, 1e-12)))}
+        print("svds took %.3fs with RMSE %.4f, randomized svd took %.3fs with RMSE %.4f, speedup %.2fx, "
+              "largest singular value error %.2e" % (svdsSeconds, svdsRmse, randomizedSeconds, randomizedRmse,
+                                                      result["speedup"], result["sigmaError"]))
+        return result
 
 
     # Method: stochastic_gradient_descent
-    # Purpose: TODO
-    # Arguments: TODO
-    # Return: TODO
+    # Purpose: Decompose the training matrix into U and Vt by walking only the
+    #          recorded ratings, one at a time or in mini-batches, in a shuffled
+    #          order every epoch and updating whole latent vectors at once
+    # Arguments: k (optional) - number of latent factors, default to 10
+    #            learning_rate (optional) - starting learning rate
+    #            regularization (optional) - regularization of the factors and biases
+    #            iterations (optional) - number of epochs over the ratings
+    #            batch_size (optional) - amount of ratings per update, default to 1
+    #            schedule (optional) - learning rate schedule, constant, inverse
+    #                                  or exponential, default to constant
+    #            decay (optional) - decay of the learning rate schedule
+    #            biases (optional) - learn a global mean plus user and item biases
+    #            shuffle (optional) - shuffle the ratings every epoch
+    #            seed (optional) - seed of the initialization and shuffling
+    #            warmStart (optional) - keep training the factors and biases of
+    #                                   the current sgd model instead of new ones,
+    #                                   continuing its shuffles and learning rate
+    #                                   schedule from the epochs already trained
+    #            workers (optional) - processes walking the ratings, more than
+    #                                 one trains in parallel with stratifiedSgd
+    # Return: None
+    @profiledStage
     def stochastic_gradient_descent(self,
                                     k=10,
                                     learning_rate=0.0002,
                                     regularization=0.02,
-                                    iterations=1):
-        # Create two matrices to be used for spliting the training matrix
-        totalUsers = len(self.trainingMatrix)
-        totalItems = len(self.trainingMatrix[0])
-        self.U = np.random.rand(totalUsers, k)
-        self.Vt = np.random.rand(k, totalItems)
-
-        # Go through the number of steps for convergence
-        for iteration in range(0, iterations):
+                                    iterations=1,
+                                    batch_size=1,
+                                    schedule=LR_CONSTANT,
+                                    decay=0.0,
+                                    biases=False,
+                                    shuffle=True,
+                                    seed=None,
+                                    warmStart=False,
+                                    workers=1):
+        warmStart = warmStart and self.canWarmStart(self.MF_SGD, k) and ((self.userBiases is not None) == biases)
+
+        # A warm start carries on with the random state and epochs of the
+        # current model, so training in steps walks the same orders and learning
+        # rates as training all the epochs at once
+        randomState = np.random.RandomState(seed)
+        firstEpoch = 0
+        if warmStart == True and self.sgdRandomState is not None:
+            randomState = self.sgdRandomState
+            firstEpoch = self.sgdEpochs
+        self.trainingInfo = {"k": k, "learning_rate": learning_rate, "regularization": regularization,
+                             "iterations": iterations, "batch_size": batch_size, "schedule": schedule,
+                             "decay": decay, "biases": biases, "seed": seed}
+        if workers > 1:
+            self.trainingInfo["workers"] = workers
+
+        # Create two matrices to be used for spliting the training matrix, the
+        # item factors are kept row by row while training so each is contiguous
+        # When learning biases they carry the average rating, so start the
+        # factors small around zero instead
+        totalUsers, totalItems = self.trainingMatrix.shape
+        if warmStart == True:
+            self.U = np.array(self.U, dtype=self.dtype)
+            V = np.array(self.Vt.T, dtype=self.dtype)
+        elif biases == True:
+            self.U = randomState.normal(0, 0.1, (totalUsers, k)).astype(self.dtype, copy=False)
+            V = randomState.normal(0, 0.1, (totalItems, k)).astype(self.dtype, copy=False)
+        else:
+            self.U = randomState.rand(totalUsers, k).astype(self.dtype, copy=False)
+            V = randomState.rand(totalItems, k).astype(self.dtype, copy=False)
+
+        # Only the real recorded ratings are stored in the sparse matrix
+        ratings = self.trainingMatrix.tocoo()
+        users = ratings.row
+        items = ratings.col
+        values = ratings.data
+        totalRatings = len(values)
+
+        # Start all biases at zero, the global mean is fixed, unless the biases
+        # of the current model keep training
+        if warmStart == False:
+            self.globalMean = 0.0
+            self.userBiases = None
+            self.itemBiases = None
+            if biases == True:
+                self.globalMean = values.mean(dtype=np.float64) if totalRatings > 0 else 0.0
+                self.userBiases = np.zeros(totalUsers, dtype=self.dtype)
+                self.itemBiases = np.zeros(totalItems, dtype=self.dtype)
+        else:
+            self.userBiases = np.array(self.userBiases, dtype=self.dtype) if biases == True else None
+            self.itemBiases = np.array(self.itemBiases, dtype=self.dtype) if biases == True else None
+
+        # Go through the number of epochs for convergence, in parallel over
+        # blocks of the users and items with more than one worker
+        self.sgdEpochStats = []
+        if workers > 1:
+            V = self.stratifiedSgd((users, items, values), V, learning_rate, regularization, iterations,
+                                   batch_size, schedule, decay, shuffle, randomState, workers, firstEpoch)
+        else:
+            for epoch in range(0, iterations):
+                start = time.time()
+                rate = self.learningRate(learning_rate, firstEpoch + epoch, schedule, decay)
 
-            # Iterate through the entire training matrix
-            for row_idx in range(0, totalUsers):
-                for rating_idx in range(0, totalItems):
-                    real_rating = self.trainingMatrix[row_idx][rating_idx]
+                order = randomState.permutation(totalRatings) if shuffle else np.arange(totalRatings)
+                self.sgdPass(order, users, items, values, V, rate, regularization, batch_size)
+                self.sgdEpochDone(epoch, iterations, time.time() - start, totalRatings, rate)
 
-                    # Only consider the real recorded ratings
-                    if real_rating != 0:
+        self.Vt = V.T
+        self.model = self.MF_SGD
+        self.sgdRandomState = randomState
+        self.sgdEpochs = firstEpoch + iterations
+
+
+    # Method: sgdPass
+    # Purpose: Walk ratings in an order, updating the factors after every rating
+    #          or every mini-batch
+    # Arguments: order (required) - idxs of the ratings in the order to walk them
+    #            users (required) - idx of the user of every rating
+    #            items (required) - idx of the item of every rating
+    #            values (required) - every rating
+    #            V (required) - item factors, one row per item
+    #            rate (required) - learning rate of the epoch
+    #            regularization (required) - regularization of the factors and biases
+    #            batch_size (required) - amount of ratings per update
+    # Return: None
+    def sgdPass(self, order, users, items, values, V, rate, regularization, batch_size):
 
-                        # Calculate the error and perform update
-                        predicted_rating = np.dot(self.U[row_idx], self.Vt[:, rating_idx])
-                        eij = real_rating - predicted_rating
-                        self.sgd_update(eij, row_idx, rating_idx, k, learning_rate, regularization)
+        # One rating at a time, updating the full latent vector of the user and item
+        if batch_size <= 1:
+            for idx in order:
+                self.sgd_update(users[idx], items[idx], values[idx], V, rate, regularization)
 
+        # Otherwise update from the summed gradients of a whole mini-batch
+        else:
+            for batchStart in range(0, len(order), batch_size):
+                batch = order[batchStart:batchStart + batch_size]
+                self.sgd_batch_update(users[batch], items[batch], values[batch], V, rate, regularization)
+
+
+    # Method: sgdEpochDone
+    # Purpose: Record and report the throughput of an epoch of sgd
+    # Arguments: epoch (required) - the epoch starting at 0
+    #            iterations (required) - amount of epochs
+    #            seconds (required) - wall time of the epoch
+    #            totalRatings (required) - ratings walked in the epoch
+    #            rate (required) - learning rate of the epoch
+    #            workers (optional) - processes that walked the ratings
+    #            stage (optional) - stage the iterations are profiled under
+    # Return: None
+    def sgdEpochDone(self, epoch, iterations, seconds, totalRatings, rate, workers=1,
+                     stage="stochastic_gradient_descent"):
+        ratingsPerSec = totalRatings / seconds if seconds > 0 else float("inf")
+        self.sgdEpochStats.append({"epoch": epoch + 1,
+                                   "seconds": seconds,
+                                   "ratingsPerSec": ratingsPerSec,
+                                   "learningRate": rate,
+                                   "workers": workers})
+        print("Epoch %d/%d: %.3fs, %.0f ratings/sec, learning rate %g" %
+              (epoch + 1, iterations, seconds, ratingsPerSec, rate))
+        if self.profiler is not None:
+            self.profiler.iteration(stage, **self.sgdEpochStats[-1])
+
+
+    # Method: stratifiedSgd
+    # Purpose: Parallel sgd over shared memory. The users and items are each
+    #          split into as many random blocks as workers, giving a grid of
+    #          blocks of ratings. Every epoch walks the grid in sub-epochs, in
+    #          each the workers take blocks on a shifted diagonal so no two of
+    #          them share a user or item and the factors and biases are updated
+    #          in place without locks. The blocks and shuffles come from the
+    #          seed, so the model is the same for the same seed and workers
+    # Arguments: ratings (required) - (users, items, ratings) columns
+    #            V (required) - starting item factors, one row per item
+    #            learning_rate (required) - starting learning rate
+    #            regularization (required) - regularization of the factors and biases
+    #            iterations (required) - number of epochs over the ratings
+    #            batch_size (required) - amount of ratings per update
+    #            schedule (required) - learning rate schedule
+    #            decay (required) - decay of the learning rate schedule
+    #            shuffle (required) - shuffle the ratings of every block every epoch
+    #            randomState (required) - random state of the blocks and shuffles
+    #            workers (required) - amount of worker processes
+    #            firstEpoch (optional) - epochs already trained, where the
+    #                                    learning rate schedule carries on from
+    # Return: the trained item factors, one row per item
+    def stratifiedSgd(self, ratings, V, learning_rate, regularization, iterations,
+                      batch_size, schedule, decay, shuffle, randomState, workers, firstEpoch=0):
+        users, items, values = ratings
+        totalUsers, totalItems = self.trainingMatrix.shape
+        strata = max(1, min(workers, totalUsers, totalItems))
+
+        # Random blocks of about the same amount of users and of items, then
+        # keep the ratings of every block next to each other
+        userBlocks = randomState.permutation(totalUsers) % strata
+        itemBlocks = randomState.permutation(totalItems) % strata
+        blocks = userBlocks[users] * strata + itemBlocks[items]
+        order = np.argsort(blocks, kind="mergesort")
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(blocks, minlength=strata * strata))])
+        arranged = (users[order], items[order], values[order])
+
+        # The factors and biases live in shared memory written by every worker
+        shared = {}
+        current = {"U": self.U, "V": V}
+        if self.userBiases is not None:
+            current["userBiases"] = self.userBiases
+            current["itemBiases"] = self.itemBiases
+        for name, array in current.items():
+            shared[name] = (RawArray('f' if self.dtype == np.float32 else 'd', array.size), array.shape)
+            np.frombuffer(shared[name][0], dtype=self.dtype).reshape(array.shape)[:] = array
+
+        pool = Pool(strata, initSgdWorker, (self.dtype, shared, self.globalMean, arranged, offsets, strata))
+        try:
+            for epoch in range(0, iterations):
+                start = time.time()
+                rate = self.learningRate(learning_rate, firstEpoch + epoch, schedule, decay)
+
+                # Every shift of the diagonal is one sub-epoch, they all have to
+                # finish before the next one starts
+                for shift in randomState.permutation(strata):
+                    seeds = randomState.randint(0, 2 ** 31 - 1, size=strata)
+                    tasks = [(block, (block + shift) % strata, seeds[block] if shuffle else None,
+                              rate, regularization, batch_size) for block in range(0, strata)]
+                    pool.map(runSgdBlock, tasks, chunksize=1)
+
+                self.sgdEpochDone(epoch, iterations, time.time() - start, len(values), rate, workers=strata)
+        finally:
+            pool.close()
+            pool.join()
+
+        # Copy the trained values out of the shared memory, it is freed once
+        # the raw arrays are no longer referenced
+        trained = dict((name, np.frombuffer(values, dtype=self.dtype).reshape(shape).copy())
+                       for name, (values, shape) in shared.items())
+        self.U = trained["U"]
+        self.userBiases = trained.get("userBiases")
+        self.itemBiases = trained.get("itemBiases")
+        return trained["V"]
+
+
+    # Method: compareSgd
+    # Purpose: Train sgd serially then with more and more workers up to the
+    #          given amount, reporting the ratings/sec, speedup over serial and
+    #          RMSE of each
+    # Arguments: workers (required) - most worker processes to train with
+    #            k (optional) - number of latent factors
+    #            iterations (optional) - number of epochs over the ratings
+    #            seed (optional) - seed of every training
+    #            kwargs (optional) - other arguments of stochastic_gradient_descent
+    # Return: list of dicts of the workers, ratings/sec, speedup and RMSE
+    def compareSgd(self, workers, k=10, iterations=1, seed=None, **kwargs):
+        counts = [1]
+        while counts[-1] * 2 < workers:
+            counts.append(counts[-1] * 2)
+        if workers > 1:
+            counts.append(workers)
+
+        results = []
+        for count in counts:
+            self.stochastic_gradient_descent(k=k, iterations=iterations, seed=seed, workers=count, **kwargs)
+            seconds = sum(stats["seconds"] for stats in self.sgdEpochStats)
+            ratingsPerSec = self.trainingMatrix.nnz * iterations / seconds if seconds > 0 else float("inf")
+            results.append({"workers": count,
+                            "ratingsPerSec": ratingsPerSec,
+                            "speedup": ratingsPerSec / results[0]["ratingsPerSec"] if len(results) > 0 else 1.0,
+                            "rmse": self.evaluateAll()["rmse"]})
+
+        for result in results:
+            print("sgd with %d workers: %.0f ratings/sec, speedup %.2fx, efficiency %.0f%%, RMSE %.4f" %
+                  (result["workers"], result["ratingsPerSec"], result["speedup"],
+                   100.0 * result["speedup"] / result["workers"], result["rmse"]))
+        return results
+
+
+    # Method: canWarmStart
+    # Purpose: Check whether the current factors can be trained further
+    # Arguments: model (required) - algorithm about to train
+    #            k (required) - number of latent factors about to be trained
+    # Return: True if the current model is the same algorithm with the same k
+    def canWarmStart(self, model, k):
+        return (self.model == model and getattr(self, "U", None) is not None and
+                self.U.shape == (self.trainingMatrix.shape[0], k) and self.Vt.shape == (k, self.trainingMatrix.shape[1]))
+
+
+    # Method: learningRate
+    # Purpose: Get the learning rate of an epoch following the schedule
+    # Arguments: learning_rate (required) - starting learning rate
+    #            epoch (required) - the epoch starting at 0
+    #            schedule (optional) - constant, inverse or exponential
+    #            decay (optional) - how fast the learning rate decays
+    # Return: the learning rate for the epoch
+    def learningRate(self, learning_rate, epoch, schedule=LR_CONSTANT, decay=0.0):
+        if schedule == self.LR_INVERSE:
+            return learning_rate / (1.0 + decay * epoch)
+        elif schedule == self.LR_EXPONENTIAL:
+            return learning_rate * ((1.0 - decay) ** epoch)
+        return learning_rate
 
 
     # Method: sgd_update
-    # Purpose: TODO
-    # Arguments: TODO
-    # Return: TODO
-    def sgd_update(self, eij, row_idx, rating_idx, total_k, learning_rate, regul):
-
-        # For the passed in user and item, update their corresponding for each kth latent factor
-        for k in range(0, total_k):
-
-            # Get the old kth latent factor for the user and item
-            user_feature_factor = self.U[row_idx][k]
-            item_feature_factor = self.Vt[k][rating_idx]
-
-            # Perform the update calculation and saved it for the kth latent factor of both of the user and item
-            user_learn_rate_multiply = (2 * eij * item_feature_factor) - (regul * user_feature_factor)
-            item_learn_rate_multiply = (2 * eij * user_feature_factor) - (regul * item_feature_factor)
-            self.U[row_idx][k] = user_feature_factor + (learning_rate * user_learn_rate_multiply)
-            self.Vt[k][rating_idx] = item_feature_factor + (learning_rate * item_learn_rate_multiply)
+    # Purpose: Update the latent vectors, and biases if learned, of one user and
+    #          one item from the error of a single rating
+    # Arguments: row_idx (required) - idx of the user
+    #            rating_idx (required) - idx of the item
+    #            real_rating (required) - the recorded rating
+    #            V (required) - item factors, one row per item
+    #            learning_rate (required) - learning rate of the epoch
+    #            regul (required) - regularization
+    # Return: None
+    def sgd_update(self, row_idx, rating_idx, real_rating, V, learning_rate, regul):
+        user_factors = self.U[row_idx]
+        item_factors = V[rating_idx]
+
+        # Calculate the error of the rating
+        predicted_rating = np.dot(user_factors, item_factors)
+        if self.userBiases is not None:
+            predicted_rating += self.globalMean + self.userBiases[row_idx] + self.itemBiases[rating_idx]
+        eij = real_rating - predicted_rating
+
+        # Perform the update calculation for every latent factor of both the user and item
+        user_learn_rate_multiply = (2 * eij * item_factors) - (regul * user_factors)
+        item_learn_rate_multiply = (2 * eij * user_factors) - (regul * item_factors)
+        self.U[row_idx] = user_factors + (learning_rate * user_learn_rate_multiply)
+        V[rating_idx] = item_factors + (learning_rate * item_learn_rate_multiply)
+
+        if self.userBiases is not None:
+            self.userBiases[row_idx] += learning_rate * ((2 * eij) - (regul * self.userBiases[row_idx]))
+            self.itemBiases[rating_idx] += learning_rate * ((2 * eij) - (regul * self.itemBiases[rating_idx]))
+
+
+    # Method: sgd_batch_update
+    # Purpose: Same as sgd_update for a mini-batch of ratings, the gradients of
+    #          users and items appearing more than once in the batch are summed
+    # Arguments: rows (required) - idxs of the users
+    #            cols (required) - idxs of the items
+    #            real_ratings (required) - the recorded ratings
+    #            V (required) - item factors, one row per item
+    #            learning_rate (required) - learning rate of the epoch
+    #            regul (required) - regularization
+    # Return: None
+    def sgd_batch_update(self, rows, cols, real_ratings, V, learning_rate, regul):
+        user_factors = self.U[rows]
+        item_factors = V[cols]
+
+        # Calculate the errors of the ratings
+        predicted_ratings = np.einsum('ij,ij->i', user_factors, item_factors)
+        if self.userBiases is not None:
+            predicted_ratings += self.globalMean + self.userBiases[rows] + self.itemBiases[cols]
+        errors = (real_ratings - predicted_ratings)[:, np.newaxis]
+
+        # Accumulate the updates, np.add.at handles repeated users and items
+        user_learn_rate_multiply = (2 * errors * item_factors) - (regul * user_factors)
+        item_learn_rate_multiply = (2 * errors * user_factors) - (regul * item_factors)
+        np.add.at(self.U, rows, learning_rate * user_learn_rate_multiply)
+        np.add.at(V, cols, learning_rate * item_learn_rate_multiply)
+
+        if self.userBiases is not None:
+            errors = errors.ravel()
+            np.add.at(self.userBiases, rows, learning_rate * ((2 * errors) - (regul * self.userBiases[rows])))
+            np.add.at(self.itemBiases, cols, learning_rate * ((2 * errors) - (regul * self.itemBiases[cols])))
+
+
+    # Method: multi_aspect_factorization
+    # Purpose: Learn the overall, appearance, aroma, palate and taste ratings
+    #          together in one pass over the recorded ratings. The users and
+    #          items share one set of latent factors, every aspect has its own
+    #          head, a weight per factor plus a global mean and user and item
+    #          biases, so each rating is predicted by
+    #          mean + user bias + item bias + sum(U * weights * V) of its aspect
+    #          Aspects missing from a review are skipped. Afterwards the overall
+    #          head is kept as the biased sgd model so predict, recommend and
+    #          saveModel work on the overall ratings as usual
+    # Arguments: k (optional) - number of latent factors, default to 10
+    #            learning_rate (optional) - starting learning rate
+    #            regularization (optional) - regularization of the factors, weights and biases
+    #            iterations (optional) - number of epochs over the ratings
+    #            batch_size (optional) - amount of ratings per update, default to 256
+    #            schedule (optional) - learning rate schedule, constant, inverse
+    #                                  or exponential, default to constant
+    #            decay (optional) - decay of the learning rate schedule
+    #            seed (optional) - seed of the initialization and shuffling
+    # Return: None
+    @profiledStage
+    def multi_aspect_factorization(self,
+                                   k=10,
+                                   learning_rate=0.005,
+                                   regularization=0.02,
+                                   iterations=10,
+                                   batch_size=256,
+                                   schedule=LR_CONSTANT,
+                                   decay=0.0,
+                                   seed=None):
+        if self.trainingAspects is None:
+            raise ValueError("The training ratings have no aspects, build the recommender from "
+                             "the (users, items, ratings, times, aspects) columns of processReviews")
+        randomState = np.random.RandomState(seed)
+        self.trainingInfo = {"k": k, "learning_rate": learning_rate, "regularization": regularization,
+                             "iterations": iterations, "batch_size": batch_size, "schedule": schedule,
+                             "decay": decay, "seed": seed, "aspects": self.ASPECTS}
+
+        # One target column per aspect, overall first
+        users = np.asarray(self.trainingAspects[0])
+        items = np.asarray(self.trainingAspects[1])
+        targets = np.column_stack([self.trainingAspects[2], self.trainingAspects[4]]).astype(self.dtype)
+        totalRatings = len(targets)
+
+        # Shared factors start small around zero and every head starts as the
+        # plain inner product, the means of the aspects are fixed
+        totalUsers, totalItems = self.trainingMatrix.shape
+        totalAspects = len(self.ASPECTS)
+        self.aspectU = randomState.normal(0, 0.1, (totalUsers, k)).astype(self.dtype, copy=False)
+        self.aspectV = randomState.normal(0, 0.1, (totalItems, k)).astype(self.dtype, copy=False)
+        self.aspectWeights = np.ones((totalAspects, k), dtype=self.dtype)
+        observed = ~np.isnan(targets)
+        sums = np.where(observed, targets, 0).sum(axis=0, dtype=np.float64)
+        self.aspectMeans = (sums / np.maximum(observed.sum(axis=0), 1)).astype(self.dtype)
+        self.aspectUserBiases = np.zeros((totalUsers, totalAspects), dtype=self.dtype)
+        self.aspectItemBiases = np.zeros((totalItems, totalAspects), dtype=self.dtype)
+
+        # Every epoch walks the shuffled ratings once, updating all the aspects of a batch together
+        self.sgdEpochStats = []
+        for epoch in range(0, iterations):
+            start = time.time()
+            rate = self.learningRate(learning_rate, epoch, schedule, decay)
+
+            order = randomState.permutation(totalRatings)
+            for batchStart in range(0, totalRatings, batch_size):
+                batch = order[batchStart:batchStart + batch_size]
+                self.aspect_batch_update(users[batch], items[batch], targets[batch], rate, regularization)
+            self.sgdEpochDone(epoch, iterations, time.time() - start, totalRatings, rate,
+                              stage="multi_aspect_factorization")
+
+        # The overall head becomes a biased sgd model
+        self.U = self.aspectU * self.aspectWeights[0]
+        self.Vt = self.aspectV.T
+        self.globalMean = float(self.aspectMeans[0])
+        self.userBiases = self.aspectUserBiases[:, 0].copy()
+        self.itemBiases = self.aspectItemBiases[:, 0].copy()
+        self.model = self.MF_SGD
+        self.sgdRandomState = None
+        self.sgdEpochs = 0
+
+
+    # Method: aspect_batch_update
+    # Purpose: Update the shared factors, the heads and the biases of every
+    #          aspect from the errors of a mini-batch of ratings. The gradients
+    #          of the factors from all aspects are summed through their weights,
+    #          the weights are shared by every rating so their gradient is the
+    #          average over the batch
+    # Arguments: rows (required) - idxs of the users
+    #            cols (required) - idxs of the items
+    #            targets (required) - ratings of every aspect, nan when missing
+    #            learning_rate (required) - learning rate of the epoch
+    #            regul (required) - regularization
+    # Return: None
+    def aspect_batch_update(self, rows, cols, targets, learning_rate, regul):
+        user_factors = self.aspectU[rows]
+        item_factors = self.aspectV[cols]
+        products = user_factors * item_factors
+
+        # Calculate the errors of every aspect, the missing ones add nothing
+        predicted = (np.dot(products, self.aspectWeights.T) + self.aspectMeans +
+                     self.aspectUserBiases[rows] + self.aspectItemBiases[cols])
+        errors = targets - predicted
+        errors[np.isnan(errors)] = 0.0
+
+        # Perform the update calculation for the shared factors of both the users and items
+        shared_errors = np.dot(errors, self.aspectWeights)
+        user_learn_rate_multiply = (2 * shared_errors * item_factors) - (regul * user_factors)
+        item_learn_rate_multiply = (2 * shared_errors * user_factors) - (regul * item_factors)
+        np.add.at(self.aspectU, rows, learning_rate * user_learn_rate_multiply)
+        np.add.at(self.aspectV, cols, learning_rate * item_learn_rate_multiply)
+
+        self.aspectWeights += learning_rate * ((2 * np.dot(errors.T, products) / len(rows)) -
+                                               (regul * self.aspectWeights))
+        np.add.at(self.aspectUserBiases, rows, learning_rate * ((2 * errors) - (regul * self.aspectUserBiases[rows])))
+        np.add.at(self.aspectItemBiases, cols, learning_rate * ((2 * errors) - (regul * self.aspectItemBiases[cols])))
+
+
+    # Method: predictAspects
+    # Purpose: Predict every aspect of pairs of users and items with the heads
+    #          of multi_aspect_factorization
+    # Arguments: users (required) - idxs of the users
+    #            items (required) - idxs of the items
+    # Return: matrix of the predictions, one row per pair and one column per aspect
+    def predictAspects(self, users, items):
+        users = np.asarray(users, dtype=np.int64)
+        items = np.asarray(items, dtype=np.int64)
+        products = self.aspectU[users] * self.aspectV[items]
+        return (np.dot(products, self.aspectWeights.T) + self.aspectMeans +
+                self.aspectUserBiases[users] + self.aspectItemBiases[items])
+
+
+    # Method: evaluateAspects
+    # Purpose: Root Mean Square Error of every aspect from one pass over the
+    #          held out ratings, a chunk of ratings at a time
+    # Arguments: testing (optional) - (users, items, ratings, times, aspects)
+    #                                 columns, defaults to the testing ratings
+    # Return: dict of the RMSE of every aspect
+    def evaluateAspects(self, testing=None):
+        if testing == None:
+            testing = self.testingAspects
+        if testing is None or getattr(self, "aspectU", None) is None:
+            raise ValueError("Evaluating the aspects needs a multi_aspect_factorization model "
+                             "and testing ratings with aspects")
+
+        squares = np.zeros(len(self.ASPECTS))
+        counts = np.zeros(len(self.ASPECTS))
+        for start in range(0, len(testing[0]), self.ASPECT_CHUNK):
+            end = start + self.ASPECT_CHUNK
+            targets = np.column_stack([testing[2][start:end], testing[4][start:end]]).astype(np.float64)
+            errors = targets - self.predictAspects(testing[0][start:end], testing[1][start:end])
+            observed = ~np.isnan(errors)
+            squares += np.where(observed, errors * errors, 0).sum(axis=0)
+            counts += observed.sum(axis=0)
+
+        result = {}
+        for aspect, square, count in zip(self.ASPECTS, squares, counts):
+            result[aspect] = sqrt(square / count) if count > 0 else float("nan")
+            print("RMSE for %s: %.4f" % (aspect, result[aspect]))
+        return result
 
 
     # Method: alternating_least_squares
-    # Purpose: TODO
-    # Arguments: TODO
-    # Return: TODO
+    # Purpose: Decompose the training matrix into U and Vt by alternating between
+    #          solving all users with the items fixed and all items with the users
+    #          fixed, every unrated cell counts as a rating of zero
+    # Arguments: k (optional) - number of latent factors, default to 10
+    #            regularization (optional) - regularization of the factors
+    #            iterations (optional) - number of alternating sweeps
+    #            warmStart (optional) - keep training the factors of the current
+    #                                   als model instead of new ones
+    # Return: None
+    @profiledStage
     def alternating_least_squares(self,
                                   k=10,
                                   regularization=0.02,
-                                  iterations=1):
+                                  iterations=1,
+                                  warmStart=False):
         # Create two matrices to be used for spliting the training matrix
         # Randomize the matrices intially
-        totalUsers = len(self.trainingMatrix)
-        totalItems = len(self.trainingMatrix[0])
-        self.U = np.random.rand(totalUsers, k)
-        V = np.random.rand(totalItems, k)
+        totalUsers, totalItems = self.trainingMatrix.shape
+        if warmStart and self.canWarmStart(self.MF_ALS, k):
+            V = np.array(self.Vt.T, dtype=self.dtype)
+        else:
+            self.U = np.random.rand(totalUsers, k).astype(self.dtype, copy=False)
+            V = np.random.rand(totalItems, k).astype(self.dtype, copy=False)
+        self.trainingInfo = {"k": k, "regularization": regularization, "iterations": iterations}
 
         # Create a regularization matrix to be added on.
         reg = regularization * np.identity(k)
@@ -223,24 +983,370 @@ class Recommender:
         # Iterate and alternate between keeping the User matrix constant and
         # then the Item matrix constant
         for iteration in range(0, iterations):
-            for user_idx in range(0, totalUsers):
-                # Solve for each user, by (VTV + reg) * u = VT * ratings_u
-                #                                       u = (VTV + reg)^-1 * (VT * ratings_u)
-                VTV = np.dot(V.T, V)
-                ratingsU = self.trainingMatrix[user_idx, :]
-                VTV_plus_reg = VTV + reg
-                VTV_dot_ratingsU = np.dot(V.T, ratingsU)
-                self.U[user_idx, :] = np.linalg.solve(VTV_plus_reg, VTV_dot_ratingsU)
-
-            for item_idx in range(0, totalItems):
-                # Solve for each item, by (UTU + reg) * i = UT * ratings_i
-                #                                       i = (UTU + reg)^-1 * (VT * ratings_i)
-                UTU = np.dot(self.U.T, self.U)
-                ratingsI = self.trainingMatrix[:, item_idx]
-                UTU_plus_reg = UTU + reg
-                V[item_idx, :] = np.linalg.solve(UTU_plus_reg, np.dot(self.U.T, ratingsI))
+            start = time.time()
+
+            # Solve for all users at once, by (VTV + reg) * U = VT * ratings
+            #                                             U = (VTV + reg)^-1 * (VT * ratings)
+            # The gram matrix is the same for every user so compute it once
+            VTV_plus_reg = self.gram(V) + reg
+            VTV_dot_ratings = self.trainingMatrix.dot(V)
+            if self.normalizeDataBefore == True:
+                VTV_dot_ratings -= self.mean_users_ratings * V.sum(axis=0, dtype=np.float64)
+            self.U = np.linalg.solve(VTV_plus_reg, VTV_dot_ratings.T).T.astype(self.dtype, copy=False)
+
+            # Solve for all items at once, by (UTU + reg) * V = UT * ratings
+            #                                             V = (UTU + reg)^-1 * (UT * ratings)
+            UTU_plus_reg = self.gram(self.U) + reg
+            UTU_dot_ratings = self.trainingMatrix.T.dot(self.U)
+            if self.normalizeDataBefore == True:
+                UTU_dot_ratings -= np.dot(self.mean_users_ratings.T.astype(np.float64), self.U)
+            V = np.linalg.solve(UTU_plus_reg, UTU_dot_ratings.T).T.astype(self.dtype, copy=False)
+
+            if self.profiler is not None:
+                self.profiler.iteration("alternating_least_squares", iteration=iteration + 1,
+                                        seconds=time.time() - start)
+
+        self.Vt = V.T
+        self.model = self.MF_ALS
+
+
+    # Method: weighted_alternating_least_squares
+    # Purpose: Alternating least squares that only solves over the recorded
+    #          ratings of each user and item, or weights them with a confidence
+    #          for implicit feedback. The systems are solved in batches of rows
+    #          spread over a pool of threads
+    # Arguments: k (optional) - number of latent factors, default to 10
+    #            regularization (optional) - regularization of the factors
+    #            iterations (optional) - number of alternating sweeps
+    #            implicit (optional) - treat ratings as implicit feedback with
+    #                                  confidence 1 + alpha * rating
+    #            alpha (optional) - confidence scaling for implicit feedback
+    #            workers (optional) - number of threads, defaults to all cores
+    #            seed (optional) - seed of the initialization
+    #            warmStart (optional) - keep training the factors of the current
+    #                                   wals model instead of new ones
+    # Return: None
+    @profiledStage
+    def weighted_alternating_least_squares(self,
+                                           k=10,
+                                           regularization=0.02,
+                                           iterations=5,
+                                           implicit=False,
+                                           alpha=40.0,
+                                           workers=None,
+                                           seed=None,
+                                           warmStart=False):
+        randomState = np.random.RandomState(seed)
+        self.trainingInfo = {"k": k, "regularization": regularization, "iterations": iterations,
+                             "implicit": implicit, "alpha": alpha, "seed": seed}
+        if workers == None:
+            workers = cpu_count()
+
+        # Create two matrices to be used for spliting the training matrix
+        totalUsers, totalItems = self.trainingMatrix.shape
+        if warmStart and self.canWarmStart(self.MF_WALS, k):
+            V = np.array(self.Vt.T, dtype=self.dtype)
+        else:
+            self.U = randomState.rand(totalUsers, k).astype(self.dtype, copy=False)
+            V = randomState.rand(totalItems, k).astype(self.dtype, copy=False)
+
+        # The items are solved from the columns, so keep a row major copy of them
+        trainingColumns = self.trainingMatrix.T.tocsr()
+
+        pool = ThreadPool(workers)
+        self.alsIterationStats = []
+        try:
+            for iteration in range(0, iterations):
+                start = time.time()
+
+                # Solve for every user with the items constant then the opposite
+                self.U = self.als_half_sweep(self.trainingMatrix, V, regularization, implicit, alpha, pool)
+                V = self.als_half_sweep(trainingColumns, self.U, regularization, implicit, alpha, pool)
+
+                seconds = time.time() - start
+                self.alsIterationStats.append({"iteration": iteration + 1, "seconds": seconds})
+                print("ALS iteration %d/%d: %.3fs" % (iteration + 1, iterations, seconds))
+                if self.profiler is not None:
+                    self.profiler.iteration("weighted_alternating_least_squares", **self.alsIterationStats[-1])
+        finally:
+            pool.close()
+            pool.join()
+
+        self.Vt = V.T
+        self.model = self.MF_WALS
+
+
+    # Method: als_half_sweep
+    # Purpose: Solve the factors of every row of the matrix with the factors of
+    #          the columns held constant, the rows are split in batches by amount
+    #          of ratings and each batch is solved by one of the threads
+    # Arguments: matrix (required) - CSR matrix of the ratings to solve for
+    #            fixed (required) - factors of the columns, one row per column
+    #            regularization (required) - regularization of the factors
+    #            implicit (required) - weight the ratings as implicit feedback
+    #            alpha (required) - confidence scaling for implicit feedback
+    #            pool (required) - pool of threads doing the solves
+    # Return: the solved factors, one row per row of the matrix
+    def als_half_sweep(self, matrix, fixed, regularization, implicit, alpha, pool):
+        totalRows = matrix.shape[0]
+        k = fixed.shape[1]
+        solved = np.zeros((totalRows, k), dtype=self.dtype)
+
+        # The gram matrix is shared by every row, only needed for implicit feedback
+        # where the unrated cells count as a preference of zero with confidence one
+        gram = self.gram(fixed) if implicit else None
+
+        # Split the rows so each batch holds about the same amount of ratings,
+        # bounding the k * k outer products held in memory by each batch
+        ratingsPerBatch = max(1, 2000000 // (k * k))
+        boundaries = np.searchsorted(matrix.indptr, np.arange(0, matrix.nnz, ratingsPerBatch), side="right") - 1
+        boundaries = np.unique(np.concatenate([boundaries, [0, totalRows]]))
+        batches = list(zip(boundaries[:-1], boundaries[1:]))
+
+        def solveBatch(batch):
+            self.als_solve_rows(matrix, fixed, regularization, implicit, alpha, gram, batch[0], batch[1], solved)
+
+        pool.map(solveBatch, batches)
+        return solved
+
+
+    # Method: als_solve_rows
+    # Purpose: Build and solve the k * k systems of a batch of rows using only
+    #          the recorded ratings of each row
+    #          explicit: (F_uT F_u + reg) * x_u = F_uT * r_u
+    #          implicit: (FTF + F_uT (C_u - I) F_u + reg) * x_u = F_uT * C_u * 1
+    # Arguments: matrix (required) - CSR matrix of the ratings to solve for
+    #            fixed (required) - factors of the columns, one row per column
+    #            regularization (required) - regularization of the factors
+    #            implicit (required) - weight the ratings as implicit feedback
+    #            alpha (required) - confidence scaling for implicit feedback
+    #            gram (required) - FTF of the fixed factors when implicit
+    #            startRow (required) - first row of the batch
+    #            endRow (required) - row after the last row of the batch
+    #            solved (required) - matrix to save the solved factors into
+    # Return: None
+    def als_solve_rows(self, matrix, fixed, regularization, implicit, alpha, gram, startRow, endRow, solved):
+        k = fixed.shape[1]
+        indptr = matrix.indptr[startRow:endRow + 1]
+        cols = matrix.indices[indptr[0]:indptr[-1]]
+        ratings = matrix.data[indptr[0]:indptr[-1]]
+
+        # Every system starts from the regularization, plus the gram for implicit
+        A = np.tile(regularization * np.identity(k), (endRow - startRow, 1, 1))
+        b = np.zeros((endRow - startRow, k))
+        if implicit:
+            A += gram
+
+        # Sum the outer products and right hand sides of the ratings of each row
+        # in float64, rows without ratings keep only the regularization
+        counts = np.diff(indptr)
+        rated = np.nonzero(counts)[0]
+        if len(rated) > 0:
+            offsets = (indptr[:-1] - indptr[0])[rated]
+            factors = np.asarray(fixed[cols], dtype=np.float64)
+            ratings = np.asarray(ratings, dtype=np.float64)
+
+            if implicit:
+                confidence = alpha * ratings
+                outer = np.einsum('ni,nj->nij', factors * confidence[:, np.newaxis], factors)
+                rhs = factors * (1.0 + confidence)[:, np.newaxis]
+            else:
+                outer = np.einsum('ni,nj->nij', factors, factors)
+                rhs = factors * ratings[:, np.newaxis]
+
+            A[rated] += np.add.reduceat(outer, offsets, axis=0)
+            b[rated] = np.add.reduceat(rhs, offsets, axis=0)
+
+        solved[startRow:endRow] = np.linalg.solve(A, b[:, :, np.newaxis])[:, :, 0]
+
+
+    # Method: updateModel
+    # Purpose: Update a trained sgd, als or wals model with a batch of new
+    #          ratings without retraining from scratch. The matrices grow to the
+    #          new users and items, new users and items are folded in with one
+    #          least squares solve against the saved factors, then a few passes
+    #          refine only the users and items the new ratings touched
+    # Arguments: ratings (required) - (users, items, ratings, ...) columns
+    #            totalUsers (required) - total amount of users with the new ones
+    #            totalItems (required) - total amount of items with the new ones
+    #            iterations (optional) - passes over the touched users and items
+    #            foldIn (optional) - solve the new users and items first instead
+    #                                of starting them from small random factors
+    #            seed (optional) - seed of the factors of new users and items
+    # Return: dict of the amount of new and touched users and items and the seconds
+    @profiledStage
+    def updateModel(self, ratings, totalUsers, totalItems, iterations=2, foldIn=True, seed=None):
+        if self.model not in (self.MF_SGD, self.MF_ALS, self.MF_WALS):
+            raise ValueError("Only sgd, als and wals models can be updated, not " + str(self.model))
+
+        start = time.time()
+        randomState = np.random.RandomState(seed)
+        regularization = self.trainingInfo.get("regularization", 0.02)
+        oldUsers, oldItems = self.trainingMatrix.shape
+        newUsers = np.asarray(ratings[0], dtype=np.int64)
+        newItems = np.asarray(ratings[1], dtype=np.int64)
+
+        # Grow the training matrix, a new rating of a cell replaces the old one
+        old = self.trainingMatrix.tocoo()
+        self.trainingMatrix = self.buildSparseMatrix(np.concatenate([old.row, newUsers]),
+                                                     np.concatenate([old.col, newItems]),
+                                                     np.concatenate([old.data, np.asarray(ratings[2], dtype=self.dtype)]),
+                                                     totalUsers, totalItems)
+        self.mean_users_ratings = self.userMeans()
+        if getattr(self, "testingMatrix", None) is not None:
+            testing = self.testingMatrix.tocoo()
+            self.testingMatrix = sparse.csr_matrix((testing.data, (testing.row, testing.col)),
+                                                   shape=(totalUsers, totalItems))
+
+        # Grow the factors and biases, new rows start small around zero
+        k = self.U.shape[1]
+        self.U = np.vstack([self.U, randomState.normal(0, 0.1, (totalUsers - oldUsers, k))]).astype(self.dtype, copy=False)
+        V = np.vstack([self.Vt.T, randomState.normal(0, 0.1, (totalItems - oldItems, k))]).astype(self.dtype, copy=False)
+        if self.userBiases is not None:
+            self.userBiases = np.concatenate([self.userBiases, np.zeros(totalUsers - oldUsers, dtype=self.dtype)])
+            self.itemBiases = np.concatenate([self.itemBiases, np.zeros(totalItems - oldItems, dtype=self.dtype)])
+
+        touchedUsers = np.unique(newUsers)
+        touchedItems = np.unique(newItems)
+        trainingColumns = self.trainingMatrix.T.tocsr()
+        implicit = self.trainingInfo.get("implicit", False)
+        alpha = self.trainingInfo.get("alpha", 40.0)
+
+        # Fold in the new users against the saved items, then the new items
+        # against every user, with the same objective the model was trained on
+        if foldIn == True:
+            if totalUsers > oldUsers:
+                rows = np.arange(oldUsers, totalUsers)
+                if self.model == self.MF_ALS:
+                    self.U[rows] = self.solveZeroFilledRows(self.trainingMatrix, V, rows, regularization, True)
+                else:
+                    self.U[rows] = self.solveAffectedRows(self.trainingMatrix, V, rows, regularization,
+                                                          self.userBiases, self.itemBiases, implicit, alpha)
+            if totalItems > oldItems:
+                rows = np.arange(oldItems, totalItems)
+                if self.model == self.MF_ALS:
+                    V[rows] = self.solveZeroFilledRows(trainingColumns, self.U, rows, regularization, False)
+                else:
+                    V[rows] = self.solveAffectedRows(trainingColumns, self.U, rows, regularization,
+                                                     self.itemBiases, self.userBiases, implicit, alpha)
+
+        # Refine only the touched users and items with the algorithm of the model
+        for iteration in range(0, iterations):
+            iterationStart = time.time()
+
+            if self.model == self.MF_SGD:
+                self.sgd_affected_pass(touchedUsers, touchedItems, V, regularization, randomState)
+            elif self.model == self.MF_WALS:
+                self.U[touchedUsers] = self.solveAffectedRows(self.trainingMatrix, V, touchedUsers, regularization,
+                                                              implicit=implicit, alpha=alpha)
+                V[touchedItems] = self.solveAffectedRows(trainingColumns, self.U, touchedItems, regularization,
+                                                         implicit=implicit, alpha=alpha)
+
+            # Every unrated cell counts as a zero, same as alternating_least_squares
+            else:
+                self.U[touchedUsers] = self.solveZeroFilledRows(self.trainingMatrix, V, touchedUsers,
+                                                                regularization, True)
+                V[touchedItems] = self.solveZeroFilledRows(trainingColumns, self.U, touchedItems,
+                                                           regularization, False)
+
+            if self.profiler is not None:
+                self.profiler.iteration("updateModel", iteration=iteration + 1, seconds=time.time() - iterationStart)
 
         self.Vt = V.T
+        self.itemIndex = None
+        self.similarIndex = None
+        self.modelVersion = None
+        self.updateStats = {"ratings": len(newUsers),
+                            "newUsers": totalUsers - oldUsers,
+                            "newItems": totalItems - oldItems,
+                            "touchedUsers": len(touchedUsers),
+                            "touchedItems": len(touchedItems),
+                            "seconds": time.time() - start}
+        print("Updated with %d ratings, %d new users, %d new items, %d touched users and %d touched items in %.3fs" %
+              (len(newUsers), totalUsers - oldUsers, totalItems - oldItems,
+               len(touchedUsers), len(touchedItems), self.updateStats["seconds"]))
+        return self.updateStats
+
+
+    # Method: solveAffectedRows
+    # Purpose: Solve the factors of only some rows of the matrix over their
+    #          recorded ratings with the factors of the columns held constant.
+    #          When biases were learned they are taken off the ratings first
+    # Arguments: matrix (required) - CSR matrix of the ratings to solve for
+    #            fixed (required) - factors of the columns, one row per column
+    #            rows (required) - idxs of the rows to solve
+    #            regularization (required) - regularization of the factors
+    #            rowBiases (optional) - biases of the rows
+    #            colBiases (optional) - biases of the columns
+    #            implicit (optional) - weight the ratings as implicit feedback
+    #            alpha (optional) - confidence scaling for implicit feedback
+    # Return: the solved factors, one row per row asked for
+    def solveAffectedRows(self, matrix, fixed, rows, regularization, rowBiases=None, colBiases=None,
+                          implicit=False, alpha=40.0):
+        subset = matrix[rows]
+        if rowBiases is not None:
+            subset.data = subset.data - self.globalMean - colBiases[subset.indices]
+            subset.data -= np.repeat(rowBiases[rows], np.diff(subset.indptr))
+
+        solved = np.zeros((len(rows), fixed.shape[1]), dtype=self.dtype)
+        gram = self.gram(fixed) if implicit else None
+        self.als_solve_rows(subset, fixed, regularization, implicit, alpha, gram, 0, len(rows), solved)
+        return solved
+
+
+    # Method: solveZeroFilledRows
+    # Purpose: Solve the factors of only some rows of the matrix with the factors
+    #          of the columns held constant, every unrated cell counts as a rating
+    #          of zero, same as alternating_least_squares
+    # Arguments: matrix (required) - CSR matrix of the ratings to solve for
+    #            fixed (required) - factors of the columns, one row per column
+    #            rows (required) - idxs of the rows to solve
+    #            regularization (required) - regularization of the factors
+    #            byUser (required) - whether the rows are users or items, the
+    #                                mean of the users is taken off every cell
+    #                                when normalizeDataBefore is set
+    # Return: the solved factors, one row per row asked for
+    def solveZeroFilledRows(self, matrix, fixed, rows, regularization, byUser):
+        ratingsDotFixed = matrix[rows].dot(fixed)
+        if self.normalizeDataBefore == True:
+            if byUser == True:
+                ratingsDotFixed -= self.mean_users_ratings[rows] * fixed.sum(axis=0, dtype=np.float64)
+            else:
+                ratingsDotFixed -= np.dot(self.mean_users_ratings.T.astype(np.float64), fixed)
+        reg = regularization * np.identity(fixed.shape[1])
+        return np.linalg.solve(self.gram(fixed) + reg, ratingsDotFixed.T).T.astype(self.dtype, copy=False)
+
+
+    # Method: sgd_affected_pass
+    # Purpose: One sgd epoch over only the ratings of the touched users or items,
+    #          with the learning rate and batch size the model was trained with
+    # Arguments: touchedUsers (required) - idxs of the touched users
+    #            touchedItems (required) - idxs of the touched items
+    #            V (required) - item factors, one row per item
+    #            regularization (required) - regularization of the factors
+    #            randomState (required) - random state shuffling the ratings
+    # Return: None
+    def sgd_affected_pass(self, touchedUsers, touchedItems, V, regularization, randomState):
+        learning_rate = self.trainingInfo.get("learning_rate", 0.0002)
+        batch_size = self.trainingInfo.get("batch_size", 1)
+
+        # Keep the ratings of the touched users or items only
+        ratings = self.trainingMatrix.tocoo()
+        userTouched = np.zeros(self.trainingMatrix.shape[0], dtype=bool)
+        itemTouched = np.zeros(self.trainingMatrix.shape[1], dtype=bool)
+        userTouched[touchedUsers] = True
+        itemTouched[touchedItems] = True
+        keep = np.nonzero(userTouched[ratings.row] | itemTouched[ratings.col])[0]
+        order = keep[randomState.permutation(len(keep))]
+
+        if batch_size <= 1:
+            for idx in order:
+                self.sgd_update(ratings.row[idx], ratings.col[idx], ratings.data[idx], V, learning_rate, regularization)
+        else:
+            for batchStart in range(0, len(order), batch_size):
+                batch = order[batchStart:batchStart + batch_size]
+                self.sgd_batch_update(ratings.row[batch], ratings.col[batch], ratings.data[batch], V,
+                                      learning_rate, regularization)
 
 
     # Method: predict
@@ -249,34 +1355,45 @@ class Recommender:
     # Arguments: alg (optional) - algorithm to use (user-item or item-item),
     #                             defaults to user-item
     # Return: None
+    @profiledStage
     def predict(self, alg="user"):
         self.prediction = []
 
-        # User-item algorithm using the similarity matrix
+        # User-item algorithm using the similarity matrix, each row holds the
+        # similarities of the neighbours of the user, either dense or only the
+        # top neighbours in a sparse matrix
         if alg == "user":
 
-            if self.normalizeDataBefore == False:
-                trainingMatrix_adjusted = self.trainingMatrix - self.mean_users_ratings
-
-            elif self.normalizeDataBefore == True:
-                trainingMatrix_adjusted = self.trainingMatrix
+            # The training matrix is kept sparse, so subtract the mean of the
+            # users after multiplying, S(X - m1T) = SX - (Sm)1T
+            if sparse.issparse(self.simMatrix):
+                numerator = self.simMatrix.dot(self.trainingMatrix).toarray()
+            else:
+                numerator = self.trainingMatrix.T.dot(self.simMatrix.T).T
+            numerator -= self.simMatrix.dot(self.mean_users_ratings)
 
-            # Calculate the prediction matrix based on the formula in README
-            denominator = np.abs(self.simMatrix).sum(axis=1)[:, np.newaxis]
-            numerator = self.simMatrix.dot(trainingMatrix_adjusted)
+            # Calculate the prediction matrix based on the formula in README,
+            # users without any neighbours are predicted with their mean
+            denominator = np.asarray(abs(self.simMatrix).sum(axis=1)).reshape(-1, 1)
+            denominator[denominator == 0] = 1.0
             self.prediction = self.mean_users_ratings + (numerator/denominator)
 
 
         # Similiar formula to user-item expect no need to account for user bias
         # so no need to subtract by mean on each row and then add it back at
-        # the end.
+        # the end. Each row of the similarity matrix holds the neighbours of
+        # an item so multiply by its transpose
         elif alg == "item":
-            numerator = self.trainingMatrix.dot(self.simMatrix)
-
-            # Same as user-item because similarity matrix is diagonal
-            # expect keep summation as one long list that will be divided by
-            # each row
-            denominator = np.array([np.abs(self.simMatrix).sum(axis=1)])
+            numerator = self.trainingMatrix.dot(self.simMatrix.T)
+            if sparse.issparse(numerator):
+                numerator = numerator.toarray()
+            if self.normalizeDataBefore == True:
+                numerator -= self.mean_users_ratings * np.asarray(self.simMatrix.sum(axis=1)).reshape(1, -1)
+
+            # Same as user-item except keep summation as one long list that
+            # will be divided by each row
+            denominator = np.asarray(abs(self.simMatrix).sum(axis=1)).reshape(1, -1)
+            denominator[denominator == 0] = 1.0
             self.prediction = numerator/denominator
 
         # From matrix_factorization, we can take the decomposed matrix and apply
@@ -288,25 +1405,37 @@ class Recommender:
             U_dot_sigma = np.dot(self.U, self.sigma)
             self.prediction = np.dot(U_dot_sigma, self.Vt) + self.mean_users_ratings
 
-        # For SGD and ALS, just produce the predications by taking dot product of
+        # For SGD and both ALS, just produce the predications by taking dot product of
         # the two decomposed matrices
-        elif alg == Recommender.MF_SGD or alg == Recommender.MF_ALS:
+        elif alg == Recommender.MF_SGD or alg == Recommender.MF_ALS or alg == Recommender.MF_WALS:
             self.prediction = np.dot(self.U, self.Vt)
 
+            # Add back the biases if SGD learned them
+            if alg == Recommender.MF_SGD and self.userBiases is not None:
+                self.prediction += self.globalMean
+                self.prediction += self.userBiases[:, np.newaxis]
+                self.prediction += self.itemBiases[np.newaxis, :]
+
 
     # Method: evaluate
-    # Purpose: Perform Root Mean Square Error on the prediction and test data
+    # Purpose: Perform Root Mean Square Error on the prediction and test data,
+    #          without a prediction matrix the model is scored in chunks
     # Arguments: None
     # Return: Root Mean Square Error from recommender and test data
+    @profiledStage
     def evaluate(self, kind="rmse"):
-        # Only what to compare what is in the test data
-        test_data_nonzero_idxs = self.testingMatrix.nonzero()
+        # Only what to compare what is in the test data, which are the stored
+        # entries of the sparse testing matrix
+        test_data = self.testingMatrix.tocoo()
 
         # Get all nonzero ratings from test data and its corresponding predictions
         # then run RMSE on it
-        test_ratings = self.testingMatrix[test_data_nonzero_idxs].flatten()
-        predict_ratings = self.prediction[test_data_nonzero_idxs].flatten()
-        mse = metrics.mean_squared_error(predict_ratings, test_ratings)
+        test_ratings = test_data.data
+        if len(getattr(self, "prediction", [])) > 0:
+            predict_ratings = np.asarray(self.prediction[test_data.row, test_data.col], dtype=np.float64)
+            mse = metrics.mean_squared_error(predict_ratings, np.asarray(test_ratings, dtype=np.float64))
+        else:
+            mse = self.evaluateAll()["rmse"] ** 2
         if kind == "rmse":
             return sqrt(mse)
         elif kind == "mse":
@@ -315,41 +1444,446 @@ class Recommender:
             return 0
 
 
+    # Method: evaluateAll
+    # Purpose: Evaluate accuracy and ranking metrics in one pass over the held
+    #          out ratings, scoring the model a chunk of users at a time in
+    #          parallel so the dense prediction matrix is never needed
+    # Arguments: testing (optional) - (users, items, ratings, ...) columns of the
+    #                                 held out ratings, defaults to the testing matrix
+    #            k (optional) - amount of recommendations ranked per user
+    #            relevantRating (optional) - held out ratings at least this are relevant
+    #            chunkUsers (optional) - users scored together
+    #            workers (optional) - number of threads, defaults to all cores
+    # Return: dict of rmse, mae, precision, recall, ndcg at k and coverage
+    @profiledStage
+    def evaluateAll(self, testing=None, k=10, relevantRating=Evaluator.RELEVANT_RATING,
+                    chunkUsers=Evaluator.CHUNK_USERS, workers=None):
+        if testing == None:
+            test_data = self.testingMatrix.tocoo()
+            testing = (test_data.row, test_data.col, test_data.data)
+
+        evaluator = Evaluator(self, k=k, relevantRating=relevantRating, chunkUsers=chunkUsers, workers=workers)
+        return evaluator.evaluate(testing[0], testing[1], testing[2])
+
+
     # Method: createSimMatrix
     # Purpose: Create a Similarity Matrix from the training data and use cosine
-    #          similarity as a way to find similarity between two users or items
+    #          similarity as a way to find similarity between two users or items.
+    #          The similarities are computed a block of rows at a time, either
+    #          stacked into a dense matrix or keeping only the top neighbours of
+    #          every row in a sparse matrix so memory is O(rows * neighbours)
     # Arguments: alg (optional) - algorithm to use (user-item or item-item),
     #                             defaults to user-item
     #            sim (optional) - similarity function to use,
     #                             defaults to cosine
+    #            neighbours (optional) - amount of neighbours to keep per user or
+    #                                    item, defaults to keeping all of them
+    #            blockSize (optional) - amount of rows computed at a time
+    #            workers (optional) - number of threads computing the blocks,
+    #                                 defaults to all cores
     # Return: None
-    def createSimMatrix(self, alg="user", sim="cosine"):
+    @profiledStage
+    def createSimMatrix(self, alg="user", sim="cosine", neighbours=None, blockSize=256, workers=None):
+
+        # Other metrics than cosine are only supported on the full matrix and
+        # are turned from distances into similarities
+        if sim != "cosine":
+            if neighbours != None:
+                raise ValueError("Only cosine similarity supports keeping the top neighbours")
+            matrix = self.trainingMatrix if alg == "user" else self.trainingMatrix.T
+            self.simMatrix = (1.0 - metrics.pairwise.pairwise_distances(matrix, metric=sim)).astype(self.dtype, copy=False)
+            np.fill_diagonal(self.simMatrix, 0.0)
+            self.model = alg
+            self.trainingInfo = {"sim": sim, "neighbours": neighbours}
+            return
+
+        self.prepareSimilarity(alg=alg)
+        totalRows = self.simVectors.shape[0]
+        blocks = [(start, min(start + blockSize, totalRows)) for start in range(0, totalRows, blockSize)]
+
+        if workers == None:
+            workers = cpu_count()
+        pool = ThreadPool(workers)
+        try:
+            # Keep every similarity in a dense matrix
+            if neighbours == None:
+                self.simMatrix = np.vstack(pool.map(lambda block: self.similarityBlock(block[0], block[1]), blocks))
+
+            # Otherwise keep only the top neighbours of every row
+            else:
+                results = pool.map(lambda block: self.neighboursBlock(block[0], block[1], neighbours), blocks)
+                rows = np.concatenate([result[0] for result in results])
+                cols = np.concatenate([result[1] for result in results])
+                values = np.concatenate([result[2] for result in results])
+                self.simMatrix = sparse.csr_matrix((values, (rows, cols)), shape=(totalRows, totalRows))
+        finally:
+            pool.close()
+            pool.join()
+
+        self.simVectors = None
+        self.model = alg
+        self.trainingInfo = {"sim": sim, "neighbours": neighbours}
+
+
+    # Method: prepareSimilarity
+    # Purpose: Precompute what every block of cosine similarities needs, the
+    #          vectors as rows of a sparse matrix, the terms subtracting the mean
+    #          of the users implicitly when normalizing before, and the norms
+    # Arguments: alg (optional) - algorithm to use (user-item or item-item),
+    #                             defaults to user-item
+    # Return: None
+    def prepareSimilarity(self, alg="user"):
+        means = self.mean_users_ratings.ravel().astype(np.float64)
+        self.simAlg = alg
+
         if alg == "user":
-            self.simMatrix = metrics.pairwise.pairwise_distances(self.trainingMatrix,metric=sim)
-        elif alg == "item":
-            self.simMatrix = metrics.pairwise.pairwise_distances(self.trainingMatrix.T,metric=sim)
+            self.simVectors = self.trainingMatrix
+        else:
+            self.simVectors = self.trainingMatrix.T.tocsr()
+        self.simVectorsT = self.simVectors.T.tocsr()
+
+        # The norms and sums are over every rating of a row so keep them in float64
+        squares = np.asarray(self.simVectors.multiply(self.simVectors).sum(axis=1, dtype=np.float64)).ravel()
+        if self.normalizeDataBefore == True:
+
+            # (x_u - m_u)(x_v - m_v) = x_u.x_v - m_v*sum(x_u) - m_u*sum(x_v) + n*m_u*m_v
+            if alg == "user":
+                self.simSums = np.asarray(self.simVectors.sum(axis=1, dtype=np.float64)).ravel()
+                totalItems = self.simVectors.shape[1]
+                squares += -2 * self.simSums * means + totalItems * means * means
+
+            # (x_i - m)(x_j - m) = x_i.x_j - m.x_i - m.x_j + m.m
+            else:
+                self.simMeanDots = self.simVectors.dot(means)
+                squares += -2 * self.simMeanDots + np.dot(means, means)
+
+        # All zero vectors have no similarity with any other
+        self.simNorms = np.sqrt(np.clip(squares, 0, None))
+        self.simNorms[self.simNorms == 0] = 1.0
+
+
+    # Method: similarityBlock
+    # Purpose: Cosine similarities of a block of rows with every row, the
+    #          similarity of a row with itself is left out
+    # Arguments: start (required) - first row of the block
+    #            end (required) - row after the last row of the block
+    # Return: dense matrix of the similarities, one row per row of the block
+    def similarityBlock(self, start, end):
+        gram = self.simVectors[start:end].dot(self.simVectorsT).toarray()
+
+        # Subtract the mean of the users implicitly, see prepareSimilarity
+        if self.normalizeDataBefore == True:
+            means = self.mean_users_ratings.ravel().astype(np.float64)
+            if self.simAlg == "user":
+                blockMeans = means[start:end]
+                gram -= np.outer(self.simSums[start:end], means) + np.outer(blockMeans, self.simSums)
+                gram += self.simVectors.shape[1] * np.outer(blockMeans, means)
+            else:
+                gram -= self.simMeanDots[start:end, np.newaxis] + self.simMeanDots[np.newaxis, :]
+                gram += np.dot(means, means)
+
+        # Normalize into cosine similarity
+        gram /= self.simNorms[start:end, np.newaxis]
+        gram /= self.simNorms[np.newaxis, :]
+        np.clip(gram, -1, 1, out=gram)
+        gram[np.arange(end - start), np.arange(start, end)] = 0.0
+        return gram
+
+
+    # Method: neighboursBlock
+    # Purpose: Find the most similar neighbours of a block of rows
+    # Arguments: start (required) - first row of the block
+    #            end (required) - row after the last row of the block
+    #            neighbours (required) - amount of neighbours to keep per row
+    # Return: tuple of the rows, columns and similarities of the neighbours
+    def neighboursBlock(self, start, end, neighbours):
+        similarities = self.similarityBlock(start, end)
+        neighbours = min(neighbours, similarities.shape[1])
+
+        # Partially sort each row to get the top similarities without sorting all
+        cols = np.argpartition(-similarities, neighbours - 1, axis=1)[:, :neighbours]
+        rows = np.repeat(np.arange(start, end), neighbours)
+        cols = cols.ravel()
+        values = similarities[rows - start, cols]
+
+        # Drop the neighbours that have no similarity at all
+        keep = values != 0
+        return rows[keep], cols[keep], values[keep]
+
+
+    # Method: scoreUsers
+    # Purpose: Predict the ratings of every item for only the users passed in,
+    #          straight from the factors or neighbours of the trained model
+    #          instead of the full prediction matrix
+    # Arguments: users (required) - idxs of the users to score
+    # Return: dense matrix of the predictions, one row per user
+    def scoreUsers(self, users):
+        users = np.asarray(users, dtype=np.int64)
+
+        # U * sigma * Vt plus the mean of the users
+        if self.model == self.MF_SVD:
+            scores = np.dot(self.U[users] * np.diag(self.sigma), self.Vt)
+            scores += self.mean_users_ratings[users]
+
+        # U * Vt plus the biases if SGD learned them
+        elif self.model == self.MF_SGD or self.model == self.MF_ALS or self.model == self.MF_WALS:
+            scores = np.dot(self.U[users], self.Vt)
+            if self.model == self.MF_SGD and self.userBiases is not None:
+                scores += self.globalMean
+                scores += self.userBiases[users, np.newaxis]
+                scores += self.itemBiases[np.newaxis, :]
+
+        # Same formula as predict using only the neighbours of the users
+        elif self.model == "user":
+            neighbours = self.simMatrix[users]
+            if sparse.issparse(neighbours):
+                numerator = neighbours.dot(self.trainingMatrix).toarray()
+            else:
+                numerator = self.trainingMatrix.T.dot(neighbours.T).T
+            numerator -= neighbours.dot(self.mean_users_ratings)
+            denominator = np.asarray(abs(neighbours).sum(axis=1)).reshape(-1, 1)
+            denominator[denominator == 0] = 1.0
+            scores = self.mean_users_ratings[users] + (numerator/denominator)
+
+        # Same formula as predict using only the ratings of the users
+        elif self.model == "item":
+            numerator = self.trainingMatrix[users].dot(self.simMatrix.T)
+            if sparse.issparse(numerator):
+                numerator = numerator.toarray()
+            if self.normalizeDataBefore == True:
+                numerator -= self.mean_users_ratings[users] * np.asarray(self.simMatrix.sum(axis=1)).reshape(1, -1)
+            denominator = np.asarray(abs(self.simMatrix).sum(axis=1)).reshape(1, -1)
+            denominator[denominator == 0] = 1.0
+            scores = numerator/denominator
+
+        # Otherwise only the prediction matrix is available
+        else:
+            scores = np.array(self.prediction[users], dtype=np.float64)
+
+        return scores
+
+
+    # Method: recommend
+    # Purpose: Get the top recommendations for a batch of users, skipping the
+    #          items they already rated. Only the users passed in are scored and
+    #          the top items are found with a partial sort
+    # Arguments: users (required) - idxs of the users to recommend to
+    #            n (optional) - amount of recommendations per user,
+    #                           defaults to TOP_RECOMMENDATIONS
+    # Return: tuple of the recommended items and their predicted ratings, one
+    #         row per user in order of best first. If a user has rated nearly
+    #         every item the remaining slots have an item of -1
+    def recommend(self, users, n=TOP_RECOMMENDATIONS):
+        users = np.asarray(users, dtype=np.int64).reshape(-1)
+        return self.rankScores(users, self.scoreUsers(users), n)
+
+
+    # Method: rankScores
+    # Purpose: Get the top items of the scores of a batch of users, skipping
+    #          the items they already rated. The scores are overwritten
+    # Arguments: users (required) - idxs of the users of the rows of the scores
+    #            scores (required) - scores of every item, one row per user
+    #            n (required) - amount of items per user
+    # Return: tuple of the top items and their scores, same as recommend
+    def rankScores(self, users, scores, n):
+        totalItems = scores.shape[1]
+        n = min(n, totalItems)
+
+        # Mask the items already rated by each user
+        rated = self.trainingMatrix[users].tocoo()
+        scores[rated.row, rated.col] = -np.inf
+
+        # Partially sort to get the top n of each user then sort only those
+        rows = np.arange(len(users))[:, np.newaxis]
+        top = np.argpartition(-scores, n - 1, axis=1)[:, :n]
+        order = np.argsort(-scores[rows, top], axis=1)
+        items = top[rows, order]
+        predictions = scores[rows, items]
+
+        items[np.isneginf(predictions)] = -1
+        return items, predictions
+
+
+    # Method: buildIndex
+    # Purpose: Build the approximate nearest neighbour indexes over the item
+    #          factors of the model, one for inner product to recommend to users
+    #          and one for cosine to find similar beers
+    # Arguments: clusters (optional) - amount of clusters of each index
+    #            probes (optional) - clusters scored by each search
+    #            seed (optional) - seed of the clustering
+    # Return: None
+    @profiledStage
+    def buildIndex(self, clusters=None, probes=None, seed=None):
+        start = time.time()
+        self.itemIndex = ItemIndex(ItemIndex.METRIC_IP, clusters=clusters, probes=probes, seed=seed)
+        self.itemIndex.build(self.indexVectors())
+        self.similarIndex = ItemIndex(ItemIndex.METRIC_COSINE, clusters=clusters, probes=probes, seed=seed)
+        self.similarIndex.build(np.asarray(self.Vt).T)
+        print("Built indexes of %d clusters over %d items in %.3fs" %
+              (self.itemIndex.clusters, self.Vt.shape[1], time.time() - start))
+
+
+    # Method: indexVectors
+    # Purpose: Item vectors whose inner product with indexQueries orders the
+    #          items the same as the predicted ratings of the model
+    # Arguments: None
+    # Return: the item vectors, one row per item
+    def indexVectors(self):
+        if self.model not in (self.MF_SVD, self.MF_SGD, self.MF_ALS, self.MF_WALS):
+            raise ValueError("Only matrix factorization models can be indexed, not " + str(self.model))
+
+        # The biases of the items become one more factor
+        vectors = np.asarray(self.Vt).T
+        if self.model == self.MF_SGD and self.itemBiases is not None:
+            vectors = np.hstack([vectors, np.asarray(self.itemBiases)[:, np.newaxis]])
+        return vectors
+
+
+    # Method: indexQueries
+    # Purpose: Query vectors of the users and what to add to their inner
+    #          products to get the predicted ratings, their mean or biases
+    # Arguments: users (required) - idxs of the users
+    # Return: tuple of the query vectors and the offsets of the users
+    def indexQueries(self, users):
+        queries = np.asarray(self.U[users])
+        offsets = np.zeros(len(users))
+        if self.model == self.MF_SVD:
+            queries = queries * np.diag(self.sigma)
+            offsets = self.mean_users_ratings[users].ravel()
+        elif self.model == self.MF_SGD and self.userBiases is not None:
+            queries = np.hstack([queries, np.ones((len(users), 1))])
+            offsets = self.globalMean + np.asarray(self.userBiases)[users]
+        return queries, offsets
+
+
+    # Method: recommendApprox
+    # Purpose: Same as recommend except the top items are found with the index,
+    #          only scoring the items of the probed clusters
+    # Arguments: users (required) - idxs of the users to recommend to
+    #            n (optional) - amount of recommendations per user
+    #            probes (optional) - clusters to score, more gives better recall
+    # Return: tuple of the recommended items and their predicted ratings
+    def recommendApprox(self, users, n=TOP_RECOMMENDATIONS, probes=None):
+        if self.itemIndex == None:
+            self.buildIndex()
+        users = np.asarray(users, dtype=np.int64).reshape(-1)
+        queries, offsets = self.indexQueries(users)
+        items, predictions = self.itemIndex.search(queries, n, probes=probes, exclude=self.trainingMatrix[users])
+        return items, predictions + offsets[:, np.newaxis]
+
+
+    # Method: similarBeers
+    # Purpose: Find the beers with the most similar item factors by cosine
+    # Arguments: item (required) - idx of the beer or its name
+    #            n (optional) - amount of similar beers
+    #            probes (optional) - clusters to score, more gives better recall
+    #            exact (optional) - compare against every beer instead of the index
+    # Return: tuple of the similar items and their cosine similarities
+    def similarBeers(self, item, n=TOP_RECOMMENDATIONS, probes=None, exact=False):
+        if not isinstance(item, (int, long, np.integer)):
+            item = self.findBeer(item)
+        vectors = np.asarray(self.Vt).T
+        norms = np.sqrt(np.einsum('ij,ij->i', vectors, vectors))
+        query = vectors[item] / max(norms[item], 1e-12)
+
+        # The beer itself is always skipped
+        if exact == True:
+            similarities = np.dot(vectors, query) / np.maximum(norms, 1e-12)
+            similarities[item] = -np.inf
+            n = min(n, len(similarities) - 1)
+            top = np.argpartition(-similarities, n - 1)[:n]
+            top = top[np.argsort(-similarities[top], kind="mergesort")]
+            return top[np.newaxis, :], similarities[top][np.newaxis, :]
+
+        if self.similarIndex == None:
+            self.buildIndex()
+        exclude = sparse.csr_matrix(([1.0], ([0], [item])), shape=(1, vectors.shape[0]))
+        return self.similarIndex.search(query, n, probes=probes, exclude=exclude)
+
+
+    # Method: findBeer
+    # Purpose: Find the idx of a beer by its name, ignoring case and spaces
+    # Arguments: name (required) - name of the beer
+    # Return: idx of the beer
+    def findBeer(self, name):
+        name = name.strip().lower()
+        for idx, beerName in self.mappingIdxToBeer.iteritems():
+            if beerName.strip().lower() == name:
+                return idx
+        raise KeyError("No beer named " + name)
+
+
+    # Method: indexRecall
+    # Purpose: Report the recall and speed of the indexes against exact search,
+    #          the recall being the share of the exact top items also found
+    # Arguments: n (optional) - amount of items per search
+    #            probes (optional) - clusters to score
+    #            sample (optional) - amount of users and beers to search for
+    #            seed (optional) - seed of the sampled users and beers
+    # Return: dict of the recall and milliseconds per search of both indexes
+    def indexRecall(self, n=TOP_RECOMMENDATIONS, probes=None, sample=500, seed=0):
+        if self.itemIndex == None:
+            self.buildIndex()
+        randomState = np.random.RandomState(seed)
+        totalUsers, totalItems = self.trainingMatrix.shape
+        users = randomState.choice(totalUsers, min(sample, totalUsers), replace=False)
+        items = randomState.choice(totalItems, min(sample, totalItems), replace=False)
+
+        def recall(exactItems, approxItems):
+            found = 0
+            total = 0
+            for exactRow, approxRow in zip(exactItems, approxItems):
+                exactRow = exactRow[exactRow >= 0]
+                found += len(np.intersect1d(exactRow, approxRow))
+                total += len(exactRow)
+            return float(found) / total if total > 0 else 1.0
+
+        start = time.time()
+        exactItems = self.recommend(users, n=n)[0]
+        exactSeconds = time.time() - start
+        start = time.time()
+        approxItems = self.recommendApprox(users, n=n, probes=probes)[0]
+        approxSeconds = time.time() - start
+
+        start = time.time()
+        exactSimilar = [self.similarBeers(item, n=n, exact=True)[0][0] for item in items]
+        exactSimilarSeconds = time.time() - start
+        start = time.time()
+        approxSimilar = [self.similarBeers(item, n=n, probes=probes)[0][0] for item in items]
+        approxSimilarSeconds = time.time() - start
+
+        result = {"recall": recall(exactItems, approxItems),
+                  "exactMs": 1000 * exactSeconds / len(users),
+                  "approxMs": 1000 * approxSeconds / len(users),
+                  "similarRecall": recall(exactSimilar, approxSimilar),
+                  "exactSimilarMs": 1000 * exactSimilarSeconds / len(items),
+                  "approxSimilarMs": 1000 * approxSimilarSeconds / len(items),
+                  "probes": probes if probes != None else self.itemIndex.probes,
+                  "similarProbes": probes if probes != None else self.similarIndex.probes,
+                  "clusters": self.itemIndex.clusters}
+        print("Index recall@%d of %d clusters: users %.3f probing %d (%.3fms vs %.3fms exact), "
+              "similar beers %.3f probing %d (%.3fms vs %.3fms exact)" %
+              (n, result["clusters"], result["recall"], result["probes"], result["approxMs"], result["exactMs"],
+               result["similarRecall"], result["similarProbes"], result["approxSimilarMs"], result["exactSimilarMs"]))
+        return result
 
 
     # Method: printRecommendations
-    # Purpose: TODO
-    # Arguments: TODO
-    # Return: TODO
+    # Purpose: Print the ratings of a user and the top recommendations for them
+    # Arguments: user (optional) - idx of the user, defaults to 0
+    # Return: None
     def printRecommendations(self, user=0):
-        user_predications = self.prediction[user, :].tolist()
-        user_ratings = self.trainingMatrix[user, :]
+        user_ratings = self.trainingMatrix[user]
         ratingsNames = []
-        ratingsIdx = []
+        for idx, rating in zip(user_ratings.indices, user_ratings.data):
+            beerName = self.mappingIdxToBeer.get(idx, idx)
+            ratingsNames.append((beerName, rating))
+
+        items, predictions = self.recommend([user], n=self.TOP_RECOMMENDATIONS)
         recommendationNames = []
-        for idx, rating in enumerate(user_ratings):
-            if rating > 0:
-                beerName = self.mappingIdxToBeer[idx]
-                ratingsNames.append((beerName, rating))
-                ratingsIdx.append(idx)
-
-        user_predications.sort(reverse=True)
-        for idx, predication in enumerate(user_predications):
-            if idx not in ratingsIdx:
-                beerName = self.mappingIdxToBeer[idx]
+        for idx, predication in zip(items[0], predictions[0]):
+            if idx >= 0:
+                beerName = self.mappingIdxToBeer.get(idx, idx)
                 recommendationNames.append((beerName, predication))
 
 
@@ -357,69 +1891,83 @@ class Recommender:
         print ratingsNames
 
         print "Recommendations: "
-        print recommendationNames[:20]
+        print recommendationNames
+
+
+    # Method: printSimilarBeers
+    # Purpose: Print the beers most similar to a beer using the index
+    # Arguments: item (required) - idx of the beer or its name
+    #            probes (optional) - clusters to score
+    # Return: None
+    def printSimilarBeers(self, item, probes=None):
+        items, similarities = self.similarBeers(item, n=self.TOP_RECOMMENDATIONS, probes=probes)
+        similarNames = []
+        for idx, similarity in zip(items[0], similarities[0]):
+            if idx >= 0:
+                similarNames.append((self.mappingIdxToBeer.get(idx, idx), similarity))
+
+        print "Beers similar to " + str(item) + ": "
+        print similarNames
 
 
     # Method: savePredictions
-    # Purpose: TODO
-    # Arguments: TODO
-    # Return: TODO
+    # Purpose: Save the prediction matrix to a text file
+    # Arguments: None
+    # Return: None
     def savePredictions(self):
         np.savetxt(self.FILE_PRED_MAT, self.prediction, fmt='%1.1f')
 
 
     # Method: saveRecommendations
-    # Purpose: TODO
-    # Arguments: TODO
-    # Return: TODO
-    def saveRecommendations(self):
+    # Purpose: Save the top recommendations and top ratings of every user to
+    #          files, one line per user. The recommendations come straight from
+    #          the model in memory, a chunk of users at a time
+    # Arguments: chunkSize (optional) - amount of users recommended to at a time
+    # Return: None
+    @profiledStage
+    def saveRecommendations(self, chunkSize=1000):
         print "Saving Recommendatons to file"
-        with open(self.FILE_RECOM, 'w') as rec, open(self.FILE_RATINGS, 'w') as rat, open(self.FILE_PRED_MAT, 'r') as pred:
-            user = 0
-            for line in pred:
-                user_predications = map(float, line.split())
-                user_ratings = self.trainingMatrix[user, :].tolist()
-                ratingsNames = []
-                ratingsIdx = []
-                recommendationNames = []
-                for idx, rating in enumerate(user_ratings):
-                    if rating > 0:
-                        beerName = self.mappingIdxToBeer[idx]
-                        ratingsNames.append((beerName, rating))
-                        ratingsIdx.append(idx)
-
-                ratingsNames.sort(key=lambda rating: rating[1], reverse=True)
-
-                totalRecommendations = 0
-                for idx, predication in enumerate(user_predications):
-                    if idx not in ratingsIdx:
-                        beerName = self.mappingIdxToBeer[idx]
-                        recommendationNames.append((beerName, predication))
-                        totalRecommendations += 1
-
-                recommendationNames.sort(key=lambda pred: pred[1], reverse=True)
-
-                # Take top 20 recommendations
-                recommendationNames = recommendationNames[:20]
-                recommendStringList = [str(r[0]) + "::" + ("%.1f" % r[1]) for r in recommendationNames]
-                lineToWrite = ", ".join(recommendStringList)
-                rec.write(lineToWrite + "\n")
-
-                # Take top 20 ratings
-                ratingsNames = ratingsNames[:20]
-                ratingsStringList =  [str(r[0]) + "::" + ("%.1f" % r[1]) for r in ratingsNames]
-                lineToWrite = ", ".join(ratingsStringList)
-                rat.write(lineToWrite + "\n")
-
-                user += 1
+        totalUsers = self.trainingMatrix.shape[0]
+        with open(self.FILE_RECOM, 'w') as rec, open(self.FILE_RATINGS, 'w') as rat:
+            for start in range(0, totalUsers, chunkSize):
+                users = np.arange(start, min(start + chunkSize, totalUsers))
+                items, predictions = self.recommend(users, n=self.TOP_RECOMMENDATIONS)
+
+                recLines = []
+                ratLines = []
+                for row, user in enumerate(users):
+
+                    # Take top 20 recommendations
+                    recommendStringList = [self.formatRating(idx, predication)
+                                           for idx, predication in zip(items[row], predictions[row]) if idx >= 0]
+                    recLines.append(", ".join(recommendStringList) + "\n")
+
+                    # Take top 20 ratings, highest first and in order of the items on ties
+                    user_ratings = self.trainingMatrix[user]
+                    top = np.argsort(-user_ratings.data, kind="mergesort")[:self.TOP_RECOMMENDATIONS]
+                    ratingsStringList = [self.formatRating(user_ratings.indices[idx], user_ratings.data[idx])
+                                         for idx in top]
+                    ratLines.append(", ".join(ratingsStringList) + "\n")
+
+                rec.writelines(recLines)
+                rat.writelines(ratLines)
+
+
+    # Method: formatRating
+    # Purpose: Format the rating of a beer as name::rating
+    # Arguments: itemIdx (required) - idx of the beer
+    #            rating (required) - rating or prediction of the beer
+    # Return: the formatted string
+    def formatRating(self, itemIdx, rating):
+        return str(self.mappingIdxToBeer.get(itemIdx, itemIdx)) + "::" + ("%.1f" % rating)
 
 
     # Method: loadPredications
-    # Purpose: TODO
-    # Arguments: TODO
-    # Return: TODO
+    # Purpose: Load the prediction matrix saved by savePredictions
+    # Arguments: None
+    # Return: None
     def loadPredications(self):
-        self.predications = np.loadtxt(self.FILE_PRED_MAT)
+        self.prediction = np.loadtxt(self.FILE_PRED_MAT, ndmin=2, dtype=self.dtype)
 
 
     # Method: saveMappingFromIdxToBeer
@@ -429,3 +1977,139 @@ class Recommender:
     def saveMappingFromIdxToBeer(self):
         with open('../data/mapping.json', 'w') as fp:
             json.dump(self.mappingIdxToBeer, fp, sort_keys=True, indent=4)
+
+
+    # Method: saveModel
+    # Purpose: Save the trained model, its factors or neighbours, the means and
+    #          biases, the recorded training ratings used to skip rated items,
+    #          the mappings and how it was trained, to be loaded back by loadModel
+    # Arguments: directory (optional) - where to save the model
+    #            mappings (optional) - more mappings to save with the names of
+    #                                  the beers, ex. {"users": mappingIdxToUser}
+    # Return: None
+    def saveModel(self, directory=DIRECTORY_MODEL, mappings=None):
+        if self.model == None:
+            raise ValueError("There is no trained model to save")
+
+        arrays = {"U": self.U if self.model in (self.MF_SVD, self.MF_SGD, self.MF_ALS, self.MF_WALS) else None,
+                  "Vt": self.Vt if self.model in (self.MF_SVD, self.MF_SGD, self.MF_ALS, self.MF_WALS) else None,
+                  "sigma": np.diag(self.sigma) if self.model == self.MF_SVD else None,
+                  "mean_users_ratings": self.mean_users_ratings,
+                  "userBiases": self.userBiases,
+                  "itemBiases": self.itemBiases}
+        arrays.update(self.sparseArrays("training", self.trainingMatrix))
+
+        # The shared factors and heads of every aspect when trained together
+        if "aspects" in self.trainingInfo:
+            arrays.update({"aspectU": self.aspectU,
+                           "aspectV": self.aspectV,
+                           "aspectWeights": self.aspectWeights,
+                           "aspectMeans": self.aspectMeans,
+                           "aspectUserBiases": self.aspectUserBiases,
+                           "aspectItemBiases": self.aspectItemBiases})
+
+        # Only the neighbours are kept for collaborative filtering
+        if self.model == "user" or self.model == "item":
+            if sparse.issparse(self.simMatrix):
+                arrays.update(self.sparseArrays("sim", self.simMatrix))
+            else:
+                arrays["simMatrix"] = self.simMatrix
+
+        allMappings = {"beers": self.mappingIdxToBeer}
+        allMappings.update(self.mappings)
+        if mappings:
+            allMappings.update(mappings)
+        meta = {"model": self.model,
+                "shape": list(self.trainingMatrix.shape),
+                "normalizeDataBefore": self.normalizeDataBefore,
+                "globalMean": self.globalMean,
+                "dtype": self.dtype.name,
+                "trainingInfo": self.trainingInfo}
+
+        # Every saved model gets a new version so caches of an older one are skipped
+        self.modelVersion = uuid.uuid4().hex
+        meta["modelVersion"] = self.modelVersion
+        ModelStore(directory).save(arrays, meta, allMappings)
+
+        # The indexes are kept next to the model in their own directories
+        if self.itemIndex is not None:
+            self.itemIndex.save(os.path.join(directory, self.DIRECTORY_INDEX))
+            self.similarIndex.save(os.path.join(directory, self.DIRECTORY_SIMILAR_INDEX))
+
+
+    # Method: loadModel
+    # Purpose: Load a model saved by saveModel, memory mapping its arrays so
+    #          several processes share them. The arrays are read only unless
+    #          mmap is turned off
+    # Arguments: directory (optional) - where the model was saved
+    #            mmap (optional) - memory map the arrays, default to True
+    # Return: None
+    def loadModel(self, directory=DIRECTORY_MODEL, mmap=True):
+        arrays, meta, mappings = ModelStore(directory).load(mmap=mmap)
+
+        self.model = meta["model"]
+        self.normalizeDataBefore = meta["normalizeDataBefore"]
+        self.globalMean = meta["globalMean"]
+        self.dtype = np.dtype(str(meta.get("dtype", "float64")))
+        self.trainingInfo = meta["trainingInfo"]
+        self.modelVersion = meta.get("modelVersion", meta["created"])
+        self.mean_users_ratings = arrays["mean_users_ratings"]
+        self.userBiases = arrays.get("userBiases")
+        self.itemBiases = arrays.get("itemBiases")
+        self.trainingMatrix = self.loadSparseArrays("training", arrays, meta["shape"])
+
+        if "U" in arrays:
+            self.U = arrays["U"]
+            self.Vt = arrays["Vt"]
+        if "sigma" in arrays:
+            self.sigma = np.diag(arrays["sigma"])
+        if "aspectU" in arrays:
+            self.aspectU = arrays["aspectU"]
+            self.aspectV = arrays["aspectV"]
+            self.aspectWeights = arrays["aspectWeights"]
+            self.aspectMeans = arrays["aspectMeans"]
+            self.aspectUserBiases = arrays["aspectUserBiases"]
+            self.aspectItemBiases = arrays["aspectItemBiases"]
+        if "sim_data" in arrays:
+            totalRows = meta["shape"][0] if self.model == "user" else meta["shape"][1]
+            self.simMatrix = self.loadSparseArrays("sim", arrays, [totalRows, totalRows])
+        elif "simMatrix" in arrays:
+            self.simMatrix = arrays["simMatrix"]
+
+        # Recommendations are printed and served by the names of the beers
+        if "beers" not in mappings:
+            raise ValueError("Model in " + directory + " has no names of the beers, save it again with -savemodel")
+        self.mappingIdxToBeer = mappings.pop("beers")
+        self.mappings = mappings
+
+        # Load the indexes if they were saved with the model
+        self.itemIndex = None
+        self.similarIndex = None
+        if os.path.isdir(os.path.join(directory, self.DIRECTORY_INDEX)):
+            self.itemIndex = ItemIndex()
+            self.itemIndex.load(os.path.join(directory, self.DIRECTORY_INDEX))
+            self.similarIndex = ItemIndex()
+            self.similarIndex.load(os.path.join(directory, self.DIRECTORY_SIMILAR_INDEX))
+
+
+    # Method: sparseArrays
+    # Purpose: Split a CSR matrix into its arrays to be saved
+    # Arguments: prefix (required) - prefix of the names of the arrays
+    #            matrix (required) - the CSR matrix
+    # Return: dict of the arrays by name
+    def sparseArrays(self, prefix, matrix):
+        matrix = sparse.csr_matrix(matrix)
+        return {prefix + "_data": matrix.data,
+                prefix + "_indices": matrix.indices,
+                prefix + "_indptr": matrix.indptr}
+
+
+    # Method: loadSparseArrays
+    # Purpose: Build a CSR matrix on top of the loaded arrays without copying them
+    # Arguments: prefix (required) - prefix of the names of the arrays
+    #            arrays (required) - dict of the loaded arrays
+    #            shape (required) - shape of the matrix
+    # Return: the CSR matrix
+    def loadSparseArrays(self, prefix, arrays, shape):
+        return sparse.csr_matrix((arrays[prefix + "_data"], arrays[prefix + "_indices"], arrays[prefix + "_indptr"]),
+                                 shape=tuple(shape), copy=False)
@@ -0,0 +1,485 @@
+# Title: Server File
+# Author: Kenan Mesic
+# Date: 10/18/26
+# Purpose: All classes and methods involved with serving recommendations over
+#          HTTP from a model loaded once into memory
+
+import os
+import sys
+import json
+import time
+import threading
+from collections import deque
+from Queue import Queue, Empty
+from urlparse import urlparse, parse_qs
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+import numpy as np
+from recommender import Recommender
+from store import ModelStore
+from cache import RecommendationCache
+
+
+# Class: LatencyMetrics
+# Purporse: Keeps the latencies of the latest requests of every endpoint to
+#           report their count and p50/p99, plus the sizes of the batches
+class LatencyMetrics:
+
+    WINDOW = 10000
+
+
+    # Method: Constructor
+    # Purpose: Create empty metrics
+    # Arguments: None
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.counts = {}
+        self.errors = 0
+        self.batches = 0
+        self.batchedRequests = 0
+        self.start = time.time()
+
+
+    # Method: record
+    # Purpose: Record the latency of one request
+    # Arguments: endpoint (required) - path of the request
+    #            seconds (required) - latency of the request
+    #            error (optional) - whether the request failed
+    # Return: None
+    def record(self, endpoint, seconds, error=False):
+        with self.lock:
+            if endpoint not in self.latencies:
+                self.latencies[endpoint] = deque(maxlen=self.WINDOW)
+                self.counts[endpoint] = 0
+            self.latencies[endpoint].append(seconds)
+            self.counts[endpoint] += 1
+            if error:
+                self.errors += 1
+
+
+    # Method: recordBatch
+    # Purpose: Record the size of one scored batch
+    # Arguments: size (required) - amount of requests in the batch
+    # Return: None
+    def recordBatch(self, size):
+        with self.lock:
+            self.batches += 1
+            self.batchedRequests += size
+
+
+    # Method: report
+    # Purpose: Summarize the metrics
+    # Arguments: None
+    # Return: dict of the requests, p50 and p99 in milliseconds by endpoint
+    def report(self):
+        with self.lock:
+            endpoints = {}
+            for endpoint, latencies in self.latencies.items():
+                values = np.array(latencies) * 1000
+                endpoints[endpoint] = {"requests": self.counts[endpoint],
+                                       "p50Ms": float(np.percentile(values, 50)),
+                                       "p99Ms": float(np.percentile(values, 99))}
+            return {"uptimeSeconds": time.time() - self.start,
+                    "errors": self.errors,
+                    "batches": self.batches,
+                    "averageBatchSize": float(self.batchedRequests) / self.batches if self.batches > 0 else 0.0,
+                    "endpoints": endpoints}
+
+
+# Class: RecommendBatcher
+# Purporse: Collects the recommend requests arriving at the same time and scores
+#           them together with one vectorized call of the recommender. Every
+#           worker thread takes the requests waiting in the queue, up to the
+#           batch size and waiting at most a few milliseconds for more
+class RecommendBatcher:
+
+
+    # Method: Constructor
+    # Purpose: Create the batcher and start its workers
+    # Arguments: recommendMachine (required) - the loaded recommender
+    #            metrics (required) - metrics recording the batch sizes
+    #            workers (optional) - amount of worker threads scoring batches
+    #            batchSize (optional) - most requests scored together
+    #            waitMs (optional) - longest wait for a batch to fill up
+    #            approx (optional) - use the index of the model instead of
+    #                                scoring every item
+    def __init__(self, recommendMachine, metrics, workers=2, batchSize=64, waitMs=2.0, approx=False):
+        self.recommendMachine = recommendMachine
+        self.metrics = metrics
+        self.batchSize = batchSize
+        self.wait = waitMs / 1000.0
+        self.approx = approx
+        self.queue = Queue()
+        self.threads = []
+        for idx in range(0, workers):
+            thread = threading.Thread(target=self.work)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+
+    # Method: recommend
+    # Purpose: Queue a request and wait for its recommendations
+    # Arguments: user (required) - idx of the user
+    #            n (required) - amount of recommendations
+    # Return: tuple of the items and predicted ratings of the user
+    def recommend(self, user, n):
+        request = {"user": user, "n": n, "done": threading.Event(), "result": None, "error": None}
+        self.queue.put(request)
+        request["done"].wait()
+        if request["error"] is not None:
+            raise request["error"]
+        return request["result"]
+
+
+    # Method: work
+    # Purpose: Loop of a worker thread, scoring a batch of requests at a time
+    # Arguments: None
+    # Return: None
+    def work(self):
+        while True:
+            batch = [self.queue.get()]
+
+            # Wait a little for more requests to fill up the batch
+            deadline = time.time() + self.wait
+            while len(batch) < self.batchSize:
+                remaining = deadline - time.time()
+                try:
+                    if remaining > 0:
+                        batch.append(self.queue.get(timeout=remaining))
+                    else:
+                        batch.append(self.queue.get_nowait())
+                except Empty:
+                    break
+
+            self.score(batch)
+
+
+    # Method: score
+    # Purpose: Score a batch of requests with one call, for the largest n asked
+    #          for, then hand every request its own rows
+    # Arguments: batch (required) - list of the requests
+    # Return: None
+    def score(self, batch):
+        try:
+            users = np.array([request["user"] for request in batch], dtype=np.int64)
+            n = max(request["n"] for request in batch)
+            if self.approx:
+                items, predictions = self.recommendMachine.recommendApprox(users, n=n)
+            else:
+                items, predictions = self.recommendMachine.recommend(users, n=n)
+            self.metrics.recordBatch(len(batch))
+            for row, request in enumerate(batch):
+                request["result"] = (items[row, :request["n"]].copy(), predictions[row, :request["n"]].copy())
+        except Exception as e:
+            for request in batch:
+                request["error"] = e
+        finally:
+            for request in batch:
+                request["done"].set()
+
+
+# Class: RecommendHandler
+# Purporse: Handles one HTTP request, the endpoints are
+#           /recommend?user={idx or name}&n={amount}
+#           /similar?beer={idx or name}&n={amount}
+#           /metrics
+#           /reload
+class RecommendHandler(BaseHTTPRequestHandler):
+
+
+    # Method: do_GET
+    # Purpose: Answer a GET request with json
+    # Arguments: None
+    # Return: None
+    def do_GET(self):
+        start = time.time()
+        url = urlparse(self.path)
+        params = dict((key, values[0]) for key, values in parse_qs(url.query).items())
+        server = self.server.recommendServer
+
+        try:
+            if url.path == "/recommend":
+                status, body = 200, server.recommend(params)
+            elif url.path == "/similar":
+                status, body = 200, server.similar(params)
+            elif url.path == "/metrics":
+                status, body = 200, server.report()
+            elif url.path == "/reload":
+                status, body = 200, server.reload()
+            else:
+                status, body = 404, {"error": "Unknown path " + url.path}
+        except (KeyError, ValueError, IndexError) as e:
+            status, body = 400, {"error": str(e.args[0]) if e.args else "Invalid request"}
+
+        # Anything else is a fault of the server, still answer and record it
+        except Exception as e:
+            print("Error answering " + self.path + ": " + repr(e))
+            status, body = 500, {"error": "Internal error, " + type(e).__name__}
+
+        data = json.dumps(body)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+        if status == 500 or (url.path != "/metrics" and url.path != "/reload"):
+            server.metrics.record(url.path, time.time() - start, error=(status != 200))
+
+
+    # Method: log_message
+    # Purpose: Keep every request from being printed
+    # Arguments: format (required) - format of the message
+    #            args (required) - values of the message
+    # Return: None
+    def log_message(self, format, *args):
+        pass
+
+
+# Class: ThreadingHTTPServer
+# Purporse: HTTP server answering every connection on its own thread
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+# Class: RecommendServer
+# Purporse: Loads a model saved by -savemodel once and serves recommendations
+#           and similar beers from it over HTTP
+class RecommendServer:
+
+    PORT = 8080
+    MAX_RECOMMENDATIONS = 1000
+
+
+    # Method: Constructor
+    # Purpose: Creates the server from the command line arguments
+    # Arguments: args (required) - command line arguments of the python program
+    def __init__(self, args):
+        self.args = args
+
+
+    # Method: run
+    # Purpose: Loads the model and serves requests until interrupted
+    #          Options:
+    #            -model {directory}  model saved by -savemodel
+    #            -port {port}        port to listen on, localhost only
+    #            -w {workers}        threads scoring batches
+    #            -batch {size}       most requests scored together
+    #            -wait {ms}          longest wait for a batch to fill up
+    #            -approx             use the index saved with the model
+    #            -cache {entries}    most recommendations cached, 0 turns it off
+    #            -cachemb {mb}       most megabytes of recommendations cached
+    #            -reload {seconds}   check for a newly saved model this often
+    # Arguments: None
+    # Return: None
+    def run(self):
+        self.modelDirectory = Recommender.DIRECTORY_MODEL
+        port = self.PORT
+        workers = 2
+        batchSize = 64
+        waitMs = 2.0
+        cacheEntries = 10000
+        cacheMb = 64.0
+        reloadSeconds = None
+
+        try:
+            if ("-model" in self.args):
+                self.modelDirectory = self.args[self.args.index("-model") + 1]
+            if ("-port" in self.args):
+                port = int(self.args[self.args.index("-port") + 1])
+            if ("-w" in self.args):
+                workers = int(self.args[self.args.index("-w") + 1])
+            if ("-batch" in self.args):
+                batchSize = int(self.args[self.args.index("-batch") + 1])
+            if ("-wait" in self.args):
+                waitMs = float(self.args[self.args.index("-wait") + 1])
+            if ("-cache" in self.args):
+                cacheEntries = int(self.args[self.args.index("-cache") + 1])
+            if ("-cachemb" in self.args):
+                cacheMb = float(self.args[self.args.index("-cachemb") + 1])
+            if ("-reload" in self.args):
+                reloadSeconds = float(self.args[self.args.index("-reload") + 1])
+        except (ValueError, IndexError) as e:
+            print "Invalid Usage of arguments in server"
+            return
+
+        self.approx = ("-approx" in self.args)
+        self.cache = RecommendationCache(maxEntries=cacheEntries, maxBytes=int(cacheMb * 1024 * 1024))
+        self.reloadLock = threading.Lock()
+        self.batcher = None
+        self.load()
+
+        self.metrics = LatencyMetrics()
+        self.batcher = RecommendBatcher(self.recommendMachine, self.metrics, workers=workers,
+                                        batchSize=batchSize, waitMs=waitMs, approx=self.approx)
+
+        # Watch for a new model saved by -savemodel or -update
+        if reloadSeconds != None:
+            watcher = threading.Thread(target=self.watch, args=(reloadSeconds,))
+            watcher.daemon = True
+            watcher.start()
+
+        httpServer = ThreadingHTTPServer(("127.0.0.1", port), RecommendHandler)
+        httpServer.recommendServer = self
+        print("Serving " + self.recommendMachine.model + " on http://127.0.0.1:" + str(port))
+        try:
+            httpServer.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            httpServer.server_close()
+
+
+    # Method: load
+    # Purpose: Load the model and the lookups of users by name, then swap them
+    #          in for the requests and drop the cached recommendations
+    # Arguments: None
+    # Return: None
+    def load(self):
+        print("Loading Model from " + self.modelDirectory)
+        recommendMachine = Recommender(empty=True)
+        recommendMachine.loadModel(self.modelDirectory)
+        userIdxs = dict((name, idx) for idx, name in recommendMachine.mappings.get("users", {}).items())
+
+        # Build the index up front if it was not saved with the model
+        if self.approx and recommendMachine.itemIndex == None:
+            print "Building Index"
+            recommendMachine.buildIndex()
+
+        self.userIdxs = userIdxs
+        self.recommendMachine = recommendMachine
+        if self.batcher is not None:
+            self.batcher.recommendMachine = recommendMachine
+        self.cache.clear()
+
+
+    # Method: savedVersion
+    # Purpose: Read the version of the model saved in the model directory
+    # Arguments: None
+    # Return: the version or None if there is no model saved
+    def savedVersion(self):
+        metaFile = os.path.join(self.modelDirectory, ModelStore.FILE_META)
+        try:
+            with open(metaFile) as fp:
+                meta = json.load(fp)
+        except (IOError, ValueError) as e:
+            return None
+        return meta.get("modelVersion", meta.get("created"))
+
+
+    # Method: reload
+    # Purpose: Answer /reload, loading the model again if a new one was saved
+    # Arguments: None
+    # Return: dict of the version and whether it changed
+    def reload(self):
+        with self.reloadLock:
+            version = self.savedVersion()
+            reloaded = version != None and version != self.recommendMachine.modelVersion
+            if reloaded:
+                self.load()
+            return {"modelVersion": self.recommendMachine.modelVersion, "reloaded": reloaded}
+
+
+    # Method: watch
+    # Purpose: Loop of the thread checking for a new model
+    # Arguments: seconds (required) - how often to check
+    # Return: None
+    def watch(self, seconds):
+        while True:
+            time.sleep(seconds)
+            try:
+                self.reload()
+            except (IOError, ValueError, KeyError) as e:
+                print("Could not reload the model: " + str(e))
+
+
+    # Method: report
+    # Purpose: Answer /metrics with the latencies and the counters of the cache
+    # Arguments: None
+    # Return: dict of the metrics
+    def report(self):
+        report = self.metrics.report()
+        report["cache"] = self.cache.stats()
+        report["modelVersion"] = self.recommendMachine.modelVersion
+        return report
+
+
+    # Method: recommend
+    # Purpose: Answer /recommend, the user is either an idx or a profile name
+    # Arguments: params (required) - parameters of the request
+    # Return: dict of the recommendations
+    def recommend(self, params):
+        if "user" not in params:
+            raise KeyError("Missing the user parameter")
+        user = params["user"]
+        if not user.isdigit() and user not in self.userIdxs:
+            raise KeyError("No user named " + user)
+        user = int(user) if user.isdigit() else self.userIdxs[user]
+        if user < 0 or user >= self.recommendMachine.trainingMatrix.shape[0]:
+            raise IndexError("No user " + str(user))
+        n = self.amount(params)
+
+        # Check the cache of the current model first
+        key = self.cache.key(self.recommendMachine.modelVersion, user, n, filters=(self.approx,))
+        results = self.cache.get(key)
+        if results == None:
+            results = self.batcher.recommend(user, n)
+            self.cache.put(key, results)
+        items, predictions = results
+        return {"user": user, "recommendations": self.describeItems(items, predictions, "rating")}
+
+
+    # Method: similar
+    # Purpose: Answer /similar, the beer is either an idx or a name
+    # Arguments: params (required) - parameters of the request
+    # Return: dict of the similar beers
+    def similar(self, params):
+        if "beer" not in params:
+            raise KeyError("Missing the beer parameter")
+        beer = params["beer"]
+        beer = int(beer) if beer.isdigit() else self.recommendMachine.findBeer(beer)
+        if beer < 0 or beer >= self.recommendMachine.trainingMatrix.shape[1]:
+            raise IndexError("No beer " + str(beer))
+        n = self.amount(params)
+
+        exact = self.recommendMachine.similarIndex is None
+        items, similarities = self.recommendMachine.similarBeers(beer, n=n, exact=exact)
+        return {"beer": beer, "similar": self.describeItems(items[0], similarities[0], "similarity")}
+
+
+    # Method: amount
+    # Purpose: Get the amount of beers asked for by the n parameter
+    # Arguments: params (required) - parameters of the request
+    # Return: the amount, raises ValueError unless it is an integer from 1 to
+    #         MAX_RECOMMENDATIONS
+    def amount(self, params):
+        n = params.get("n", str(Recommender.TOP_RECOMMENDATIONS))
+        if not n.isdigit() or int(n) < 1 or int(n) > self.MAX_RECOMMENDATIONS:
+            raise ValueError("The n parameter needs to be an integer from 1 to " + str(self.MAX_RECOMMENDATIONS))
+        return int(n)
+
+
+    # Method: describeItems
+    # Purpose: Describe items by idx and name with their scores for json
+    # Arguments: items (required) - idxs of the items, -1 is skipped
+    #            scores (required) - score of every item
+    #            scoreName (required) - key of the score
+    # Return: list of the described items
+    def describeItems(self, items, scores, scoreName):
+        names = self.recommendMachine.mappingIdxToBeer or {}
+        described = []
+        for idx, score in zip(items, scores):
+            if idx >= 0:
+                described.append({"beerIdx": int(idx),
+                                  "beer": names.get(idx, "").strip(),
+                                  scoreName: float(score)})
+        return described
+
+
+# Run the server with the command line arguments
+if __name__ == "__main__":
+    server = RecommendServer(sys.argv)
+    server.run()
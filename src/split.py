@@ -0,0 +1,145 @@
+# Title: Split File
+# Author: Kenan Mesic
+# Date: 10/18/26
+# Purpose: All classes and methods involved with splitting the ratings into
+#          training and testing data
+
+import numpy as np
+
+
+# Class: RatingsSplitter
+# Purporse: Splits the (users, items, ratings, times, aspects) columns of the ratings
+#           into training and testing data. Every split reorders the columns
+#           once into shared arrays, then the training and testing columns are
+#           views of slices of them, so no split copies the ratings again. The
+#           folds of k-fold cross validation share one shuffle and gather the
+#           columns of a fold only when it is taken, so the folds never hold
+#           more than one copy of the ratings at a time unless they are kept
+class RatingsSplitter:
+
+    RANDOM = "random"
+    TEMPORAL = "temporal"
+    LAST = "last"
+    METHODS = [RANDOM, TEMPORAL, LAST]
+
+
+    # Method: Constructor
+    # Purpose: Create the splitter of the ratings
+    # Arguments: columns (required) - (users, items, ratings, times, aspects) columns
+    def __init__(self, columns):
+        self.columns = tuple(np.asarray(column) for column in columns)
+        self.totalRatings = len(self.columns[0])
+
+
+    # Method: split
+    # Purpose: Split with one of the methods by name
+    # Arguments: method (required) - random, temporal or last
+    #            percent (optional) - percent of the ratings in training, not
+    #                                 used when leaving the last ratings out
+    #            seed (optional) - seed of the random split
+    # Return: tuple of the training and testing columns
+    def split(self, method, percent=100, seed=None):
+        if method == self.RANDOM:
+            return self.randomSplit(percent, seed)
+        elif method == self.TEMPORAL:
+            return self.temporalSplit(percent)
+        elif method == self.LAST:
+            return self.leaveLastOut()
+        raise ValueError("Unknown split " + str(method) + ", use one of " + ",".join(self.METHODS))
+
+
+    # Method: randomSplit
+    # Purpose: Shuffle the ratings and put the first percent into training
+    # Arguments: percent (optional) - percent of the ratings in training
+    #            seed (optional) - seed of the shuffle, random when not given
+    # Return: tuple of the training and testing columns
+    def randomSplit(self, percent=100, seed=None):
+        order = np.random.RandomState(seed).permutation(self.totalRatings)
+        return self.splitAt(self.arrange(order), self.splitPoint(percent))
+
+
+    # Method: temporalSplit
+    # Purpose: Put the oldest percent of the ratings into training and the
+    #          newest into testing, by review/time
+    # Arguments: percent (optional) - percent of the ratings in training
+    # Return: tuple of the training and testing columns
+    def temporalSplit(self, percent=100):
+        order = np.argsort(self.columns[3], kind="mergesort")
+        return self.splitAt(self.arrange(order), self.splitPoint(percent))
+
+
+    # Method: leaveLastOut
+    # Purpose: Put the newest ratings of every user into testing and the rest
+    #          into training, users without more ratings than that keep all of
+    #          them in training
+    # Arguments: count (optional) - ratings left out of every user
+    # Return: tuple of the training and testing columns
+    def leaveLastOut(self, count=1):
+        users = self.columns[0]
+
+        # Sort by user then time, so the ratings of every user end with its newest
+        order = np.lexsort((self.columns[3], users))
+        starts = np.unique(users[order], return_index=True)[1]
+        sizes = np.diff(np.append(starts, self.totalRatings))
+
+        # Rank of every rating from the newest of its user
+        fromEnd = np.repeat(starts + sizes, sizes) - np.arange(self.totalRatings) - 1
+        leftOut = (fromEnd < count) & (np.repeat(sizes, sizes) > count)
+
+        trainOrder = order[~leftOut]
+        return self.splitAt(self.arrange(np.concatenate([trainOrder, order[leftOut]])), len(trainOrder))
+
+
+    # Method: kFold
+    # Purpose: Split the shuffled ratings into folds, each fold is the testing
+    #          data once with every other fold as its training data. The
+    #          columns of a fold are only gathered when the fold is taken
+    # Arguments: folds (optional) - amount of folds
+    #            seed (optional) - seed of the shuffle, random when not given
+    # Return: generator of the training and testing columns of every fold
+    def kFold(self, folds=5, seed=None):
+        return ((self.arrange(trainOrder), self.arrange(testOrder))
+                for trainOrder, testOrder in self.foldIndices(folds, seed))
+
+
+    # Method: foldIndices
+    # Purpose: Idxs of the ratings in every fold of k-fold cross validation,
+    #          the shuffle is done once and the training idxs of a fold are
+    #          the other folds joined only when the fold is taken
+    # Arguments: folds (optional) - amount of folds
+    #            seed (optional) - seed of the shuffle, random when not given
+    # Return: generator of the training and testing idxs of every fold
+    def foldIndices(self, folds=5, seed=None):
+        if folds < 2 or folds > self.totalRatings:
+            raise ValueError("Folds must be between 2 and the amount of ratings, got " + str(folds))
+
+        order = np.random.RandomState(seed).permutation(self.totalRatings)
+        bounds = np.linspace(0, self.totalRatings, folds + 1).round().astype(np.int64)
+        return ((np.concatenate([order[end:], order[:start]]), order[start:end])
+                for start, end in zip(bounds[:-1], bounds[1:]))
+
+
+    # Method: splitPoint
+    # Purpose: Amount of ratings in training for a percent
+    # Arguments: percent (required) - percent of the ratings in training
+    # Return: the amount of ratings
+    def splitPoint(self, percent):
+        return int(round(self.totalRatings * (float(percent) / 100)))
+
+
+    # Method: arrange
+    # Purpose: Reorder every column into new shared arrays
+    # Arguments: order (required) - idx of the rating at every position
+    # Return: tuple of the reordered columns
+    def arrange(self, order):
+        return tuple(column[order] for column in self.columns)
+
+
+    # Method: splitAt
+    # Purpose: Split reordered columns into views of the ratings before and after a position
+    # Arguments: columns (required) - the reordered columns
+    #            point (required) - amount of ratings in training
+    # Return: tuple of the training and testing columns
+    def splitAt(self, columns, point):
+        return (tuple(column[:point] for column in columns),
+                tuple(column[point:] for column in columns))
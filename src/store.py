@@ -0,0 +1,278 @@
+# Title: Ratings Store File
+# Author: Kenan Mesic
+# Date: 10/18/26
+# Purpose: All classes and methods involved with caching the processed ratings
+#          and trained models on disk in a compact binary columnar format
+
+import os
+import json
+import shutil
+import time
+import hashlib
+import numpy as np
+
+
+# Method: toBytes
+# Purpose: json loads every string as unicode, convert them back to utf-8
+#          strings like the ones parsed from the reviews
+# Arguments: value (required) - value from the json file
+# Return: the value with unicode converted to a string
+def toBytes(value):
+    if isinstance(value, unicode):
+        return value.encode("utf-8")
+    return value
+
+
+# Method: mappingsToLists
+# Purpose: Mappings use string keys in json, turn them into lists by idx instead
+# Arguments: mappings (required) - dict of the mappings, each a dict by idx
+# Return: dict of the mappings as lists, None where an idx has no value
+def mappingsToLists(mappings):
+    lists = {}
+    for name, mapping in mappings.items():
+        lists[name] = [mapping.get(idx) for idx in range(0, max(mapping.keys()) + 1)] if mapping else []
+    return lists
+
+
+# Method: listsToMappings
+# Purpose: Turn the lists saved by mappingsToLists back into dicts by idx
+# Arguments: lists (required) - dict of the mappings as lists
+# Return: dict of the mappings, each a dict by idx
+def listsToMappings(lists):
+    mappings = {}
+    for name, values in lists.items():
+        mappings[name] = dict((idx, toBytes(value)) for idx, value in enumerate(values) if value is not None)
+    return mappings
+
+
+# Method: replaceDirectory
+# Purpose: Move a fully written temporary directory over the directory it
+#          replaces, so a partial save is never loaded
+# Arguments: tempPath (required) - the written directory
+#            path (required) - the directory to replace
+# Return: None
+def replaceDirectory(tempPath, path):
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    os.rename(tempPath, path)
+
+
+# Method: emptyDirectory
+# Purpose: Create an empty directory, removing what was left there before
+# Arguments: path (required) - the directory
+# Return: None
+def emptyDirectory(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    os.makedirs(path)
+
+
+# Class: RatingsStore
+# Purporse: Saves the training and testing ratings as columns of numpy arrays,
+#           one .npy file per column plus a json file of the mappings, so they
+#           can be memory mapped back in without parsing the reviews again.
+#           Every cache lives in its own directory named by the key of the
+#           source file, amount of ratings and filters used to build it
+class RatingsStore:
+
+    VERSION = 3
+    DIRECTORY = "../data/ratings_cache"
+    COLUMNS = ["users", "items", "ratings", "times", "aspects"]
+    FILE_META = "meta.json"
+
+
+    # Method: Constructor
+    # Purpose: Create the store for the directory holding all the caches
+    # Arguments: directory (optional) - where to keep the caches
+    def __init__(self, directory=DIRECTORY):
+        self.directory = directory
+
+
+    # Method: cacheKey
+    # Purpose: Build the key of a cache from everything that changes the ratings,
+    #          the source file is identified by its path, size and modified time
+    # Arguments: source (required) - path to the reviews file
+    #            totalRatings (required) - amount of reviews processed
+    #            minBeerRatings (required) - ratings needed to keep a beer
+    #            minUserRatings (required) - ratings needed to keep a user
+    #            trainPercent (required) - percent of the ratings for training
+    #            split (optional) - how the ratings were split when not a random
+    #                               shuffle, ex. ["temporal", None]
+    # Return: the key as a hex string
+    def cacheKey(self, source, totalRatings, minBeerRatings, minUserRatings, trainPercent, split=None):
+        stat = os.stat(source)
+        description = [self.VERSION,
+                       os.path.abspath(source),
+                       stat.st_size,
+                       int(stat.st_mtime),
+                       totalRatings,
+                       minBeerRatings,
+                       minUserRatings,
+                       trainPercent]
+        if split != None:
+            description.append(split)
+        description = json.dumps(description)
+        return hashlib.sha1(description.encode("utf-8")).hexdigest()
+
+
+    # Method: path
+    # Purpose: Get the directory of a cache
+    # Arguments: key (required) - key of the cache
+    # Return: path of the directory
+    def path(self, key):
+        return os.path.join(self.directory, key)
+
+
+    # Method: save
+    # Purpose: Save the ratings, the training ratings first then the testing
+    #          ratings, into the cache of the key. The cache is written to a
+    #          temporary directory first so a partial cache is never loaded
+    # Arguments: key (required) - key of the cache
+    #            training (required) - (users, items, ratings, times, aspects) columns
+    #            testing (required) - (users, items, ratings, times, aspects) columns
+    #            totalUsers (required) - total amount of users
+    #            totalItems (required) - total amount of items
+    #            mappings (required) - dict of the mappings to save, ex. names
+    #                                  of the beers by idx of the item
+    # Return: None
+    def save(self, key, training, testing, totalUsers, totalItems, mappings):
+        path = self.path(key)
+        tempPath = path + ".tmp"
+        emptyDirectory(tempPath)
+
+        # One file per column, the training and testing ratings back to back
+        dtypes = [np.int32, np.int32, np.float32, np.int64, np.float32]
+        for column, dtype, trainColumn, testColumn in zip(self.COLUMNS, dtypes, training, testing):
+            values = np.concatenate([np.asarray(trainColumn, dtype=dtype),
+                                     np.asarray(testColumn, dtype=dtype)])
+            np.save(os.path.join(tempPath, column + ".npy"), values)
+
+        meta = {"version": self.VERSION,
+                "totalUsers": totalUsers,
+                "totalItems": totalItems,
+                "totalTraining": len(training[0]),
+                "mappings": mappingsToLists(mappings)}
+        with open(os.path.join(tempPath, self.FILE_META), 'w') as fp:
+            json.dump(meta, fp)
+        replaceDirectory(tempPath, path)
+
+
+    # Method: load
+    # Purpose: Memory map the ratings of the cache of the key
+    # Arguments: key (required) - key of the cache
+    # Return: None if there is no cache, otherwise a dict with the training and
+    #         testing columns as read only views of the mapped files, all the
+    #         columns together, the total users and items, and the mappings as
+    #         dicts by idx
+    def load(self, key):
+        path = self.path(key)
+        metaFile = os.path.join(path, self.FILE_META)
+        if not os.path.isfile(metaFile):
+            return None
+
+        with open(metaFile) as fp:
+            meta = json.load(fp)
+        if meta["version"] != self.VERSION:
+            return None
+
+        # Split each mapped column into training and testing without copying
+        split = meta["totalTraining"]
+        columns = [np.load(os.path.join(path, column + ".npy"), mmap_mode='r') for column in self.COLUMNS]
+        mappings = listsToMappings(meta["mappings"])
+
+        return {"training": tuple(column[:split] for column in columns),
+                "testing": tuple(column[split:] for column in columns),
+                "columns": tuple(columns),
+                "totalUsers": meta["totalUsers"],
+                "totalItems": meta["totalItems"],
+                "mappings": mappings}
+
+
+    # Method: append
+    # Purpose: Append a batch of new ratings to the training ratings of the cache
+    #          of the key, the testing ratings are left as they are
+    # Arguments: key (required) - key of the cache
+    #            ratings (required) - (users, items, ratings, times, aspects) columns
+    #            totalUsers (required) - total amount of users with the new ones
+    #            totalItems (required) - total amount of items with the new ones
+    #            mappings (required) - dict of the mappings with the new users
+    #                                  and items
+    # Return: False if there is no cache for the key, otherwise True
+    def append(self, key, ratings, totalUsers, totalItems, mappings):
+        cached = self.load(key)
+        if cached == None:
+            return False
+
+        training = tuple(np.concatenate([old, np.asarray(new, dtype=old.dtype)])
+                         for old, new in zip(cached["training"], ratings))
+        self.save(key, training, cached["testing"], totalUsers, totalItems, mappings)
+        return True
+
+
+# Class: ModelStore
+# Purporse: Saves the arrays of a trained model, one .npy file per array plus a
+#           json file of the metadata and mappings, in a versioned format. The
+#           arrays are memory mapped when loaded so startup is fast and several
+#           processes loading the same model share its pages
+class ModelStore:
+
+    VERSION = 1
+    DIRECTORY = "../data/model"
+    FILE_META = "meta.json"
+
+
+    # Method: Constructor
+    # Purpose: Create the store for the directory of one model
+    # Arguments: directory (optional) - where to keep the model
+    def __init__(self, directory=DIRECTORY):
+        self.directory = directory
+
+
+    # Method: save
+    # Purpose: Save the arrays and metadata of a model, written to a temporary
+    #          directory first so a partial model is never loaded
+    # Arguments: arrays (required) - dict of the arrays by name, None is skipped
+    #            meta (required) - dict of anything json can hold
+    #            mappings (required) - dict of the mappings to save by idx
+    # Return: None
+    def save(self, arrays, meta, mappings):
+        tempPath = self.directory + ".tmp"
+        emptyDirectory(tempPath)
+
+        names = []
+        for name, values in arrays.items():
+            if values is None:
+                continue
+            np.save(os.path.join(tempPath, name + ".npy"), np.asarray(values))
+            names.append(name)
+
+        meta = dict(meta)
+        meta["version"] = self.VERSION
+        meta["arrays"] = sorted(names)
+        meta["created"] = time.strftime("%Y-%m-%d %H:%M:%S")
+        meta["mappings"] = mappingsToLists(mappings)
+        with open(os.path.join(tempPath, self.FILE_META), 'w') as fp:
+            json.dump(meta, fp)
+        replaceDirectory(tempPath, self.directory)
+
+
+    # Method: load
+    # Purpose: Load the arrays and metadata of the model
+    # Arguments: mmap (optional) - memory map the arrays read only instead of
+    #                              reading them into memory, default to True
+    # Return: tuple of the dict of arrays by name, the metadata and the mappings
+    def load(self, mmap=True):
+        metaFile = os.path.join(self.directory, self.FILE_META)
+        if not os.path.isfile(metaFile):
+            raise IOError("No model saved in " + self.directory)
+
+        with open(metaFile) as fp:
+            meta = json.load(fp)
+        if meta["version"] != self.VERSION:
+            raise ValueError("Model in " + self.directory + " has version " + str(meta["version"]) +
+                             ", only version " + str(self.VERSION) + " is supported")
+
+        arrays = {}
+        for name in meta["arrays"]:
+            arrays[name] = np.load(os.path.join(self.directory, name + ".npy"), mmap_mode='r' if mmap else None)
+        return arrays, meta, listsToMappings(meta.pop("mappings"))
@@ -0,0 +1,357 @@
+# Title: Sweep File
+# Author: Kenan Mesic
+# Date: 10/18/26
+# Purpose: All classes and methods involved with searching the hyperparameters
+#          of the recommender over a pool of processes
+
+import sys
+import os
+import json
+import time
+import itertools
+from multiprocessing import Pool, Array, Lock, cpu_count
+from process import DataProcesser
+from recommender import Recommender
+from store import RatingsStore
+from split import RatingsSplitter
+
+
+# Shared by the worker processes of a sweep, set by initSweepWorker
+sweepState = {}
+
+
+# Method: initSweepWorker
+# Purpose: Load the saved ratings into a worker once, memory mapped so every
+#          worker shares the same pages, and keep the shared best scores. With
+#          folds every configuration is trained on each fold of the ratings,
+#          the folds are saved by the parent and memory mapped the same way.
+#          What the workers print goes to the log file of the sweep
+# Arguments: storeDirectory (required) - directory of the saved ratings
+#            keys (required) - keys of the saved ratings, one per fold
+#            best (required) - shared array of the best RMSE of every
+#                              algorithm at every checkpoint
+#            lock (required) - lock of the shared array
+#            normalizeDataBefore (required) - whether to subtract the mean of
+#                                             the users before training
+#            logFile (required) - file the output of the worker is appended to
+# Return: None
+def initSweepWorker(storeDirectory, keys, best, lock, normalizeDataBefore, logFile):
+    sys.stdout = open(logFile, 'a', 1)
+    store = RatingsStore(storeDirectory)
+    recommenders = []
+    for key in keys:
+        cached = store.load(key)
+        recommenders.append(Recommender(cached["training"],
+                                        cached["testing"],
+                                        cached["totalUsers"],
+                                        cached["totalItems"],
+                                        normalizeDataBefore=normalizeDataBefore,
+                                        readFromFiles=False))
+
+    sweepState["recommenders"] = recommenders
+    sweepState["best"] = best
+    sweepState["lock"] = lock
+
+
+# Method: trainSweepConfig
+# Purpose: Train a recommender with one configuration for some iterations. A
+#          warm start of sgd carries on with the shuffles and learning rate of
+#          the epochs already trained, so stopping at a checkpoint gives the
+#          first epochs of the full run
+# Arguments: recommendMachine (required) - the recommender to train
+#            config (required) - dict of the configuration
+#            steps (required) - iterations to train
+#            warmStart (required) - whether to continue from the current factors
+# Return: None
+def trainSweepConfig(recommendMachine, config, steps, warmStart):
+    algorithm = config["algorithm"]
+    if algorithm == "svd":
+        recommendMachine.matrix_factorization_svd(k=config["k"])
+    elif algorithm == "sgd":
+        recommendMachine.stochastic_gradient_descent(k=config["k"], learning_rate=config["learningRate"],
+                                                     regularization=config["regularization"],
+                                                     iterations=steps, biases=True, seed=0,
+                                                     warmStart=warmStart)
+    elif algorithm == "als":
+        recommendMachine.alternating_least_squares(k=config["k"], regularization=config["regularization"],
+                                                   iterations=steps, warmStart=warmStart)
+    else:
+        recommendMachine.weighted_alternating_least_squares(k=config["k"], regularization=config["regularization"],
+                                                            iterations=steps, workers=1, seed=0,
+                                                            warmStart=warmStart)
+
+
+# Method: runSweepConfig
+# Purpose: Train one configuration in the worker, checking its RMSE at every
+#          checkpoint of iterations and stopping early if it falls behind. With
+#          folds the RMSE is the average over the folds
+# Arguments: config (required) - dict of the configuration
+# Return: dict of the configuration with its RMSE, seconds and history
+def runSweepConfig(config):
+    recommenders = sweepState["recommenders"]
+    best = sweepState["best"]
+    algorithm = config["algorithm"]
+    iterations = config["iterations"]
+    checkpoints = [count for count in Sweep.CHECKPOINTS if count < iterations] + [iterations]
+    if algorithm == "svd":
+        checkpoints = [iterations]
+
+    start = time.time()
+    history = []
+    done = 0
+    stopped = False
+    for count in checkpoints:
+        # Keep training the same factors up to the next checkpoint
+        rmses = []
+        for recommendMachine in recommenders:
+            trainSweepConfig(recommendMachine, config, count - done, done > 0)
+            rmses.append(recommendMachine.evaluateAll(workers=1)["rmse"])
+        done = count
+        rmse = sum(rmses) / len(rmses)
+        history.append({"iterations": count, "rmse": rmse, "seconds": time.time() - start})
+
+        # Compare against the best of the same algorithm at the same checkpoint
+        if count in Sweep.CHECKPOINTS and count != checkpoints[-1]:
+            slot = Sweep.ALGORITHMS.index(algorithm) * len(Sweep.CHECKPOINTS) + Sweep.CHECKPOINTS.index(count)
+            with sweepState["lock"]:
+                if rmse < best[slot]:
+                    best[slot] = rmse
+                behind = rmse > best[slot] * (1 + config["tolerance"])
+            if behind:
+                stopped = True
+                break
+
+    result = dict(config)
+    result.update({"rmse": history[-1]["rmse"],
+                   "trainedIterations": done,
+                   "seconds": time.time() - start,
+                   "stopped": stopped,
+                   "history": history})
+    return result
+
+
+# Class: Sweep
+# Purporse: Trains every combination of algorithm, k, learning rate,
+#           regularization and iterations on the same ratings, fanned out over a
+#           pool of processes. The ratings are processed once and saved to the
+#           ratings store, then every worker memory maps them. A configuration
+#           is stopped at a checkpoint once its RMSE is clearly behind the best
+#           of its algorithm at that checkpoint
+class Sweep:
+
+    ALGORITHMS = ["svd", "sgd", "als", "wals"]
+    CHECKPOINTS = [1, 2, 5, 10, 25, 50, 100, 200]
+    FILE_REVIEWS = '../data/Beeradvocate.txt.gz'
+    MIN_BEER_RATINGS = 20
+    MIN_USER_RATINGS = 10
+    TRAIN_PERCENT = 75
+    DIRECTORY = "../data/sweep"
+    FILE_RESULTS = "../data/sweep/results.json"
+    FILE_TABLE = "../data/sweep/results.txt"
+    FILE_LOG = "../data/sweep/workers.log"
+    TOLERANCE = 0.05
+
+
+    # Method: Constructor
+    # Purpose: Creates the sweep from the command line arguments
+    # Arguments: args (required) - command line arguments of the python program
+    def __init__(self, args):
+        self.args = args
+
+
+    # Method: run
+    # Purpose: Runs the sweep and saves the results table
+    #          Options:
+    #            -tr {totalRatings}   amount of ratings to use
+    #            -algs {sgd,wals}     algorithms to sweep
+    #            -k {5,10,20}         numbers of latent factors
+    #            -lr {0.001,0.01}     learning rates of sgd
+    #            -reg {0.02,0.1}      regularizations
+    #            -iters {10,25}       iterations of sgd, als and wals
+    #            -w {workers}         processes, defaults to all cores
+    #            -tol {tolerance}     stop configurations this much worse than the best
+    #            -ndb                 normalize the data before, mostly used for svd and als
+    #            -folds {folds}       average the RMSE over folds of cross validation
+    # Arguments: None
+    # Return: list of the results, best first
+    def run(self):
+        totalRatings = 100000
+        algorithms = ["sgd", "wals"]
+        kValues = [5, 10, 20]
+        learningRates = [0.001, 0.005]
+        regularizations = [0.02, 0.1]
+        iterationCounts = [10]
+        workers = cpu_count()
+        tolerance = self.TOLERANCE
+        normalizeDataBefore = "-ndb" in self.args
+        folds = 1
+
+        try:
+            if ("-tr" in self.args):
+                totalRatings = int(self.args[self.args.index("-tr") + 1])
+            if ("-algs" in self.args):
+                algorithms = self.args[self.args.index("-algs") + 1].split(",")
+            if ("-k" in self.args):
+                kValues = [int(k) for k in self.args[self.args.index("-k") + 1].split(",")]
+            if ("-lr" in self.args):
+                learningRates = [float(lr) for lr in self.args[self.args.index("-lr") + 1].split(",")]
+            if ("-reg" in self.args):
+                regularizations = [float(reg) for reg in self.args[self.args.index("-reg") + 1].split(",")]
+            if ("-iters" in self.args):
+                iterationCounts = [int(count) for count in self.args[self.args.index("-iters") + 1].split(",")]
+            if ("-w" in self.args):
+                workers = int(self.args[self.args.index("-w") + 1])
+            if ("-tol" in self.args):
+                tolerance = float(self.args[self.args.index("-tol") + 1])
+            if ("-folds" in self.args):
+                folds = int(self.args[self.args.index("-folds") + 1])
+        except (ValueError, IndexError) as e:
+            print "Invalid Usage of arguments in sweep"
+            return
+        if any(algorithm not in self.ALGORITHMS for algorithm in algorithms):
+            print("Algorithms to sweep are " + ",".join(self.ALGORITHMS))
+            return
+
+        store = RatingsStore()
+        key = self.prepareRatings(store, totalRatings)
+        keys = [key] if folds == 1 else self.prepareFolds(store, key, folds)
+        configs = self.configurations(algorithms, kValues, learningRates, regularizations, iterationCounts, tolerance)
+        print("Sweeping %d configurations over %d processes" % (len(configs), workers))
+
+        # Best RMSE of every algorithm at every checkpoint, shared by the workers
+        best = Array('d', [float("inf")] * (len(self.ALGORITHMS) * len(self.CHECKPOINTS)), lock=False)
+        # Start an empty log of the output of the workers
+        if not os.path.isdir(self.DIRECTORY):
+            os.makedirs(self.DIRECTORY)
+        open(self.FILE_LOG, 'w').close()
+        print("Output of the workers goes to " + self.FILE_LOG)
+
+        pool = Pool(workers, initializer=initSweepWorker, initargs=(store.directory, keys, best, Lock(), normalizeDataBefore, self.FILE_LOG))
+        results = []
+        try:
+            for result in pool.imap_unordered(runSweepConfig, configs):
+                results.append(result)
+                print("  " + self.formatResult(result))
+        finally:
+            pool.close()
+            pool.join()
+
+        results.sort(key=lambda result: result["rmse"])
+        self.save(results)
+        return results
+
+
+    # Method: prepareRatings
+    # Purpose: Make sure the ratings are in the ratings store, processing the
+    #          reviews only if they are not saved yet
+    # Arguments: store (required) - the ratings store
+    #            totalRatings (required) - amount of ratings to use
+    # Return: key of the saved ratings
+    def prepareRatings(self, store, totalRatings):
+        key = store.cacheKey(self.FILE_REVIEWS, totalRatings, self.MIN_BEER_RATINGS,
+                             self.MIN_USER_RATINGS, self.TRAIN_PERCENT)
+        if store.load(key) != None:
+            print("Using saved ratings from " + store.path(key))
+            return key
+
+        print("Processing " + str(totalRatings) + " ratings")
+        dataProcessor = DataProcesser()
+        dataProcessor.processReviews(self.FILE_REVIEWS, totalRatings,
+                                     minBeerRatings=self.MIN_BEER_RATINGS,
+                                     minUserRatings=self.MIN_USER_RATINGS)
+        dataProcessor.createTrainingTestingData(self.TRAIN_PERCENT)
+        store.save(key,
+                   dataProcessor.training,
+                   dataProcessor.testing,
+                   dataProcessor.totalUsersReviewed,
+                   dataProcessor.totalBeersReviewed,
+                   {"beers": dataProcessor.mappingIdxToBeer,
+                    "beerIds": dataProcessor.mappingIdxToBeerId,
+                    "users": dataProcessor.mappingIdxToUser})
+        return key
+
+
+    # Method: prepareFolds
+    # Purpose: Make sure every fold of the saved ratings is in the ratings
+    #          store, so the folds are built once here instead of in every
+    #          worker and the workers memory map them like the saved split
+    # Arguments: store (required) - the ratings store
+    #            key (required) - key of the saved ratings
+    #            folds (required) - amount of folds
+    # Return: keys of the saved folds
+    def prepareFolds(self, store, key, folds):
+        keys = [key + "-fold%d-of-%d" % (fold + 1, folds) for fold in range(0, folds)]
+        if all(store.load(foldKey) != None for foldKey in keys):
+            print("Using saved folds from " + store.path(keys[0]))
+            return keys
+
+        # Only one fold is held in memory at a time while saving them
+        cached = store.load(key)
+        splits = RatingsSplitter(cached["columns"]).kFold(folds, seed=0)
+        for foldKey, (training, testing) in zip(keys, splits):
+            store.save(foldKey, training, testing, cached["totalUsers"], cached["totalItems"], {})
+        print("Saved %d folds to %s" % (folds, store.directory))
+        return keys
+
+
+    # Method: configurations
+    # Purpose: Build every combination to train, the learning rate only
+    #          applies to sgd and the iterations do not apply to svd
+    # Arguments: algorithms (required) - algorithms to sweep
+    #            kValues (required) - numbers of latent factors
+    #            learningRates (required) - learning rates of sgd
+    #            regularizations (required) - regularizations
+    #            iterationCounts (required) - iterations of the iterative algorithms
+    #            tolerance (required) - how far behind the best a configuration stops
+    # Return: list of the configurations
+    def configurations(self, algorithms, kValues, learningRates, regularizations, iterationCounts, tolerance):
+        configs = []
+        for algorithm, k in itertools.product(algorithms, kValues):
+            rates = learningRates if algorithm == "sgd" else [None]
+            regs = regularizations if algorithm != "svd" else [None]
+            counts = iterationCounts if algorithm != "svd" else [1]
+            for learningRate, regularization, iterations in itertools.product(rates, regs, counts):
+                configs.append({"algorithm": algorithm,
+                                "k": k,
+                                "learningRate": learningRate,
+                                "regularization": regularization,
+                                "iterations": iterations,
+                                "tolerance": tolerance})
+        return configs
+
+
+    # Method: formatResult
+    # Purpose: Format one result as a row of the results table
+    # Arguments: result (required) - the result of a configuration
+    # Return: the row
+    def formatResult(self, result):
+        return "%-5s %4d %9s %9s %5d/%-5d %8.4f %9.3fs %s" % (
+            result["algorithm"], result["k"],
+            "-" if result["learningRate"] == None else "%g" % result["learningRate"],
+            "-" if result["regularization"] == None else "%g" % result["regularization"],
+            result["trainedIterations"], result["iterations"], result["rmse"], result["seconds"],
+            "stopped" if result["stopped"] else "")
+
+
+    # Method: save
+    # Purpose: Save the results as json and as a table sorted by RMSE
+    # Arguments: results (required) - the results, best first
+    # Return: None
+    def save(self, results):
+        if not os.path.isdir(self.DIRECTORY):
+            os.makedirs(self.DIRECTORY)
+        with open(self.FILE_RESULTS, 'w') as fp:
+            json.dump(results, fp, sort_keys=True, indent=4)
+
+        lines = ["%-5s %4s %9s %9s %11s %8s %10s %s" % ("alg", "k", "lr", "reg", "iterations", "rmse", "seconds", "")]
+        lines.extend(self.formatResult(result) for result in results)
+        with open(self.FILE_TABLE, 'w') as fp:
+            fp.write("\n".join(lines) + "\n")
+        print("\n" + "\n".join(lines))
+        print("Saved results to " + self.FILE_TABLE)
+
+
+# Run the sweep with the command line arguments
+if __name__ == "__main__":
+    sweep = Sweep(sys.argv)
+    sweep.run()
@@ -0,0 +1,59 @@
+# Title: Vocabulary File
+# Author: Kenan Mesic
+# Date: 10/18/26
+# Purpose: All classes and methods involved with interning the strings of the
+#          reviews into dense integer codes
+
+
+# Class: StringTable
+# Purporse: Interns strings such as profile names, beer ids, brewer ids and
+#           styles, giving every unique string the next dense integer code. Each
+#           string is kept once no matter how many reviews mention it, so the
+#           reviews themselves only hold the codes
+class StringTable:
+
+
+    # Method: Constructor
+    # Purpose: Create an empty table
+    # Arguments: None
+    def __init__(self):
+        self.codes = {}
+        self.values = []
+
+
+    # Method: code
+    # Purpose: Get the code of a string, adding it to the table if it is new
+    # Arguments: value (required) - the string
+    # Return: the code of the string
+    def code(self, value):
+        code = self.codes.get(value)
+        if code == None:
+            code = len(self.values)
+            value = intern(value) if isinstance(value, str) else value
+            self.codes[value] = code
+            self.values.append(value)
+        return code
+
+
+    # Method: get
+    # Purpose: Get the code of a string without adding it
+    # Arguments: value (required) - the string
+    # Return: the code of the string or None if it is not in the table
+    def get(self, value):
+        return self.codes.get(value)
+
+
+    # Method: value
+    # Purpose: Get the string of a code
+    # Arguments: code (required) - the code
+    # Return: the string
+    def value(self, code):
+        return self.values[code]
+
+
+    # Method: __len__
+    # Purpose: Amount of unique strings in the table
+    # Arguments: None
+    # Return: the amount
+    def __len__(self):
+        return len(self.values)
@@ -0,0 +1,45 @@
+# Title: Test Configuration
+# Author: Kenan Mesic
+# Date: 10/18/26
+# Purpose: Shared setup of the tests, the modules in src are imported the same
+#          way main.py imports them and the files they write go to temporary
+#          directories
+
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+
+# Method: reviewsFile
+# Purpose: Fixture of a small gzip file of synthetic reviews shared by the tests
+# Arguments: tmpdir_factory (required) - pytest factory of temporary directories
+# Return: path to the reviews file
+@pytest.fixture(scope="session")
+def reviewsFile(tmpdir_factory):
+    from benchmark import SyntheticReviews
+    filename = str(tmpdir_factory.mktemp("reviews").join("reviews.txt.gz"))
+    SyntheticReviews(seed=0).write(filename, 3000)
+    return filename
+
+
+# Method: ratings
+# Purpose: Fixture of small random training and testing ratings as typed
+#          columns, every user and item pair is rated at most once
+# Arguments: None
+# Return: tuple of the training columns, testing columns, total users and items
+@pytest.fixture(scope="session")
+def ratings():
+    import numpy as np
+    randomState = np.random.RandomState(0)
+    totalUsers = 60
+    totalItems = 40
+    cells = randomState.choice(totalUsers * totalItems, 900, replace=False)
+    users = (cells // totalItems).astype(np.int32)
+    items = (cells % totalItems).astype(np.int32)
+    values = np.clip(np.round(3.5 + randomState.normal(0, 0.8, len(cells)) * 2) / 2, 1.0, 5.0).astype(np.float32)
+    times = np.arange(len(cells), dtype=np.int64)
+    training = (users[:700], items[:700], values[:700], times[:700])
+    testing = (users[700:], items[700:], values[700:], times[700:])
+    return training, testing, totalUsers, totalItems
@@ -0,0 +1,63 @@
+# Title: Cache Tests
+# Author: Kenan Mesic
+# Date: 10/18/26
+# Purpose: Tests of the least recently used cache of recommendations
+
+import numpy as np
+from cache import RecommendationCache
+
+
+# Method: results
+# Purpose: Results of a user as the cache holds them
+# Arguments: n (required) - amount of recommendations
+# Return: tuple of the items and predictions
+def results(n):
+    return (np.arange(n, dtype=np.int64), np.ones(n, dtype=np.float64))
+
+
+# Method: test_leastRecentlyUsedEvicted
+# Purpose: Once full, the entry used least recently is evicted first
+def test_leastRecentlyUsedEvicted():
+    cache = RecommendationCache(maxEntries=2)
+    cache.put(cache.key(1, 0, 10), results(10))
+    cache.put(cache.key(1, 1, 10), results(10))
+    assert cache.get(cache.key(1, 0, 10)) is not None
+    cache.put(cache.key(1, 2, 10), results(10))
+
+    assert cache.get(cache.key(1, 1, 10)) is None
+    assert cache.get(cache.key(1, 0, 10)) is not None
+    assert cache.get(cache.key(1, 2, 10)) is not None
+    stats = cache.stats()
+    assert (stats["entries"], stats["evictions"], stats["hits"], stats["misses"]) == (2, 1, 3, 1)
+
+
+# Method: test_bytesBounded
+# Purpose: The cache never holds more bytes than its bound, results larger
+#          than the bound are never cached
+def test_bytesBounded():
+    entryBytes = RecommendationCache.ENTRY_OVERHEAD + sum(part.nbytes for part in results(10))
+    cache = RecommendationCache(maxEntries=100, maxBytes=3 * entryBytes)
+    for user in range(0, 10):
+        cache.put(cache.key(1, user, 10), results(10))
+        assert cache.stats()["bytes"] <= 3 * entryBytes
+    assert cache.stats()["entries"] == 3
+    assert cache.get(cache.key(1, 9, 10)) is not None
+
+    cache.put(cache.key(1, 100, 1000), results(1000))
+    assert cache.get(cache.key(1, 100, 1000)) is None
+    assert cache.stats()["entries"] == 3
+
+
+# Method: test_modelVersionInvalidates
+# Purpose: Results of another model version are never returned, and clearing
+#          on a reload drops every entry
+def test_modelVersionInvalidates():
+    cache = RecommendationCache()
+    cache.put(cache.key("old", 0, 10), results(10))
+    assert cache.get(cache.key("new", 0, 10)) is None
+    assert cache.get(cache.key("old", 0, 10, filters=(True,))) is None
+
+    cache.clear()
+    assert cache.get(cache.key("old", 0, 10)) is None
+    stats = cache.stats()
+    assert (stats["entries"], stats["bytes"], stats["invalidations"]) == (0, 0, 1)
@@ -0,0 +1,115 @@
+# Title: Content Features Tests
+# Author: Kenan Mesic
+# Date: 10/18/26
+# Purpose: Tests of hashing the text of the reviews into content features and
+#          recommending the beers left out of the recommender by them
+
+import gzip
+import zlib
+import numpy as np
+from scipy import sparse
+from content import ContentFeatures
+
+
+REVIEWS = [("1", "Hop Bomb", "Hoppy, hoppy and bitter. A"),
+           ("2", "Dark Night", "Malty and roasty"),
+           ("3", "New IPA", "Very hoppy and bitter"),
+           ("4", "New Porter", "Malty, roasty and sweet"),
+           ("1", "Hop Bomb", "Bitter")]
+
+
+# Method: makeFeatures
+# Purpose: Content features of the reviews
+# Arguments: flushTokens (optional) - tokens buffered before being summed
+# Return: the content features
+def makeFeatures(flushTokens=ContentFeatures.FLUSH_TOKENS):
+    contentFeatures = ContentFeatures(hashBits=10, flushTokens=flushTokens)
+    for beerId, beerName, text in REVIEWS:
+        contentFeatures.add(beerId, beerName, text)
+    contentFeatures.merge()
+    return contentFeatures
+
+
+# Method: test_hashedCounts
+# Purpose: Every lower cased token of two or more characters is counted in the
+#          feature of its hash
+def test_hashedCounts():
+    contentFeatures = makeFeatures()
+    assert contentFeatures.beerNames == ["Hop Bomb", "Dark Night", "New IPA", "New Porter"]
+    assert list(contentFeatures.reviewCounts) == [2, 1, 1, 1]
+
+    row = contentFeatures.counts[0].toarray().ravel()
+    assert row[(zlib.crc32("hoppy") & 0xffffffff) % 1024] == 2
+    assert row[(zlib.crc32("bitter") & 0xffffffff) % 1024] == 2
+    assert row.sum() == 5
+
+
+# Method: test_flushSizes
+# Purpose: The counts are the same however often the tokens are flushed
+def test_flushSizes():
+    counts = makeFeatures().counts
+    for flushTokens in [1, 3, 7]:
+        assert (makeFeatures(flushTokens).counts != counts).nnz == 0
+
+
+# Method: test_itemContent
+# Purpose: The content of every beer has unit length
+def test_itemContent():
+    content = makeFeatures().itemContent()
+    assert np.allclose(np.sqrt(np.asarray(content.multiply(content).sum(axis=1)).ravel()), 1.0)
+
+
+# Method: test_recommendCold
+# Purpose: Beers 1 and 2 are in the recommender, a user rating the hoppy beer
+#          over the malty one gets the new hoppy beer first and the other user
+#          the new malty beer first
+def test_recommendCold():
+    contentFeatures = makeFeatures()
+    trainingMatrix = sparse.csr_matrix(np.array([[5.0, 1.0], [1.0, 5.0]]))
+    beers, scores = contentFeatures.recommendCold(trainingMatrix, ["1", "2"], [0, 1], n=3)
+    assert [contentFeatures.beerNames[beer] for beer in beers[0, :2]] == ["New IPA", "New Porter"]
+    assert [contentFeatures.beerNames[beer] for beer in beers[1, :2]] == ["New Porter", "New IPA"]
+    assert scores[0, 0] > 0 > scores[0, 1]
+    assert beers[0, 2] == -1 and scores[0, 2] == -np.inf
+
+
+# Method: test_saveLoad
+# Purpose: Features loaded back recommend the same and write a line per user
+def test_saveLoad(tmpdir):
+    contentFeatures = makeFeatures()
+    contentFeatures.save(str(tmpdir.join("content")))
+    loaded = ContentFeatures()
+    loaded.load(str(tmpdir.join("content")))
+    assert loaded.beerNames == contentFeatures.beerNames and loaded.width == 1024
+
+    trainingMatrix = sparse.csr_matrix(np.array([[5.0, 1.0], [1.0, 5.0]]))
+    assert np.array_equal(loaded.recommendCold(trainingMatrix, ["1", "2"], [0, 1])[0],
+                          contentFeatures.recommendCold(trainingMatrix, ["1", "2"], [0, 1])[0])
+
+    loaded.FILE_COLD = str(tmpdir.join("cold.txt"))
+    loaded.saveColdRecommendations(trainingMatrix, ["1", "2"], n=2, chunkSize=1)
+    lines = open(loaded.FILE_COLD).read().splitlines()
+    assert len(lines) == 2 and lines[0].startswith("New IPA::")
+
+
+# Method: test_process
+# Purpose: Streaming a reviews file counts the text of every review
+def test_process(reviewsFile):
+    contentFeatures = ContentFeatures(hashBits=12, flushTokens=500)
+    contentFeatures.process(reviewsFile)
+    assert sum(contentFeatures.reviewCounts) == 3000
+    assert contentFeatures.counts.shape == (len(contentFeatures.beerNames), 4096)
+    assert contentFeatures.beerTable.get("0") is not None
+
+
+# Method: test_streamTexts
+# Purpose: The texts come from the same parser as the ratings, so the fields
+#          of a review never leak into the next one
+def test_streamTexts(tmpdir):
+    filename = str(tmpdir.join("reviews.txt.gz"))
+    with gzip.open(filename, 'w') as fp:
+        fp.write("beer/name: Hop Bomb\nbeer/beerId: 1\nreview/overall: 4.0\nreview/text: Hoppy: and bitter\n\n"
+                 "beer/name: No Id\nreview/overall: 3.0\nreview/text: Malty\n\n")
+    texts = list(ContentFeatures().streamTexts(filename))
+    assert texts == [("1", "Hop Bomb", "Hoppy: and bitter"), (None, "No Id", "Malty")]
+    assert list(ContentFeatures().streamTexts(filename, 1)) == texts[:1]
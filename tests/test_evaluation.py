@@ -0,0 +1,56 @@
+# Title: Evaluation Tests
+# Author: Kenan Mesic
+# Date: 10/18/26
+# Purpose: Tests of the metrics of the evaluator against cases worked by hand
+
+import numpy as np
+import pytest
+from evaluation import Evaluator
+from recommender import Recommender
+
+
+# Method: fixedRecommender
+# Purpose: Recommender of 2 users and 4 items whose every user scores the items
+#          4, 3, 2 and 1, user 0 rated item 0 and user 1 rated item 3
+# Arguments: None
+# Return: the recommender
+def fixedRecommender():
+    training = (np.array([0, 1], dtype=np.int32), np.array([0, 3], dtype=np.int32),
+                np.array([4.0, 1.0], dtype=np.float32))
+    recommendMachine = Recommender(training, training, 2, 4, readFromFiles=False)
+    recommendMachine.model = Recommender.MF_ALS
+    recommendMachine.U = np.ones((2, 1))
+    recommendMachine.Vt = np.array([[4.0, 3.0, 2.0, 1.0]])
+    return recommendMachine
+
+
+# Held out ratings, user 0 finds its relevant item 2 second in its top 2 of
+# items 1 and 2, user 1 misses its relevant item 2 in its top 2 of items 0 and 1
+USERS = [0, 0, 1, 1]
+ITEMS = [2, 1, 0, 2]
+RATINGS = [4.0, 1.0, 2.0, 5.0]
+
+
+# Method: test_evaluate
+# Purpose: Every metric matches the worked case
+@pytest.mark.parametrize("chunkUsers", [1, 512])
+def test_evaluate(chunkUsers):
+    result = Evaluator(fixedRecommender(), k=2, chunkUsers=chunkUsers, workers=1).evaluate(USERS, ITEMS, RATINGS)
+
+    # The errors are -2, 2, 2 and -3
+    assert result["rmse"] == pytest.approx(np.sqrt(21.0 / 4))
+    assert result["mae"] == pytest.approx(9.0 / 4)
+    assert result["precision"] == pytest.approx((0.5 + 0.0) / 2)
+    assert result["recall"] == pytest.approx((1.0 + 0.0) / 2)
+    assert result["ndcg"] == pytest.approx((1.0 / np.log2(3)) / 2)
+    assert result["coverage"] == pytest.approx(3.0 / 4)
+    assert (result["ratings"], result["users"], result["rankedUsers"]) == (4, 2, 2)
+
+
+# Method: test_evaluateWithoutRelevant
+# Purpose: Users without a relevant held out rating count for the errors only
+def test_evaluateWithoutRelevant():
+    result = Evaluator(fixedRecommender(), k=2, workers=1).evaluate([0, 1], [1, 0], [1.0, 2.0])
+    assert result["rmse"] == pytest.approx(2.0)
+    assert result["rankedUsers"] == 0
+    assert result["precision"] == 0.0 and result["recall"] == 0.0 and result["ndcg"] == 0.0
@@ -0,0 +1,58 @@
+# Title: Item Index Tests
+# Author: Kenan Mesic
+# Date: 10/18/26
+# Purpose: Tests of the approximate nearest neighbour index over item vectors
+
+import numpy as np
+from index import ItemIndex
+from benchmark import SyntheticReviews
+from process import DataProcesser
+from recommender import Recommender
+
+
+# Method: test_defaultProbes
+# Purpose: Cosine searches probe a larger share of the clusters by default
+def test_defaultProbes():
+    vectors = np.random.RandomState(0).normal(size=(400, 8))
+    inner = ItemIndex(ItemIndex.METRIC_IP, clusters=24, seed=0)
+    inner.build(vectors)
+    cosine = ItemIndex(ItemIndex.METRIC_COSINE, clusters=24, seed=0)
+    cosine.build(vectors)
+    assert inner.probes == 3
+    assert cosine.probes == 8
+
+
+# Method: test_searchAllClustersIsExact
+# Purpose: Probing every cluster gives the exact top items by cosine
+def test_searchAllClustersIsExact():
+    vectors = np.random.RandomState(1).normal(size=(300, 6))
+    index = ItemIndex(ItemIndex.METRIC_COSINE, clusters=10, seed=0)
+    index.build(vectors)
+    queries = vectors[:5]
+    items, scores = index.search(queries, 10, probes=10)
+
+    units = vectors / np.linalg.norm(vectors, axis=1)[:, np.newaxis]
+    exact = np.argsort(-np.dot(queries, units.T), axis=1, kind="mergesort")[:, :10]
+    assert np.array_equal(items, exact)
+
+
+# Method: test_similarRecall
+# Purpose: Recall@10 of similar beers at the default probes of an sgd model on
+#          20000 synthetic reviews is over 0.9, the eighth of the clusters
+#          probed for users finds clearly fewer, the numbers in the README
+def test_similarRecall(tmpdir):
+    filename = str(tmpdir.join("reviews.txt.gz"))
+    SyntheticReviews(seed=0).write(filename, 20000)
+    dataProcessor = DataProcesser()
+    dataProcessor.FILE_BEER_COUNT = str(tmpdir.join("beer_count.json"))
+    dataProcessor.processReviews(filename, 20000)
+    dataProcessor.createTrainingTestingData(100)
+    recommendMachine = Recommender(dataProcessor.training, dataProcessor.testing, dataProcessor.totalUsersReviewed,
+                                   dataProcessor.totalBeersReviewed, readFromFiles=False)
+    recommendMachine.stochastic_gradient_descent(k=10, learning_rate=0.01, iterations=20, biases=True, seed=0)
+    recommendMachine.buildIndex(seed=0)
+    clusters = recommendMachine.similarIndex.clusters
+
+    assert recommendMachine.similarIndex.probes == clusters // 3
+    assert recommendMachine.indexRecall(n=10, seed=0)["similarRecall"] > 0.9
+    assert recommendMachine.indexRecall(n=10, probes=clusters // 8, seed=0)["similarRecall"] < 0.75
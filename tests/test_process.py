@@ -0,0 +1,98 @@
+# Title: Data Processing Tests
+# Author: Kenan Mesic
+# Date: 10/18/26
+# Purpose: Tests of parsing the reviews file into records and typed columns
+
+import math
+import numpy as np
+from process import DataProcesser, parseReviewLines
+from vocab import StringTable
+
+
+REVIEWS = """beer/name: Pale Ale
+beer/beerId: 1
+beer/brewerId: 10
+beer/style: American Pale Ale
+review/appearance: 4
+review/aroma: 3.5
+review/palate: 3
+review/taste: 4.5
+review/overall: 4
+review/time: 1000
+review/profileName: alice
+review/text: hoppy: with a colon
+
+beer/name: Stout
+beer/beerId: 2
+review/overall: 3
+review/time: 2000
+review/profileName: bob
+review/text: roasty
+"""
+
+
+# Method: test_parseReviewLines
+# Purpose: Every field of a review is parsed, values keep their colons
+def test_parseReviewLines():
+    records = list(parseReviewLines(REVIEWS.split("\n")))
+    assert len(records) == 2
+    assert records[0] == ("alice", "1", "Pale Ale", "10", "American Pale Ale", 4.0, 1000, (4.0, 3.5, 3.0, 4.5))
+
+
+# Method: test_parseReviewLinesMissingFields
+# Purpose: Fields a review leaves out are missing, not those of the last review
+def test_parseReviewLinesMissingFields():
+    profileName, beerId, beerName, brewerId, style, overall, reviewTime, aspects = \
+        list(parseReviewLines(REVIEWS.split("\n")))[1]
+    assert (profileName, beerId, beerName, overall, reviewTime) == ("bob", "2", "Stout", 3.0, 2000)
+    assert brewerId is None and style is None
+    assert all(math.isnan(aspect) for aspect in aspects)
+
+
+# Method: test_parseInParallel
+# Purpose: Parsing in worker processes gives the same records in the same
+#          order as parsing serially, even when reviews are cut into many chunks
+def test_parseInParallel(reviewsFile):
+    dataProcessor = DataProcesser()
+    dataProcessor.PARSE_CHUNK = 4096
+    serial = list(dataProcessor.streamReviews(reviewsFile))
+    parallel = list(dataProcessor.streamReviewsParallel(reviewsFile, workers=2))
+    assert len(serial) == 3000
+    assert serial == parallel
+    assert list(dataProcessor.streamReviewsParallel(reviewsFile, amount=100, workers=2)) == serial[:100]
+
+
+# Method: test_processReviews
+# Purpose: The reviews become typed columns of the users and beers with enough
+#          ratings, the same serially and in parallel, with the ids and names
+#          read back from the string tables
+def test_processReviews(tmpdir, reviewsFile):
+    processed = []
+    for workers in [1, 2]:
+        dataProcessor = DataProcesser()
+        dataProcessor.FILE_BEER_COUNT = str(tmpdir.join("beer_count.json"))
+        dataProcessor.processReviews(reviewsFile, minBeerRatings=20, minUserRatings=10, workers=workers)
+        processed.append(dataProcessor)
+
+    serial, parallel = processed
+    assert [column.dtype for column in serial.reviews] == [np.int32, np.int32, np.float32, np.int64, np.float32]
+    for serialColumn, parallelColumn in zip(serial.reviews, parallel.reviews):
+        assert np.array_equal(serialColumn, parallelColumn)
+    assert serial.mappingIdxToBeerId == parallel.mappingIdxToBeerId
+
+    # Every kept user and beer has enough ratings and an idx below the totals
+    users, items = serial.reviews[0], serial.reviews[1]
+    assert users.max() == serial.totalUsersReviewed - 1 and items.max() == serial.totalBeersReviewed - 1
+    assert np.bincount(items).min() >= 20 and np.bincount(users).min() >= 10
+    for itemIdx, beerId in serial.mappingIdxToBeerId.items():
+        assert serial.mappingIdxToBeer[itemIdx] == "Beer " + beerId
+
+
+# Method: test_stringTable
+# Purpose: Every unique string gets the next code and is kept once
+def test_stringTable():
+    table = StringTable()
+    assert [table.code(value) for value in ["b", "a", "b", "c"]] == [0, 1, 0, 2]
+    assert (table.get("a"), table.get("d"), table.value(2), len(table)) == (1, None, "c", 3)
+    table.code("".join(["a", "b"]))
+    assert table.value(table.get("ab")) is intern("ab")
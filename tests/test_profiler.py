@@ -0,0 +1,95 @@
+# Title: Profiler Tests
+# Author: Kenan Mesic
+# Date: 10/18/26
+# Purpose: Tests of profiling the stages of the recommender
+
+import json
+import numpy as np
+from profiler import Profiler, profiledStage
+from recommender import Recommender
+
+
+# Class: Stages
+# Purporse: Object with a profiler attribute and one stage calling another
+class Stages:
+
+
+    # Method: Constructor
+    # Purpose: Create the stages
+    # Arguments: profiler (optional) - profiler of the stages
+    def __init__(self, profiler=None):
+        self.profiler = profiler
+        self.U = np.zeros((3, 2), dtype=np.float32)
+
+
+    # Method: outer
+    # Purpose: Stage running the inner stage
+    # Arguments: value (required) - value handed to the inner stage
+    # Return: the result of the inner stage
+    @profiledStage
+    def outer(self, value):
+        return self.inner(value, scale=2)
+
+
+    # Method: inner
+    # Purpose: Stage returning a matrix
+    # Arguments: value (required) - value of the cells
+    #            scale (optional) - multiplier of the value
+    # Return: a 2 * 4 matrix of the value times the scale
+    @profiledStage
+    def inner(self, value, scale=1):
+        return np.full((2, 4), value * scale)
+
+
+# Method: test_passThrough
+# Purpose: Without a profiler the stages are called straight through
+def test_passThrough():
+    stages = Stages()
+    assert np.array_equal(stages.outer(3), np.full((2, 4), 6))
+    assert Stages.outer.__name__ == "outer"
+
+    # An object without a profiler attribute at all is called through as well
+    del stages.profiler
+    assert stages.inner(1).shape == (2, 4)
+
+
+# Method: test_trace
+# Purpose: Every stage is recorded once with its depth, matrices and result,
+#          handed to the callback and saved as a json trace
+def test_trace(tmpdir):
+    seen = []
+    profiler = Profiler(callback=seen.append)
+    Stages(profiler).outer(3)
+
+    assert [event["name"] for event in profiler.events] == ["inner", "outer"]
+    assert seen == profiler.events
+    inner, outer = profiler.events
+    assert inner["depth"] == 1 and outer["depth"] == 0
+    assert inner["result"] == {"shape": [2, 4], "nnz": 8, "dtype": "int64", "bytes": 64}
+    assert outer["matrices"]["U"] == {"shape": [3, 2], "nnz": 6, "dtype": "float32", "bytes": 24}
+    assert outer["wallSeconds"] >= inner["wallSeconds"] >= 0
+    assert profiler.depth == 0
+
+    filename = str(tmpdir.join("trace.json"))
+    profiler.save(filename)
+    with open(filename) as fp:
+        assert json.load(fp)["events"] == json.loads(json.dumps(profiler.events))
+
+
+# Method: test_traceRecommender
+# Purpose: Training a recommender records its stage, its iterations and the
+#          shapes of its sparse training matrix
+def test_traceRecommender(ratings):
+    training, testing, totalUsers, totalItems = ratings
+    profiler = Profiler()
+    recommendMachine = Recommender(training, testing, totalUsers, totalItems, readFromFiles=False, profiler=profiler)
+    recommendMachine.alternating_least_squares(k=4, iterations=3)
+
+    stages = [event for event in profiler.events if event["type"] == "stage"]
+    iterations = [event for event in profiler.events if event["type"] == "iteration"]
+    assert [event["name"] for event in stages] == ["createUserItemMatrix", "createUserItemMatrix",
+                                                   "alternating_least_squares"]
+    assert [event["iteration"] for event in iterations] == [1, 2, 3]
+    assert all(event["depth"] == 1 for event in iterations)
+    matrix = stages[-1]["matrices"]["trainingMatrix"]
+    assert matrix["shape"] == [totalUsers, totalItems] and matrix["nnz"] == len(training[0])
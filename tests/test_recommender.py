@@ -0,0 +1,351 @@
+# Title: Recommender Tests
+# Author: Kenan Mesic
+# Date: 10/18/26
+# Purpose: Tests of training the recommender
+
+import pytest
+import numpy as np
+from scipy import sparse
+from sklearn.metrics.pairwise import cosine_similarity
+from recommender import Recommender
+
+
+# Method: makeRecommender
+# Purpose: Build a recommender of the ratings fixture
+# Arguments: ratings (required) - the ratings fixture
+# Return: the recommender
+def makeRecommender(ratings, normalizeDataBefore=False):
+    training, testing, totalUsers, totalItems = ratings
+    return Recommender(training, testing, totalUsers, totalItems, readFromFiles=False,
+                       normalizeDataBefore=normalizeDataBefore)
+
+
+# Method: denseVectors
+# Purpose: The dense vectors the similarities are taken between, the unrated
+#          cells count as zeros and the mean of every user is taken off every
+#          cell when normalizing before
+# Arguments: recommendMachine (required) - the recommender
+#            alg (required) - user or item
+# Return: the vectors, one row per user or item
+def denseVectors(recommendMachine, alg):
+    dense = recommendMachine.trainingMatrix.toarray()
+    if recommendMachine.normalizeDataBefore:
+        dense = dense - dense.mean(axis=1)[:, np.newaxis]
+    return dense if alg == "user" else dense.T
+
+
+# Method: test_sgdWarmStartContinues
+# Purpose: Training sgd in steps gives the same factors as all the epochs at
+#          once, the shuffles and learning rate schedule carry on
+def test_sgdWarmStartContinues(ratings):
+    once = makeRecommender(ratings)
+    once.stochastic_gradient_descent(k=4, learning_rate=0.01, iterations=5, batch_size=16, biases=True,
+                                     schedule=Recommender.LR_INVERSE, decay=0.5, seed=0)
+
+    steps = makeRecommender(ratings)
+    for count, warmStart in [(1, False), (1, True), (3, True)]:
+        steps.stochastic_gradient_descent(k=4, learning_rate=0.01, iterations=count, batch_size=16, biases=True,
+                                          schedule=Recommender.LR_INVERSE, decay=0.5, seed=0, warmStart=warmStart)
+    assert steps.sgdEpochs == 5
+    assert np.array_equal(once.U, steps.U)
+    assert np.array_equal(once.Vt, steps.Vt)
+    assert np.array_equal(once.itemBiases, steps.itemBiases)
+
+
+# Method: test_updateModelFoldsInAls
+# Purpose: New users of an als model are folded in over every cell with the
+#          unrated ones as zeros, the same objective als was trained on
+def test_updateModelFoldsInAls(ratings):
+    training, testing, totalUsers, totalItems = ratings
+    recommendMachine = makeRecommender(ratings)
+    recommendMachine.alternating_least_squares(k=4, regularization=0.1, iterations=3)
+    V = recommendMachine.Vt.T.copy()
+
+    newRatings = (np.array([totalUsers, totalUsers, totalUsers + 1], dtype=np.int32),
+                  np.array([0, 5, 7], dtype=np.int32),
+                  np.array([4.0, 2.0, 5.0], dtype=np.float32))
+    recommendMachine.updateModel(newRatings, totalUsers + 2, totalItems, iterations=0)
+
+    row = np.zeros(totalItems)
+    row[[0, 5]] = [4.0, 2.0]
+    expected = np.linalg.solve(np.dot(V.T, V) + 0.1 * np.identity(4), np.dot(V.T, row))
+    assert np.allclose(recommendMachine.U[totalUsers], expected)
+    assert recommendMachine.U.shape == (totalUsers + 2, 4)
+
+
+# Method: test_updateModelFoldsInWals
+# Purpose: New users of a wals model are folded in over their rated cells only
+def test_updateModelFoldsInWals(ratings):
+    training, testing, totalUsers, totalItems = ratings
+    recommendMachine = makeRecommender(ratings)
+    recommendMachine.weighted_alternating_least_squares(k=4, regularization=0.1, iterations=3, workers=1, seed=0)
+    V = recommendMachine.Vt.T.copy()
+
+    newRatings = (np.array([totalUsers, totalUsers], dtype=np.int32),
+                  np.array([0, 5], dtype=np.int32),
+                  np.array([4.0, 2.0], dtype=np.float32))
+    recommendMachine.updateModel(newRatings, totalUsers + 1, totalItems, iterations=0)
+
+    rated = V[[0, 5]]
+    expected = np.linalg.solve(np.dot(rated.T, rated) + 0.1 * np.identity(4), np.dot(rated.T, [4.0, 2.0]))
+    assert np.allclose(recommendMachine.U[totalUsers], expected)
+
+
+# Method: test_updateModelFoldsInImplicitWals
+# Purpose: New users of an implicit wals model are folded in with the
+#          confidence weighted objective over every cell
+def test_updateModelFoldsInImplicitWals(ratings):
+    training, testing, totalUsers, totalItems = ratings
+    recommendMachine = makeRecommender(ratings)
+    recommendMachine.weighted_alternating_least_squares(k=4, regularization=0.1, iterations=3, implicit=True,
+                                                        alpha=2.0, workers=1, seed=0)
+    V = recommendMachine.Vt.T.astype(np.float64)
+
+    newRatings = (np.array([totalUsers, totalUsers], dtype=np.int32),
+                  np.array([0, 5], dtype=np.int32),
+                  np.array([4.0, 2.0], dtype=np.float32))
+    recommendMachine.updateModel(newRatings, totalUsers + 1, totalItems, iterations=0)
+
+    rated = V[[0, 5]]
+    confidence = 2.0 * np.array([4.0, 2.0])
+    A = np.dot(V.T, V) + np.dot(rated.T * confidence, rated) + 0.1 * np.identity(4)
+    expected = np.linalg.solve(A, np.dot(rated.T, 1.0 + confidence))
+    assert np.allclose(recommendMachine.U[totalUsers], expected)
+
+
+# Method: trainingRmse
+# Purpose: RMSE of a trained recommender over its own training ratings
+# Arguments: recommendMachine (required) - the trained recommender
+#            ratings (required) - the ratings fixture
+# Return: the RMSE
+def trainingRmse(recommendMachine, ratings):
+    training = ratings[0]
+    return recommendMachine.evaluateAll(testing=training[:3], workers=1)["rmse"]
+
+
+# Method: test_sgdSeeded
+# Purpose: sgd with the same seed gives the same factors, another seed does not
+def test_sgdSeeded(ratings):
+    factors = []
+    for seed in [0, 0, 1]:
+        recommendMachine = makeRecommender(ratings)
+        recommendMachine.stochastic_gradient_descent(k=4, learning_rate=0.01, iterations=3, biases=True, seed=seed)
+        factors.append(recommendMachine.U)
+    assert np.array_equal(factors[0], factors[1])
+    assert not np.array_equal(factors[0], factors[2])
+
+
+# Method: test_sgdLearns
+# Purpose: More epochs of sgd fit the training ratings better, one rating or
+#          a mini-batch at a time
+def test_sgdLearns(ratings):
+    for batchSize in [1, 32]:
+        errors = []
+        for iterations in [1, 30]:
+            recommendMachine = makeRecommender(ratings)
+            recommendMachine.stochastic_gradient_descent(k=4, learning_rate=0.02, iterations=iterations,
+                                                         batch_size=batchSize, biases=True, seed=0)
+            errors.append(trainingRmse(recommendMachine, ratings))
+        assert errors[1] < errors[0]
+        assert len(recommendMachine.sgdEpochStats) == 30
+
+
+# Method: test_sgdParallelSeeded
+# Purpose: sgd over stratified blocks in worker processes gives the same
+#          factors for the same seed and workers, and still learns
+def test_sgdParallelSeeded(ratings):
+    trained = []
+    for iterations in [1, 10, 10]:
+        recommendMachine = makeRecommender(ratings)
+        recommendMachine.stochastic_gradient_descent(k=4, learning_rate=0.02, iterations=iterations, batch_size=8,
+                                                     biases=True, seed=0, workers=2)
+        trained.append(recommendMachine)
+    assert np.array_equal(trained[1].U, trained[2].U)
+    assert np.array_equal(trained[1].Vt, trained[2].Vt)
+    assert np.array_equal(trained[1].userBiases, trained[2].userBiases)
+    assert trainingRmse(trained[1], ratings) < trainingRmse(trained[0], ratings)
+    assert trained[1].trainingInfo["workers"] == 2
+
+
+# Method: test_similarityMatchesCosine
+# Purpose: The blocked similarities, with the mean of the users taken off
+#          implicitly, equal the cosine similarities of the dense vectors
+@pytest.mark.parametrize("alg", ["user", "item"])
+@pytest.mark.parametrize("normalizeDataBefore", [False, True])
+def test_similarityMatchesCosine(ratings, alg, normalizeDataBefore):
+    recommendMachine = makeRecommender(ratings, normalizeDataBefore)
+    recommendMachine.createSimMatrix(alg=alg, blockSize=7, workers=2)
+
+    expected = cosine_similarity(denseVectors(recommendMachine, alg))
+    np.fill_diagonal(expected, 0.0)
+    assert np.allclose(recommendMachine.simMatrix, expected)
+
+
+# Method: test_similarityNeighbours
+# Purpose: Keeping the neighbours keeps the largest similarities of every row
+@pytest.mark.parametrize("alg", ["user", "item"])
+@pytest.mark.parametrize("normalizeDataBefore", [False, True])
+def test_similarityNeighbours(ratings, alg, normalizeDataBefore):
+    recommendMachine = makeRecommender(ratings, normalizeDataBefore)
+    recommendMachine.createSimMatrix(alg=alg, neighbours=5, blockSize=7, workers=2)
+    neighbours = recommendMachine.simMatrix
+
+    expected = cosine_similarity(denseVectors(recommendMachine, alg))
+    np.fill_diagonal(expected, 0.0)
+    for row in range(0, expected.shape[0]):
+        stored = neighbours[row]
+        top = np.sort(expected[row])[::-1][:5]
+        assert stored.nnz <= 5
+        assert np.allclose(np.sort(stored.data)[::-1], top[top != 0])
+        assert np.allclose(stored.data, expected[row, stored.indices])
+
+
+# Method: test_centeredProducts
+# Purpose: The products with the implicitly centered matrix equal the products
+#          with the dense matrix minus the mean of every user
+def test_centeredProducts(ratings):
+    recommendMachine = makeRecommender(ratings, normalizeDataBefore=True)
+    centered = denseVectors(recommendMachine, "user")
+    matmat, rmatmat = recommendMachine.centeredProducts()
+    randomState = np.random.RandomState(0)
+    right = randomState.normal(size=(centered.shape[1], 3))
+    left = randomState.normal(size=(centered.shape[0], 3))
+    assert np.allclose(matmat(right), np.dot(centered, right))
+    assert np.allclose(rmatmat(left), np.dot(centered.T, left))
+
+
+# Method: test_randomizedSvd
+# Purpose: The singular values of the randomized svd match the largest
+#          singular values of the dense matrix, centered or not
+@pytest.mark.parametrize("normalizeDataBefore", [False, True])
+def test_randomizedSvd(ratings, normalizeDataBefore):
+    recommendMachine = makeRecommender(ratings, normalizeDataBefore)
+    U, sigma, Vt = recommendMachine.randomizedSvd(5, oversampling=20, powerIterations=4, seed=0)
+    expected = np.linalg.svd(denseVectors(recommendMachine, "user"), compute_uv=False)[:5]
+    assert np.allclose(sigma, expected, rtol=1e-3)
+    assert np.allclose(np.dot(U.T, U), np.identity(5))
+    assert np.allclose(np.dot(Vt, Vt.T), np.identity(5))
+
+    with pytest.raises(ValueError):
+        recommendMachine.randomizedSvd(40, oversampling=10, powerIterations=1)
+
+
+# Method: test_rankScores
+# Purpose: The top items skip the rated ones, agree with a full sort of the
+#          unrated ones and fill the slots past the unrated items with -1
+def test_rankScores():
+    recommendMachine = Recommender(empty=True)
+    recommendMachine.trainingMatrix = sparse.csr_matrix(np.array([[5.0, 0, 3.0, 0, 0, 0],
+                                                                  [1.0, 2.0, 3.0, 4.0, 0, 0],
+                                                                  [0, 0, 0, 0, 0, 0]]))
+    scores = np.random.RandomState(0).normal(size=(3, 6))
+    items, predictions = recommendMachine.rankScores(np.arange(3), scores.copy(), 4)
+
+    for user in range(0, 3):
+        unrated = np.nonzero(recommendMachine.trainingMatrix[user].toarray().ravel() == 0)[0]
+        expected = unrated[np.argsort(-scores[user, unrated])][:4]
+        assert list(items[user, :len(expected)]) == list(expected)
+        assert np.array_equal(predictions[user, :len(expected)], scores[user, expected])
+    assert list(items[1, 2:]) == [-1, -1]
+    assert np.isneginf(predictions[1, 2:]).all()
+
+    items, predictions = recommendMachine.rankScores(np.array([2, 0]), scores[[2, 0]].copy(), 10)
+    assert items.shape == (2, 6)
+    assert list(items[1, 4:]) == [-1, -1]
+
+
+# Method: savedLines
+# Purpose: The recommendations and ratings of every user in the format of the
+#          files before they were exported in chunks, every prediction of the
+#          unrated beers and every rating sorted with the best first
+# Arguments: recommendMachine (required) - the recommender with its predictions
+# Return: tuple of the lines of the recommendations and of the ratings
+def savedLines(recommendMachine):
+    recLines = []
+    ratLines = []
+    for user, user_predications in enumerate(recommendMachine.prediction):
+        user_ratings = recommendMachine.trainingMatrix[user].toarray().ravel().tolist()
+        ratingsNames = [(recommendMachine.mappingIdxToBeer[idx], rating)
+                        for idx, rating in enumerate(user_ratings) if rating > 0]
+        ratingsNames.sort(key=lambda rating: rating[1], reverse=True)
+        recommendationNames = [(recommendMachine.mappingIdxToBeer[idx], predication)
+                               for idx, predication in enumerate(user_predications) if user_ratings[idx] == 0]
+        recommendationNames.sort(key=lambda pred: pred[1], reverse=True)
+        recLines.append(", ".join(str(r[0]) + "::" + ("%.1f" % r[1]) for r in recommendationNames[:20]) + "\n")
+        ratLines.append(", ".join(str(r[0]) + "::" + ("%.1f" % r[1]) for r in ratingsNames[:20]) + "\n")
+    return recLines, ratLines
+
+
+# Method: test_saveRecommendations
+# Purpose: The recommendations exported in chunks are written line for line
+#          the same as before
+def test_saveRecommendations(tmpdir, ratings):
+    training, testing, totalUsers, totalItems = ratings
+    recommendMachine = makeRecommender(ratings)
+    recommendMachine.mappingIdxToBeer = dict((idx, "Beer %d" % idx) for idx in range(totalItems))
+    recommendMachine.prediction = np.random.RandomState(0).uniform(1, 5, (totalUsers, totalItems))
+    recommendMachine.FILE_RECOM = str(tmpdir.join("recommendations.txt"))
+    recommendMachine.FILE_RATINGS = str(tmpdir.join("top_ratings.txt"))
+    recommendMachine.saveRecommendations(chunkSize=7)
+
+    recLines, ratLines = savedLines(recommendMachine)
+    assert open(recommendMachine.FILE_RECOM).readlines() == recLines
+    assert open(recommendMachine.FILE_RATINGS).readlines() == ratLines
+
+
+# Method: test_alsSolveRows
+# Purpose: The batched normal equations of a range of rows, rows without
+#          ratings included, give the same factors as solving every row alone
+@pytest.mark.parametrize("implicit", [False, True])
+def test_alsSolveRows(ratings, implicit):
+    recommendMachine = makeRecommender(ratings)
+    matrix = recommendMachine.trainingMatrix.tolil()
+    matrix[7, :] = 0
+    matrix = matrix.tocsr()
+    matrix.eliminate_zeros()
+    fixed = np.random.RandomState(0).rand(matrix.shape[1], 4)
+    gram = np.dot(fixed.T, fixed) if implicit else None
+    solved = np.zeros((matrix.shape[0], 4))
+    recommendMachine.als_solve_rows(matrix, fixed, 0.1, implicit, 2.0, gram, 5, 23, solved)
+
+    for row in range(5, 23):
+        cols = matrix[row].indices
+        values = matrix[row].data
+        if implicit:
+            confidence = 2.0 * values
+            A = gram + np.dot(fixed[cols].T * confidence, fixed[cols])
+            b = np.dot(fixed[cols].T, 1.0 + confidence)
+        else:
+            A = np.dot(fixed[cols].T, fixed[cols])
+            b = np.dot(fixed[cols].T, values)
+        assert np.allclose(solved[row], np.linalg.solve(A + 0.1 * np.identity(4), b))
+    assert not solved[:5].any() and not solved[23:].any()
+    assert not solved[7].any()
+
+
+# Method: test_float32
+# Purpose: A float32 recommender keeps its matrix, factors and predictions in
+#          float32 while the RMSE is summed in float64
+@pytest.mark.parametrize("algorithm", ["sgd", "als", "wals"])
+def test_float32(ratings, algorithm):
+    training, testing, totalUsers, totalItems = ratings
+    recommendMachine = Recommender(training, testing, totalUsers, totalItems, readFromFiles=False, dtype=np.float32)
+    if algorithm == "sgd":
+        recommendMachine.stochastic_gradient_descent(k=4, learning_rate=0.01, iterations=2, biases=True, seed=0)
+        assert recommendMachine.userBiases.dtype == np.float32
+    elif algorithm == "als":
+        recommendMachine.alternating_least_squares(k=4, regularization=0.1, iterations=2)
+    else:
+        recommendMachine.weighted_alternating_least_squares(k=4, regularization=0.1, iterations=2, workers=1, seed=0)
+
+    assert recommendMachine.trainingMatrix.dtype == np.float32
+    assert recommendMachine.U.dtype == np.float32 and recommendMachine.Vt.dtype == np.float32
+    scores = recommendMachine.scoreUsers(np.arange(totalUsers))
+    assert scores.dtype == np.float32
+    assert recommendMachine.recommend(np.arange(totalUsers), n=5)[1].dtype == np.float32
+
+    # The errors of the float32 predictions are summed in float64
+    errors = scores[testing[0], testing[1]].astype(np.float64) - testing[2].astype(np.float64)
+    rmse = recommendMachine.evaluateAll(workers=1)["rmse"]
+    assert isinstance(rmse, np.float64)
+    assert np.isclose(rmse, np.sqrt(np.dot(errors, errors) / len(errors)), rtol=1e-12, atol=0)
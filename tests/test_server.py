@@ -0,0 +1,156 @@
+# Title: Server Tests
+# Author: Kenan Mesic
+# Date: 10/18/26
+# Purpose: Tests of checking the parameters of the requests to the server,
+#          batching the requests and answering the failed ones
+
+import json
+import threading
+import urllib2
+import pytest
+import numpy as np
+from recommender import Recommender
+from server import RecommendServer, RecommendBatcher, RecommendHandler, ThreadingHTTPServer, LatencyMetrics
+
+
+# Class: FakeRecommender
+# Purporse: Recommends the items of a user as user * 100 plus the rank, and
+#           fails for a negative user, remembering the users of every call
+class FakeRecommender:
+
+
+    # Method: Constructor
+    # Purpose: Create the fake recommender
+    # Arguments: None
+    def __init__(self):
+        self.calls = []
+        self.mappingIdxToBeer = None
+
+
+    # Method: recommend
+    # Purpose: Recommend n items to every user
+    # Arguments: users (required) - idxs of the users
+    #            n (required) - amount of items
+    # Return: tuple of the items and predicted ratings, one row per user
+    def recommend(self, users, n):
+        self.calls.append(list(users))
+        if (users < 0).any():
+            raise ValueError("No user " + str(users.min()))
+        items = users[:, np.newaxis] * 100 + np.arange(n)
+        return items, -items.astype(np.float64)
+
+
+# Method: askAll
+# Purpose: Ask the batcher for every request at once from its own thread
+# Arguments: batcher (required) - the batcher
+#            requests (required) - list of the users and amounts
+# Return: list of the result or error of every request
+def askAll(batcher, requests):
+    answers = [None] * len(requests)
+
+    def ask(idx):
+        try:
+            answers[idx] = batcher.recommend(*requests[idx])
+        except Exception as e:
+            answers[idx] = e
+
+    threads = [threading.Thread(target=ask, args=(idx,)) for idx in range(0, len(requests))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return answers
+
+
+# Method: test_amount
+# Purpose: n defaults to the top recommendations and is kept within the limits
+def test_amount():
+    server = RecommendServer([])
+    assert server.amount({}) == Recommender.TOP_RECOMMENDATIONS
+    assert server.amount({"n": "1"}) == 1
+    assert server.amount({"n": str(RecommendServer.MAX_RECOMMENDATIONS)}) == RecommendServer.MAX_RECOMMENDATIONS
+
+
+# Method: test_amountInvalid
+# Purpose: Any other n is a ValueError, answered with a 400
+@pytest.mark.parametrize("n", ["0", "-1", "1001", "ten", "2.5", ""])
+def test_amountInvalid(n):
+    with pytest.raises(ValueError) as error:
+        RecommendServer([]).amount({"n": n})
+    assert "from 1 to" in str(error.value)
+
+
+# Method: test_batcherSplitsResults
+# Purpose: Requests scored in one batch each get the rows of their own user,
+#          cut to their own n
+def test_batcherSplitsResults():
+    recommendMachine = FakeRecommender()
+    batcher = RecommendBatcher(recommendMachine, LatencyMetrics(), workers=1, waitMs=500.0)
+    answers = askAll(batcher, [(3, 2), (7, 5), (1, 1)])
+
+    assert len(recommendMachine.calls) == 1 and sorted(recommendMachine.calls[0]) == [1, 3, 7]
+    for (user, n), (items, predictions) in zip([(3, 2), (7, 5), (1, 1)], answers):
+        assert list(items) == [user * 100 + rank for rank in range(0, n)]
+        assert np.array_equal(predictions, -items)
+
+
+# Method: test_batcherPassesErrors
+# Purpose: An error scoring a batch is raised to every request of the batch
+def test_batcherPassesErrors():
+    batcher = RecommendBatcher(FakeRecommender(), LatencyMetrics(), workers=1, waitMs=500.0)
+    answers = askAll(batcher, [(2, 3), (-1, 3)])
+    assert all(isinstance(answer, ValueError) for answer in answers)
+    assert batcher.recommend(2, 1)[0][0] == 200
+
+
+# Class: FailingServer
+# Purporse: Recommend server whose similar beers fail like a model without
+#           item factors, and whose recommendations have no names of beers
+class FailingServer(RecommendServer):
+
+
+    # Method: similar
+    # Purpose: Fail like similarBeers of a model without Vt
+    # Arguments: params (required) - parameters of the request
+    # Return: None
+    def similar(self, params):
+        raise AttributeError("Recommender instance has no attribute 'Vt'")
+
+
+    # Method: recommend
+    # Purpose: Describe two items of a recommender without names of beers
+    # Arguments: params (required) - parameters of the request
+    # Return: dict of the recommendations
+    def recommend(self, params):
+        return {"recommendations": self.describeItems([4, -1], [3.5, 0.0], "rating")}
+
+
+# Method: test_handlerAnswersErrors
+# Purpose: An unexpected error is answered with a 500 and counted in the
+#          metrics, and beers without names are described by idx
+def test_handlerAnswersErrors():
+    server = FailingServer([])
+    server.metrics = LatencyMetrics()
+    server.recommendMachine = FakeRecommender()
+    httpServer = ThreadingHTTPServer(("127.0.0.1", 0), RecommendHandler)
+    httpServer.recommendServer = server
+    thread = threading.Thread(target=httpServer.serve_forever)
+    thread.daemon = True
+    thread.start()
+    url = "http://127.0.0.1:%d" % httpServer.server_address[1]
+
+    try:
+        with pytest.raises(urllib2.HTTPError) as error:
+            urllib2.urlopen(url + "/similar?beer=1")
+        assert error.value.code == 500
+        assert "AttributeError" in json.loads(error.value.read())["error"]
+
+        body = json.loads(urllib2.urlopen(url + "/recommend?user=1").read())
+        assert body["recommendations"] == [{"beerIdx": 4, "beer": "", "rating": 3.5}]
+    finally:
+        httpServer.shutdown()
+        httpServer.server_close()
+
+    report = server.metrics.report()
+    assert report["errors"] == 1
+    assert report["endpoints"]["/similar"]["requests"] == 1
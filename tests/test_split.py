@@ -0,0 +1,116 @@
+# Title: Split Tests
+# Author: Kenan Mesic
+# Date: 10/18/26
+# Purpose: Tests of splitting the ratings into training and testing data
+
+import numpy as np
+import pytest
+from split import RatingsSplitter
+
+
+# Method: makeColumns
+# Purpose: Columns of ratings whose items are unique ids of the ratings, and
+#          whose ratings and aspects are copies of the ids to check they move
+#          together
+# Arguments: totalRatings (optional) - amount of ratings
+# Return: tuple of the users, items, ratings, times and aspects columns
+def makeColumns(totalRatings=200):
+    randomState = np.random.RandomState(0)
+    ids = np.arange(totalRatings)
+    users = randomState.randint(0, 30, totalRatings).astype(np.int32)
+    times = randomState.permutation(totalRatings).astype(np.int64)
+    aspects = np.repeat(ids[:, np.newaxis], 4, axis=1).astype(np.float32)
+    return (users, ids.astype(np.int32), ids.astype(np.float32), times, aspects)
+
+
+# Method: checkColumns
+# Purpose: Every column of a split still belongs to the same rating
+# Arguments: columns (required) - training or testing columns
+# Return: None
+def checkColumns(columns):
+    allColumns = makeColumns()
+    ids = columns[1]
+    assert np.array_equal(columns[0], allColumns[0][ids])
+    assert np.array_equal(columns[2], ids)
+    assert np.array_equal(columns[3], allColumns[3][ids])
+    assert np.array_equal(columns[4][:, 3], ids)
+
+
+# Method: checkPartition
+# Purpose: Training and testing together hold every rating exactly once
+# Arguments: training (required) - training columns
+#            testing (required) - testing columns
+# Return: None
+def checkPartition(training, testing):
+    checkColumns(training)
+    checkColumns(testing)
+    assert len(np.intersect1d(training[1], testing[1])) == 0
+    assert np.array_equal(np.sort(np.concatenate([training[1], testing[1]])), np.arange(200))
+
+
+# Method: test_randomSplit
+# Purpose: The random split keeps the percent in training and is seeded
+def test_randomSplit():
+    splitter = RatingsSplitter(makeColumns())
+    training, testing = splitter.randomSplit(75, seed=0)
+    checkPartition(training, testing)
+    assert len(training[1]) == 150
+    assert np.array_equal(training[1], splitter.randomSplit(75, seed=0)[0][1])
+    assert not np.array_equal(training[1], splitter.randomSplit(75, seed=1)[0][1])
+
+
+# Method: test_temporalSplit
+# Purpose: Every training rating is older than every testing rating
+def test_temporalSplit():
+    training, testing = RatingsSplitter(makeColumns()).temporalSplit(75)
+    checkPartition(training, testing)
+    assert len(training[1]) == 150
+    assert training[3].max() < testing[3].min()
+
+
+# Method: test_leaveLastOut
+# Purpose: Only the newest rating of every user with more than one is left out
+def test_leaveLastOut():
+    columns = makeColumns()
+    training, testing = RatingsSplitter(columns).leaveLastOut()
+    checkPartition(training, testing)
+    for user in np.unique(columns[0]):
+        times = columns[3][columns[0] == user]
+        leftOut = testing[3][testing[0] == user]
+        if len(times) > 1:
+            assert list(leftOut) == [times.max()]
+        else:
+            assert len(leftOut) == 0
+
+
+# Method: test_kFold
+# Purpose: The testing folds are disjoint and cover every rating, and each is
+#          tested against all the other ratings
+def test_kFold():
+    folds = list(RatingsSplitter(makeColumns()).kFold(5, seed=0))
+    assert len(folds) == 5
+    for training, testing in folds:
+        checkPartition(training, testing)
+        assert len(testing[1]) == 40
+    tested = np.concatenate([testing[1] for training, testing in folds])
+    assert np.array_equal(np.sort(tested), np.arange(200))
+
+
+# Method: test_foldIndices
+# Purpose: The idxs of the folds give the same columns as kFold and share one
+#          shuffle, the testing idxs are views of it
+def test_foldIndices():
+    splitter = RatingsSplitter(makeColumns())
+    for (trainOrder, testOrder), (training, testing) in zip(splitter.foldIndices(4, seed=1), splitter.kFold(4, seed=1)):
+        assert len(trainOrder) + len(testOrder) == 200
+        assert testOrder.base is not None
+        assert np.array_equal(splitter.columns[1][trainOrder], training[1])
+        assert np.array_equal(splitter.columns[1][testOrder], testing[1])
+
+
+# Method: test_kFoldInvalid
+# Purpose: Fewer than 2 folds or more folds than ratings are refused
+@pytest.mark.parametrize("folds", [1, 201])
+def test_kFoldInvalid(folds):
+    with pytest.raises(ValueError):
+        RatingsSplitter(makeColumns()).kFold(folds)
@@ -0,0 +1,144 @@
+# Title: Store Tests
+# Author: Kenan Mesic
+# Date: 10/18/26
+# Purpose: Tests of saving and memory mapping the ratings and trained models
+
+import json
+import os
+import numpy as np
+import pytest
+from recommender import Recommender
+from store import RatingsStore, ModelStore
+
+
+# Method: withAspects
+# Purpose: Add the aspects column the store keeps to columns of ratings
+# Arguments: columns (required) - (users, items, ratings, times) columns
+#            value (optional) - value of every aspect
+# Return: tuple of the columns with the aspects
+def withAspects(columns, value=1.0):
+    return columns + (np.full((len(columns[0]), 4), value, dtype=np.float32),)
+
+
+# Method: test_ratingsStoreRoundTrip
+# Purpose: Saved ratings load back memory mapped read only with their typed
+#          columns, totals and mappings
+def test_ratingsStoreRoundTrip(tmpdir, ratings):
+    training, testing, totalUsers, totalItems = ratings
+    training = withAspects(training)
+    testing = withAspects(testing, np.nan)
+    store = RatingsStore(str(tmpdir))
+    store.save("key", training, testing, totalUsers, totalItems, {"beers": {0: "Stout", 2: "Pale Ale"}})
+    cached = store.load("key")
+
+    for saved, loaded in zip(training, cached["training"]):
+        assert isinstance(loaded, np.memmap) and not loaded.flags.writeable
+        assert np.array_equal(saved, loaded)
+    assert np.isnan(cached["testing"][4]).all()
+    assert [column.dtype for column in cached["columns"]] == [np.int32, np.int32, np.float32, np.int64, np.float32]
+    assert len(cached["columns"][0]) == len(training[0]) + len(testing[0])
+    assert (cached["totalUsers"], cached["totalItems"]) == (totalUsers, totalItems)
+    assert cached["mappings"] == {"beers": {0: "Stout", 2: "Pale Ale"}}
+    assert isinstance(cached["mappings"]["beers"][0], str)
+
+
+# Method: test_ratingsStoreAppend
+# Purpose: Appended ratings go after the training ratings, testing is unchanged
+def test_ratingsStoreAppend(tmpdir, ratings):
+    training, testing, totalUsers, totalItems = ratings
+    training = withAspects(training)
+    testing = withAspects(testing)
+    store = RatingsStore(str(tmpdir))
+    assert store.append("key", training, totalUsers, totalItems, {}) == False
+
+    store.save("key", training, testing, totalUsers, totalItems, {})
+    new = (np.array([totalUsers], dtype=np.int32), np.array([0], dtype=np.int32),
+           np.array([5.0], dtype=np.float32), np.array([10 ** 9], dtype=np.int64),
+           np.full((1, 4), 4.5, dtype=np.float32))
+    assert store.append("key", new, totalUsers + 1, totalItems, {})
+    cached = store.load("key")
+    assert len(cached["training"][0]) == len(training[0]) + 1
+    assert cached["training"][0][-1] == totalUsers and cached["training"][2][-1] == 5.0
+    assert np.array_equal(cached["training"][4][-1], [4.5] * 4)
+    assert np.array_equal(cached["testing"][2], testing[2])
+    assert cached["totalUsers"] == totalUsers + 1
+
+
+# Method: test_ratingsStoreStale
+# Purpose: Missing caches and caches of another version are not loaded
+def test_ratingsStoreStale(tmpdir, ratings):
+    training, testing, totalUsers, totalItems = ratings
+    store = RatingsStore(str(tmpdir))
+    assert store.load("missing") is None
+
+    store.save("key", withAspects(training), withAspects(testing), totalUsers, totalItems, {})
+    metaFile = os.path.join(store.path("key"), RatingsStore.FILE_META)
+    with open(metaFile) as fp:
+        meta = json.load(fp)
+    meta["version"] = RatingsStore.VERSION - 1
+    with open(metaFile, 'w') as fp:
+        json.dump(meta, fp)
+    assert store.load("key") is None
+
+
+# Method: test_modelStoreRoundTrip
+# Purpose: Saved arrays load back memory mapped or read in, arrays of None are
+#          skipped and another version is refused
+def test_modelStoreRoundTrip(tmpdir):
+    directory = str(tmpdir.join("model"))
+    arrays = {"U": np.arange(6.0).reshape(3, 2), "biases": None}
+    ModelStore(directory).save(arrays, {"model": "sgd"}, {"users": {0: "alice", 1: "bob"}})
+
+    loaded, meta, mappings = ModelStore(directory).load()
+    assert sorted(loaded.keys()) == ["U"]
+    assert isinstance(loaded["U"], np.memmap) and not loaded["U"].flags.writeable
+    assert np.array_equal(loaded["U"], arrays["U"])
+    assert meta["model"] == "sgd" and meta["version"] == ModelStore.VERSION
+    assert mappings == {"users": {0: "alice", 1: "bob"}}
+    assert not isinstance(ModelStore(directory).load(mmap=False)[0]["U"], np.memmap)
+
+    with open(os.path.join(directory, ModelStore.FILE_META)) as fp:
+        meta = json.load(fp)
+    meta["version"] = ModelStore.VERSION + 1
+    with open(os.path.join(directory, ModelStore.FILE_META), 'w') as fp:
+        json.dump(meta, fp)
+    with pytest.raises(ValueError):
+        ModelStore(directory).load()
+    with pytest.raises(IOError):
+        ModelStore(str(tmpdir.join("missing"))).load()
+
+
+# Method: test_modelRoundTrip
+# Purpose: A model loaded back recommends the same as the one that was saved
+def test_modelRoundTrip(tmpdir, ratings):
+    training, testing, totalUsers, totalItems = ratings
+    recommendMachine = Recommender(training, testing, totalUsers, totalItems, readFromFiles=False)
+    recommendMachine.stochastic_gradient_descent(k=4, learning_rate=0.01, iterations=3, biases=True, seed=0)
+    directory = str(tmpdir.join("model"))
+    recommendMachine.saveModel(directory, mappings={"users": dict((idx, "user%d" % idx) for idx in range(totalUsers))})
+
+    loaded = Recommender(empty=True)
+    loaded.loadModel(directory)
+    users = np.arange(totalUsers)
+    assert loaded.model == Recommender.MF_SGD
+    assert np.array_equal(loaded.recommend(users, n=5)[0], recommendMachine.recommend(users, n=5)[0])
+    assert np.allclose(loaded.recommend(users, n=5)[1], recommendMachine.recommend(users, n=5)[1])
+    assert loaded.mappings["users"][3] == "user3"
+
+
+# Method: test_modelWithoutBeers
+# Purpose: A model saved without the names of the beers is refused when loaded
+#          instead of failing later when printing or serving recommendations
+def test_modelWithoutBeers(tmpdir, ratings):
+    training, testing, totalUsers, totalItems = ratings
+    recommendMachine = Recommender(training, testing, totalUsers, totalItems, readFromFiles=False)
+    recommendMachine.stochastic_gradient_descent(k=4, learning_rate=0.01, iterations=1, seed=0)
+    directory = str(tmpdir.join("model"))
+    recommendMachine.saveModel(directory)
+
+    arrays, meta, mappings = ModelStore(directory).load(mmap=False)
+    del mappings["beers"]
+    ModelStore(directory).save(arrays, meta, mappings)
+    with pytest.raises(ValueError) as error:
+        Recommender(empty=True).loadModel(directory)
+    assert "names of the beers" in str(error.value)